@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import concurrent.futures
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 批量请求的默认并发数，实际请求频率仍由 rate_limiter 按站点控制。
+DEFAULT_CONCURRENCY = 32
+
+
+async def gather_limited(func, args_list, concurrency=DEFAULT_CONCURRENCY):
+    """
+    在当前事件循环中有限并发执行协程 func(*args)
+    返回结果与args_list顺序一致，单个失败返回None不影响其它
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _run(args):
+        async with semaphore:
+            try:
+                return await func(*args)
+            except Exception as e:
+                logging.error(f"async_fetcher.gather_limited处理异常：{args}{e}")
+                return None
+
+    return await asyncio.gather(*[_run(args) for args in args_list])
+
+
+async def _run_limited(func, args_list, concurrency):
+    # 请求在线程池中执行，线程数与并发数一致。
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+    asyncio.get_running_loop().set_default_executor(executor)
+    return await gather_limited(func, args_list, concurrency)
+
+
+def run_limited(func, args_list, concurrency=DEFAULT_CONCURRENCY):
+    """
+    同步接口：在一个事件循环中有限并发执行全部协程，返回结果列表
+    调用线程已有运行中的事件循环时，换一个线程执行
+    """
+    args_list = list(args_list)
+    if len(args_list) == 0:
+        return []
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_run_limited(func, args_list, concurrency))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, _run_limited(func, args_list, concurrency)).result()
@@ -4,10 +4,17 @@
 import logging
 import numpy as np
 import pandas as pd
+import instock.core.stock_hist_slice as hsl
+from instock.core.stock_hist_panel import StockHistPanel, date_to_int
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
+# 批量计算每批的信号数，限制收盘价二维数组占用的内存
+RATES_CHUNK = 50000
+# 股票序号乘以该值加上日期(yyyymmdd)，组成全部行有序的键
+_DATE_SCALE = 100000000
+
 
 def get_rates(code_name, data, stock_column, threshold=101):
     try:
@@ -20,9 +27,7 @@ def get_rates(code_name, data, stock_column, threshold=101):
         # 设置返回数组。
         stock_data_list = [start_date, code]
 
-        mask = (data['date'] >= start_date)
-        data = data.loc[mask].copy()
-        data = data.head(n=threshold)
+        data = hsl.since(data, start_date).head(n=threshold).copy()
 
         if len(data.index) <= 1:
             return None
@@ -48,3 +53,68 @@ def get_rates(code_name, data, stock_column, threshold=101):
         logging.error(f"rate_stats.get_rates处理异常：{code}代码{e}")
 
     return pd.Series(stock_data_list, index=stock_column)
+
+
+class RatesCalculator:
+    """
+    历史数据面板上批量计算回测收益率
+    (代码, 信号日) 用二分查找转为面板中的行号，信号日起的收盘价按行号数组一次取出，
+    全部信号的N日收益率一次计算，结果与逐只调用 get_rates 相同
+    """
+
+    def __init__(self, stocks):
+        if not isinstance(stocks, StockHistPanel):
+            stocks = StockHistPanel.from_frames(stocks, use_shared_memory=False)
+        self.panel = stocks
+        self.close = stocks.get_column('close')
+        stock_index = np.repeat(np.arange(len(stocks), dtype=np.int64), np.diff(stocks.offsets))
+        self.sort_keys = stock_index * _DATE_SCALE + stocks.dates
+
+    def get_rows(self, stocks, date):
+        """
+        信号 [(信号日, 代码, 名称)] 在面板中的位置，按 (date, 代码, 名称) 取股票
+        返回 (有该股票的信号序号数组, 信号日(含)起第一行的行号数组, 该股票的结束行号数组)
+        """
+        index = [self.panel.index_of((date, stock[1], stock[2])) for stock in stocks]
+        found = np.array([i is not None for i in index], dtype=bool)
+        signals = np.flatnonzero(found)
+        i = np.array([index[j] for j in signals], dtype=np.int64)
+        signal_date = np.array([date_to_int(stocks[j][0]) for j in signals], dtype=np.int64)
+        start = np.searchsorted(self.sort_keys, i * _DATE_SCALE + signal_date, side='left')
+        return signals, start, self.panel.offsets[i + 1]
+
+    def calc(self, start, end, threshold=101):
+        """
+        各信号日起threshold根K线的收盘价相对第一根的收益率，(信号数, threshold-1) 二维数组
+        K线不足的位置为NaN，与 get_rates 补的None对应
+        """
+        idx = start[:, None] + np.arange(threshold)
+        close = self.close[np.minimum(idx, len(self.close) - 1)]
+        close1 = close[:, :1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates = np.around(100 * (close[:, 1:] - close1) / close1, decimals=2)
+        rates[idx[:, 1:] >= end[:, None]] = np.nan
+        return rates
+
+
+def get_rates_batch(stocks, calculator, date, stock_column, threshold=101):
+    """
+    全部信号批量计算收益率，stocks为 [(信号日, 代码, 名称)]，calculator为 RatesCalculator
+    date为面板中股票key的日期；返回DataFrame，列为stock_column，
+    不含 get_rates 返回None的信号(没有该股票、信号日起K线不足2根)
+    """
+    try:
+        signals, start, end = calculator.get_rows(stocks, date)
+        ok = end - start > 1
+        signals, start, end = signals[ok], start[ok], end[ok]
+        if len(signals) == 0:
+            return None
+        rates = np.concatenate([calculator.calc(start[c:c + RATES_CHUNK], end[c:c + RATES_CHUNK], threshold)
+                                for c in range(0, len(signals), RATES_CHUNK)])
+        data = pd.DataFrame(rates, columns=stock_column[2:])
+        data.insert(0, stock_column[1], [stocks[j][1] for j in signals])
+        data.insert(0, stock_column[0], [stocks[j][0] for j in signals])
+        return data
+    except Exception as e:
+        logging.error(f"rate_stats.get_rates_batch处理异常：{e}")
+    return None
@@ -7,13 +7,16 @@ https://quote.eastmoney.com/sh513500.html
 """
 import random
 import time
-from functools import lru_cache
+import asyncio
+import functools
 import math
 import logging
 import pandas as pd
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from instock.core.rate_limiter import rate_limiter
+from instock.core.symbol_master import symbol_master
 
 __author__ = 'myh '
 __date__ = '2025/12/31 '
@@ -78,8 +81,10 @@ def _make_etf_request(url, params, timeout=20, retry=3):
             if url.startswith('http://'):
                 url = 'https://' + url[7:]
             
+            rate_limiter.wait(url)
             logger.info(f"ETF请求 [{attempt+1}/{retry}]: {url[:60]}...")
             response = session.get(url, params=params, timeout=timeout, verify=True)
+            rate_limiter.on_response(url, response.status_code)
             
             if response.status_code == 403:
                 logger.warning("ETF请求被拒绝(403)")
@@ -117,6 +122,62 @@ def _make_etf_request(url, params, timeout=20, retry=3):
     
     return None
 
+async def _make_etf_request_async(url, params, timeout=20, retry=3):
+    """_make_etf_request 的协程版本，等待用 asyncio.sleep，请求在事件循环的线程池中执行"""
+    if not _check_etf_available():
+        return None
+    
+    session = _get_etf_session()
+    loop = asyncio.get_running_loop()
+    
+    for attempt in range(retry):
+        try:
+            if url.startswith('http://'):
+                url = 'https://' + url[7:]
+            
+            await asyncio.sleep(rate_limiter.reserve(url))
+            logger.info(f"ETF请求 [{attempt+1}/{retry}]: {url[:60]}...")
+            response = await loop.run_in_executor(
+                None, functools.partial(session.get, url, params=params, timeout=timeout, verify=True,
+                                        headers={'User-Agent': random.choice(USER_AGENTS)}))
+            rate_limiter.on_response(url, response.status_code)
+            
+            if response.status_code == 403:
+                logger.warning("ETF请求被拒绝(403)")
+                if attempt < retry - 1:
+                    await asyncio.sleep(random.uniform(2, 5))
+                    continue
+                _mark_etf_unavailable()
+                return None
+            
+            if response.status_code == 200:
+                return response
+            
+            response.raise_for_status()
+            
+        except requests.exceptions.ConnectionError as e:
+            logger.warning(f"ETF连接错误 (尝试 {attempt+1}/{retry}): {str(e)[:100]}")
+            if attempt < retry - 1:
+                await asyncio.sleep(random.uniform(1, 3))
+                continue
+            _mark_etf_unavailable()
+            return None
+            
+        except requests.exceptions.Timeout as e:
+            logger.warning(f"ETF请求超时 (尝试 {attempt+1}/{retry}): {e}")
+            if attempt < retry - 1:
+                await asyncio.sleep(random.uniform(1, 2))
+                continue
+            return None
+            
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"ETF请求错误 (尝试 {attempt+1}/{retry}): {str(e)[:100]}")
+            if attempt < retry - 1:
+                await asyncio.sleep(random.uniform(1, 2))
+                continue
+    
+    return None
+
 def fund_etf_spot_em() -> pd.DataFrame:
     """
     东方财富-ETF 实时行情
@@ -162,7 +223,6 @@ def fund_etf_spot_em() -> pd.DataFrame:
         page_count = math.ceil(data_count/page_size)
         
         while page_count > 1:
-            time.sleep(random.uniform(0.5, 1))
             page_current = page_current + 1
             params["pn"] = page_current
             r = _make_etf_request(url, params)
@@ -233,16 +293,25 @@ def fund_etf_spot_em() -> pd.DataFrame:
         return pd.DataFrame()
 
 
-@lru_cache()
 def _fund_etf_code_id_map_em() -> dict:
     """
     东方财富-ETF 代码和市场标识映射
     https://quote.eastmoney.com/center/gridlist.html#fund_etf
+    代码表保存在本地供各进程共用，一天最多刷新一次
     :return: ETF 代码和市场标识映射
+    :rtype: dict
+    """
+    return symbol_master.get_market_map('etf')
+
+
+def _fund_etf_symbol_list_em() -> pd.DataFrame:
+    """
+    东方财富-ETF 代码表，代码表过期时由 symbol_master 调用
+    :return: 代码、市场标识、名称
     :rtype: pandas.DataFrame
     """
     if not _check_etf_available():
-        return {}
+        return None
     
     url = "https://push2.eastmoney.com/api/qt/clist/get"
     params = {
@@ -254,23 +323,25 @@ def _fund_etf_code_id_map_em() -> dict:
         "invt": "2",
         "fid": "f3",
         "fs": "b:MK0021,b:MK0022,b:MK0023,b:MK0024",
-        "fields": "f12,f13",
+        "fields": "f12,f13,f14",
     }
     
     r = _make_etf_request(url, params)
     if r is None:
-        return {}
+        return None
     
     try:
         data_json = r.json()
         if data_json.get("data") and data_json["data"].get("diff"):
             temp_df = pd.DataFrame(data_json["data"]["diff"])
-            temp_dict = dict(zip(temp_df["f12"], temp_df["f13"]))
-            return temp_dict
-        return {}
+            return pd.DataFrame({'code': temp_df["f12"], 'market': temp_df["f13"], 'name': temp_df["f14"]})
+        return None
     except Exception as e:
         logger.error(f"获取ETF代码映射失败: {e}")
-        return {}
+        return None
+
+
+symbol_master.register('etf', _fund_etf_symbol_list_em)
 
 
 def fund_etf_hist_em(
@@ -303,7 +374,37 @@ def fund_etf_hist_em(
     if symbol not in code_id_dict:
         logger.warning(f"ETF代码 {symbol} 不存在")
         return pd.DataFrame()
-        
+    
+    url, params = _fund_etf_hist_em_args(code_id_dict[symbol], symbol, period, start_date, end_date, adjust)
+    r = _make_etf_request(url, params)
+    return _fund_etf_hist_em_frame(r)
+
+
+async def fund_etf_hist_em_async(
+    symbol: str = "159707",
+    period: str = "daily",
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "",
+) -> pd.DataFrame:
+    """
+    东方财富-ETF 行情，fund_etf_hist_em 的协程版本，用于批量获取
+    """
+    if not _check_etf_available():
+        return pd.DataFrame()
+    
+    # 代码映射有缓存，只有第一次需要请求
+    code_id_dict = await asyncio.get_running_loop().run_in_executor(None, _fund_etf_code_id_map_em)
+    if symbol not in code_id_dict:
+        logger.warning(f"ETF代码 {symbol} 不存在")
+        return pd.DataFrame()
+    
+    url, params = _fund_etf_hist_em_args(code_id_dict[symbol], symbol, period, start_date, end_date, adjust)
+    r = await _make_etf_request_async(url, params)
+    return _fund_etf_hist_em_frame(r)
+
+
+def _fund_etf_hist_em_args(market_id, symbol, period, start_date, end_date, adjust):
     adjust_dict = {"qfq": "1", "hfq": "2", "": "0"}
     period_dict = {"daily": "101", "weekly": "102", "monthly": "103"}
     url = "https://push2his.eastmoney.com/api/qt/stock/kline/get"
@@ -312,12 +413,15 @@ def fund_etf_hist_em(
         "fields2": "f51,f52,f53,f54,f55,f56,f57,f58,f59,f60,f61,f116",
         "klt": period_dict[period],
         "fqt": adjust_dict[adjust],
-        "secid": f"{code_id_dict[symbol]}.{symbol}",
+        "secid": f"{market_id}.{symbol}",
         "beg": start_date,
         "end": end_date,
     }
-    
-    r = _make_etf_request(url, params)
+    return url, params
+
+
+def _fund_etf_hist_em_frame(r) -> pd.DataFrame:
+    """ETF历史行情响应转为DataFrame"""
     if r is None:
         return pd.DataFrame()
     
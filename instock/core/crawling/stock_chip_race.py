@@ -9,6 +9,7 @@ http://excalc.icfqs.com:7616/TQLEX?Entry=HQServ.hq_nlp
 import pandas as pd
 import requests
 from instock.core.singleton_proxy import proxys
+from instock.core.http_cache import cached_request, ttl_for_date
 
 __author__ = 'myh '
 __date__ = '2025/2/26 '
@@ -33,7 +34,8 @@ def stock_chip_race_open(date: str = "") -> pd.DataFrame:
         "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36 TdxW",
     }
 
-    r = requests.post(url, proxies = proxys().get_proxies(), json=params,headers=headers)
+    r = cached_request(requests.post, url, ttl_for_date(date), json=params, headers=headers,
+                       proxies=proxys().get_proxies())
     data_json = r.json()
     data = data_json["datas"]
     if not data:
@@ -101,7 +103,8 @@ def stock_chip_race_end(date: str = "") -> pd.DataFrame:
         "User-Agent": "TdxW",
     }
 
-    r = requests.post(url, proxies = proxys().get_proxies(), json=params,headers=headers)
+    r = cached_request(requests.post, url, ttl_for_date(date), json=params, headers=headers,
+                       proxies=proxys().get_proxies())
     data_json = r.json()
     data = data_json["datas"]
     if not data:
@@ -6,18 +6,24 @@ Desc: 东方财富网-数据中心-资金流向
 https://data.eastmoney.com/zjlx/detail.html
 """
 import json
-import random
 import time
-import math
 import logging
 import pandas as pd
-from instock.core.multi_source_fetcher import multi_fetcher, DataSource
+from instock.core.multi_source_fetcher import DataSource, fetch_pages, parse_clist_page
 
 __author__ = 'myh '
 __date__ = '2025/12/31 '
 
 logger = logging.getLogger(__name__)
 
+def _parse_clist_jsonp_page(r):
+    """东方财富clist分页jsonp响应，返回(本页数据, 总条数)"""
+    text_data = r.text
+    data_json = json.loads(text_data[text_data.find("{"): -2])
+    if not data_json.get("data") or not data_json["data"].get("diff"):
+        return [], 0
+    return data_json["data"]["diff"], data_json["data"]["total"]
+
 def stock_individual_fund_flow_rank(indicator: str = "5日") -> pd.DataFrame:
     """
     东方财富网-数据中心-资金流向-排名
@@ -61,26 +67,10 @@ def stock_individual_fund_flow_rank(indicator: str = "5日") -> pd.DataFrame:
     }
     
     try:
-        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-        data_json = r.json()
-        
-        if not data_json.get("data") or not data_json["data"].get("diff"):
+        data = fetch_pages(url, params, parse_clist_page, source=DataSource.EASTMONEY)
+        if not data:
             logger.warning("资金流向数据为空")
             return pd.DataFrame()
-        
-        data = data_json["data"]["diff"]
-        data_count = data_json["data"]["total"]
-        page_count = math.ceil(data_count/page_size)
-        
-        while page_count > 1:
-            time.sleep(random.uniform(0.5, 1))
-            page_current += 1
-            params["pn"] = page_current
-            r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-            data_json = r.json()
-            if data_json.get("data") and data_json["data"].get("diff"):
-                data.extend(data_json["data"]["diff"])
-            page_count -= 1
 
         temp_df = pd.DataFrame(data)
         temp_df = temp_df[~temp_df["f2"].isin(["-"])]
@@ -196,28 +186,10 @@ def stock_sector_fund_flow_rank(
     }
     
     try:
-        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-        text_data = r.text
-        data_json = json.loads(text_data[text_data.find("{") : -2])
-        
-        if not data_json.get("data") or not data_json["data"].get("diff"):
+        data = fetch_pages(url, params, _parse_clist_jsonp_page, source=DataSource.EASTMONEY)
+        if not data:
             logger.warning("板块资金流数据为空")
             return pd.DataFrame()
-        
-        data = data_json["data"]["diff"]
-        data_count = data_json["data"]["total"]
-        page_count = math.ceil(data_count/page_size)
-        
-        while page_count > 1:
-            time.sleep(random.uniform(0.5, 1))
-            page_current += 1
-            params["pn"] = page_current
-            r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-            text_data = r.text
-            json_data = json.loads(text_data[text_data.find("{"): -2])
-            if json_data.get("data") and json_data["data"].get("diff"):
-                data.extend(json_data["data"]["diff"])
-            page_count -= 1
 
         temp_df = pd.DataFrame(data)
         temp_df = temp_df[~temp_df["f2"].isin(["-"])]
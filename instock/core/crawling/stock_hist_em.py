@@ -8,10 +8,11 @@ Desc: 东方财富网/新浪财经-行情首页-沪深京 A 股
 import random
 import time
 import logging
+import numpy as np
 import pandas as pd
-import math
-from functools import lru_cache
-from instock.core.multi_source_fetcher import multi_fetcher, sina_data_fetcher, DataSource
+import instock.core.async_fetcher as afe
+from instock.core.multi_source_fetcher import sina_data_fetcher, DataSource, fetch_pages, parse_clist_page
+from instock.core.symbol_master import symbol_master
 
 __author__ = 'myh '
 __date__ = '2025/12/31 '
@@ -21,10 +22,18 @@ logger = logging.getLogger(__name__)
 def stock_zh_a_spot_em() -> pd.DataFrame:
     """
     获取沪深京 A 股-实时行情
-    优先使用新浪财经数据源，失败时自动切换到东方财富网
+    优先使用新浪财经实时行情接口按代码表批量获取，失败时使用新浪股票列表，再失败自动切换到东方财富网
     :return: 实时行情
     :rtype: pandas.DataFrame
     """
+    try:
+        logger.info("正在使用新浪财经实时行情接口批量获取A股实时行情...")
+        result = _stock_zh_a_spot_sina_hq()
+        if len(result) > 0:
+            logger.info(f"新浪财经实时行情接口获取成功，共 {len(result)} 条数据")
+            return result
+    except Exception as e:
+        logger.warning(f"新浪实时行情接口失败: {e}，尝试新浪股票列表...")
     try:
         logger.info("正在使用新浪财经数据源获取A股实时行情...")
         result = _stock_zh_a_spot_sina()
@@ -38,22 +47,95 @@ def stock_zh_a_spot_em() -> pd.DataFrame:
             logger.error(f"东方财富网数据源也失败: {e2}")
             return pd.DataFrame()
 
+# 新浪实时行情接口每次请求的股票数，受URL长度限制
+SINA_HQ_BATCH_SIZE = 800
+# 新浪实时行情字段：名称,今开,昨收,最新价,最高,最低,买一,卖一,成交量(股),成交额(元),五档买卖...,日期,时间,状态
+SINA_HQ_COLUMNS = {0: 'name', 1: 'open_price', 2: 'pre_close_price', 3: 'new_price', 4: 'high_price',
+                   5: 'low_price', 8: 'volume', 9: 'deal_amount'}
+
+def _stock_zh_a_spot_sina_hq() -> pd.DataFrame:
+    """
+    使用新浪实时行情接口获取实时行情
+    股票列表取自代码表，分批并发请求；市值、换手率、市盈率、市净率由代码表中的股本和每股指标计算
+    """
+    master = symbol_master.get('stock')
+    if master is None or len(master.index) == 0:
+        return pd.DataFrame()
+    master = master[master['status'] == 1]
+    symbols = _sina_symbols(master['code'], master['market']).tolist()
+    batches = [','.join(symbols[i:i + SINA_HQ_BATCH_SIZE]) for i in range(0, len(symbols), SINA_HQ_BATCH_SIZE)]
+    texts = afe.run_limited(sina_data_fetcher.get_stock_realtime_async, [(batch,) for batch in batches])
+    if any(text is None for text in texts):
+        raise Exception("新浪实时行情分批获取不完整")
+    temp_df = _parse_sina_hq(''.join(texts))
+    if len(temp_df.index) == 0:
+        return temp_df
+
+    # 停牌、开盘前没有成交的价格为0，与东方财富接口的"-"一致置为空，不计算涨跌幅
+    for col in ('new_price', 'open_price', 'high_price', 'low_price'):
+        temp_df[col] = temp_df[col].where(temp_df[col] > 0)
+    pre_close = temp_df['pre_close_price'].where(temp_df['pre_close_price'] > 0)
+    temp_df['ups_downs'] = temp_df['new_price'] - pre_close
+    temp_df['change_rate'] = temp_df['ups_downs'] / pre_close * 100
+    temp_df['amplitude'] = (temp_df['high_price'] - temp_df['low_price']) / pre_close * 100
+
+    if 'total_shares' in master.columns:
+        base = master.set_index('code').reindex(temp_df['code'].values)
+        price = temp_df['new_price'].values
+        temp_df['total_market_cap'] = price * base['total_shares'].values
+        temp_df['free_cap'] = price * base['free_shares'].values
+        temp_df['turnoverrate'] = temp_df['volume'].values / base['free_shares'].values / 100
+        temp_df['pe'] = price / base['eps'].values
+        temp_df['pbnewmrq'] = price / base['bvps'].values
+
+    default_cols = ['code', 'name', 'new_price', 'change_rate', 'ups_downs', 'volume',
+                    'deal_amount', 'amplitude', 'open_price', 'high_price', 'low_price', 'pre_close_price',
+                    'turnoverrate', 'pe', 'pbnewmrq', 'total_market_cap', 'free_cap']
+    available_cols = [col for col in default_cols if col in temp_df.columns]
+    return temp_df[available_cols]
+
+def _sina_symbols(codes, markets):
+    """代码加交易所前缀：沪市sh，北交所bj，其余sz"""
+    codes = pd.Series(codes).astype(str).reset_index(drop=True)
+    prefix = np.where(np.asarray(markets) == 1, 'sh', np.where(codes.str.startswith(('4', '8', '92')), 'bj', 'sz'))
+    return prefix + codes
+
+def _parse_sina_hq(text) -> pd.DataFrame:
+    """解析新浪实时行情 var hq_str_sh600000="...";，返回以英文字段命名的DataFrame"""
+    items = pd.Series(text.split(';')).str.extract(r'hq_str_[a-z]{2}(\d{6})="([^"]+)"').dropna()
+    if len(items.index) == 0:
+        return pd.DataFrame()
+    values = items[1].str.split(',', expand=True)
+    temp_df = values[list(SINA_HQ_COLUMNS)].rename(columns=SINA_HQ_COLUMNS)
+    temp_df.insert(0, 'code', items[0].values)
+    for col in SINA_HQ_COLUMNS.values():
+        if col != 'name':
+            temp_df[col] = pd.to_numeric(temp_df[col], errors='coerce')
+    return temp_df.reset_index(drop=True)
+
 def _stock_zh_a_spot_sina() -> pd.DataFrame:
     """使用新浪财经获取实时行情"""
-    all_data = []
-    page = 1
     page_size = 100
-    
-    while True:
-        data = sina_data_fetcher.get_stock_list(page=page, page_size=page_size)
-        if not data:
-            break
-        all_data.extend(data)
-        logger.info(f"新浪财经: 第{page}页获取{len(data)}条，累计{len(all_data)}条")
-        if len(data) < 100:
-            break
-        page += 1
-        time.sleep(random.uniform(0.3, 0.6))
+    all_data = sina_data_fetcher.get_stock_list_all(page_size=page_size)
+    if all_data is not None:
+        logger.info(f"新浪财经: 并发分页获取{len(all_data)}条")
+        if all_data:
+            # 完整的股票列表，顺便更新代码表
+            symbol_master.update('stock', _symbol_frame_sina(all_data))
+    else:
+        # 获取股票总数失败时逐页获取
+        all_data = []
+        page = 1
+        while True:
+            data = sina_data_fetcher.get_stock_list(page=page, page_size=page_size)
+            if not data:
+                break
+            all_data.extend(data)
+            logger.info(f"新浪财经: 第{page}页获取{len(data)}条，累计{len(all_data)}条")
+            if len(data) < 100:
+                break
+            page += 1
+            time.sleep(random.uniform(0.3, 0.6))
     
     if not all_data:
         return pd.DataFrame()
@@ -113,25 +195,9 @@ def _stock_zh_a_spot_eastmoney() -> pd.DataFrame:
         "fs": "m:0 t:6,m:0 t:80,m:1 t:2,m:1 t:23,m:0 t:81 s:2048",
         "fields": "f2,f3,f4,f5,f6,f7,f8,f9,f10,f11,f12,f14,f15,f16,f17,f18,f20,f21,f22,f23,f24,f25,f26,f37,f38,f39,f40,f41,f45,f46,f48,f49,f57,f61,f100,f112,f113,f114,f115,f221",
     }
-    r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-    data_json = r.json()
-    
-    if not data_json.get("data") or not data_json["data"].get("diff"):
+    data = fetch_pages(url, params, parse_clist_page, source=DataSource.EASTMONEY)
+    if not data:
         return pd.DataFrame()
-    
-    data = data_json["data"]["diff"]
-    data_count = data_json["data"]["total"]
-    page_count = math.ceil(data_count/page_size)
-    
-    while page_count > 1:
-        time.sleep(random.uniform(0.5, 1))
-        page_current += 1
-        params["pn"] = page_current
-        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-        data_json = r.json()
-        if data_json.get("data") and data_json["data"].get("diff"):
-            data.extend(data_json["data"]["diff"])
-        page_count -= 1
 
     temp_df = pd.DataFrame(data)
     temp_df.columns = [
@@ -164,59 +230,71 @@ def _stock_zh_a_spot_eastmoney() -> pd.DataFrame:
     for col in numeric_cols:
         if col in temp_df.columns:
             temp_df[col] = pd.to_numeric(temp_df[col], errors="coerce")
+    # 成交量单位从手变成股，与新浪数据源一致。
+    temp_df["成交量"] = temp_df["成交量"] * 100
     
     return temp_df
 
-
-@lru_cache(maxsize=1)
 def code_id_map_em() -> dict:
     """
     获取股票和市场代码映射
+    代码表保存在本地供各进程共用，一天最多刷新一次
     :return: 股票和市场代码
     :rtype: dict
     """
-    try:
-        return _code_id_map_sina()
-    except Exception as e:
-        logger.warning(f"新浪代码映射失败: {e}")
-        return {}
+    return symbol_master.get_market_map('stock')
 
-def _code_id_map_sina() -> dict:
-    """使用新浪财经获取代码映射"""
-    code_id_dict = {}
-    all_data = []
-    page = 1
+def _symbol_list_sina() -> pd.DataFrame:
+    """使用新浪财经获取股票代码表，代码表过期时由 symbol_master 调用"""
     page_size = 100
-    
-    while True:
-        try:
-            data = sina_data_fetcher.get_stock_list(page=page, page_size=page_size)
-            if not data:
-                break
-            all_data.extend(data)
-            if len(data) < 100:
-                break
-            page += 1
-            # 增加睡眠时间，避免触发新浪API的频率限制
-            import time
-            import random
-            time.sleep(random.uniform(1.5, 2.5))
-        except Exception as e:
-            logger.warning(f"获取股票列表失败: {e}")
-            break
-    
-    for item in all_data:
-        code = item.get('code', '')
-        symbol = item.get('symbol', '')
-        if code and symbol:
-            if symbol.startswith('bj'):
-                code_id_dict[code] = 0
-            elif symbol.startswith('sh'):
-                code_id_dict[code] = 1
-            elif symbol.startswith('sz'):
-                code_id_dict[code] = 0
-    
-    return code_id_dict
+    all_data = sina_data_fetcher.get_stock_list_all(page_size=page_size)
+    if all_data is None:
+        # 获取股票总数失败时逐页获取，中途失败不更新代码表
+        all_data = []
+        page = 1
+        while True:
+            try:
+                data = sina_data_fetcher.get_stock_list(page=page, page_size=page_size)
+                if not data:
+                    break
+                all_data.extend(data)
+                if len(data) < 100:
+                    break
+                page += 1
+                # 增加睡眠时间，避免触发新浪API的频率限制
+                time.sleep(random.uniform(1.5, 2.5))
+            except Exception as e:
+                logger.warning(f"获取股票列表失败: {e}")
+                return None
+    return _symbol_frame_sina(all_data)
+
+def _symbol_frame_sina(all_data) -> pd.DataFrame:
+    """
+    新浪股票列表转为代码表：代码、市场标识(bj/sz为0，sh为1)、名称
+    另由价格、市值、市盈率、市净率反推股本(万股，与新浪市值单位万元一致)和每股收益、每股净资产，
+    供实时行情接口计算市值等字段
+    """
+    temp_df = pd.DataFrame(all_data)
+    if len(temp_df.index) == 0 or 'code' not in temp_df.columns or 'symbol' not in temp_df.columns:
+        return pd.DataFrame(columns=['code', 'market', 'name'])
+    symbol = temp_df['symbol'].fillna('').astype(str)
+    temp_df = temp_df[(temp_df['code'].fillna('') != '') & symbol.str.startswith(('sh', 'sz', 'bj'))]
+    symbol = temp_df['symbol'].astype(str)
+    data = pd.DataFrame({'code': temp_df['code'].values,
+                         'market': np.where(symbol.str.startswith('sh'), 1, 0),
+                         'name': temp_df['name'].values if 'name' in temp_df.columns else ''})
+    if {'trade', 'mktcap', 'nmc', 'per', 'pb'}.issubset(temp_df.columns):
+        trade = pd.to_numeric(temp_df['trade'], errors='coerce')
+        trade = trade.where(trade > 0).values
+        per = pd.to_numeric(temp_df['per'], errors='coerce')
+        pb = pd.to_numeric(temp_df['pb'], errors='coerce')
+        data['total_shares'] = pd.to_numeric(temp_df['mktcap'], errors='coerce').values / trade
+        data['free_shares'] = pd.to_numeric(temp_df['nmc'], errors='coerce').values / trade
+        data['eps'] = trade / per.where(per != 0).values
+        data['bvps'] = trade / pb.where(pb != 0).values
+    return data
+
+symbol_master.register('stock', _symbol_list_sina)
 
 
 def stock_zh_a_hist(
@@ -225,6 +303,7 @@ def stock_zh_a_hist(
     start_date: str = "19700101",
     end_date: str = "20500101",
     adjust: str = "",
+    datalen: int = 1000,
 ) -> pd.DataFrame:
     """
     获取股票历史K线数据
@@ -238,29 +317,53 @@ def stock_zh_a_hist(
     :type end_date: str
     :param adjust: choice of {"qfq": "前复权", "hfq": "后复权", "": "不复权"}
     :type adjust: str
+    :param datalen: 最近K线条数，增量更新时只取缺失部分
+    :type datalen: int
     :return: 每日行情
     :rtype: pandas.DataFrame
     """
     try:
-        return _stock_zh_a_hist_sina(symbol, period, start_date, end_date)
+        return _stock_zh_a_hist_sina(symbol, period, start_date, end_date, datalen)
     except Exception as e:
         logger.warning(f"新浪历史数据获取失败: {e}")
         return pd.DataFrame()
 
-def _stock_zh_a_hist_sina(symbol: str, period: str, start_date: str, end_date: str) -> pd.DataFrame:
-    """使用新浪财经获取历史K线"""
+async def stock_zh_a_hist_async(
+    symbol: str = "000001",
+    period: str = "daily",
+    start_date: str = "19700101",
+    end_date: str = "20500101",
+    adjust: str = "",
+    datalen: int = 1000,
+) -> pd.DataFrame:
+    """
+    获取股票历史K线数据，stock_zh_a_hist 的协程版本，用于批量获取
+    """
+    try:
+        full_symbol, scale = _stock_zh_a_hist_sina_args(symbol, period)
+        data = await sina_data_fetcher.get_kline_data_async(full_symbol, scale=scale, datalen=datalen)
+        return _stock_zh_a_hist_sina_frame(data, start_date, end_date)
+    except Exception as e:
+        logger.warning(f"新浪历史数据获取失败: {e}")
+        return pd.DataFrame()
+
+def _stock_zh_a_hist_sina_args(symbol: str, period: str):
     if symbol.startswith('6'):
         full_symbol = f'sh{symbol}'
     else:
         full_symbol = f'sz{symbol}'
     
     scale_map = {'daily': 240, 'weekly': 1200, 'monthly': 5200}
-    scale = scale_map.get(period, 240)
-    
-    datalen = 1000
-    
+    return full_symbol, scale_map.get(period, 240)
+
+def _stock_zh_a_hist_sina(symbol: str, period: str, start_date: str, end_date: str, datalen: int = 1000) -> pd.DataFrame:
+    """使用新浪财经获取历史K线"""
+    full_symbol, scale = _stock_zh_a_hist_sina_args(symbol, period)
     data = sina_data_fetcher.get_kline_data(full_symbol, scale=scale, datalen=datalen)
-    
+    return _stock_zh_a_hist_sina_frame(data, start_date, end_date)
+
+def _stock_zh_a_hist_sina_frame(data, start_date: str, end_date: str) -> pd.DataFrame:
+    """新浪K线数据转为历史行情DataFrame"""
     if not data:
         return pd.DataFrame()
     
@@ -5,18 +5,20 @@ Date: 2022/3/15 17:32
 Desc: 东方财富网-数据中心-龙虎榜单
 https://data.eastmoney.com/stock/tradedetail.html
 """
-import random
-import time
 import logging
 import pandas as pd
 from tqdm import tqdm
 from instock.core.multi_source_fetcher import multi_fetcher, DataSource
+from instock.core.http_cache import ttl_for_date
 
 __author__ = 'myh '
 __date__ = '2025/12/31 '
 
 logger = logging.getLogger(__name__)
 
+# 龙虎榜数据收盘后仍会更新的天数(自然日)
+LHB_SETTLE_DAYS = 30
+
 def stock_lhb_detail_em(
     start_date: str = "20230403", end_date: str = "20230417"
 ) -> pd.DataFrame:
@@ -30,6 +32,8 @@ def stock_lhb_detail_em(
     :return: 龙虎榜详情
     :rtype: pandas.DataFrame
     """
+    # 上榜后1~10日涨跌幅在之后的交易日还会更新，结束日期一个月后才永久缓存
+    cache_ttl = ttl_for_date(end_date, settle_days=LHB_SETTLE_DAYS)
     start_date = "-".join([start_date[:4], start_date[4:6], start_date[6:]])
     end_date = "-".join([end_date[:4], end_date[4:6], end_date[6:]])
     url = "https://datacenter-web.eastmoney.com/api/data/v1/get"
@@ -46,7 +50,7 @@ def stock_lhb_detail_em(
     }
     
     try:
-        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
+        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY, cache_ttl=cache_ttl)
         data_json = r.json()
         
         if not data_json.get("result"):
@@ -56,9 +60,8 @@ def stock_lhb_detail_em(
         total_page_num = data_json["result"]["pages"]
         big_df = pd.DataFrame()
         for page in range(1, total_page_num + 1):
-            time.sleep(random.uniform(0.5, 1))
             params.update({"pageNumber": page})
-            r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
+            r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY, cache_ttl=cache_ttl)
             data_json = r.json()
             if data_json.get("result") and data_json["result"].get("data"):
                 temp_df = pd.DataFrame(data_json["result"]["data"])
@@ -256,6 +259,7 @@ def stock_lhb_jgmmtj_em(
     :return: 机构买卖每日统计
     :rtype: pandas.DataFrame
     """
+    cache_ttl = ttl_for_date(end_date, settle_days=LHB_SETTLE_DAYS)
     start_date = "-".join([start_date[:4], start_date[4:6], start_date[6:]])
     end_date = "-".join([end_date[:4], end_date[4:6], end_date[6:]])
     url = "https://datacenter-web.eastmoney.com/api/data/v1/get"
@@ -272,7 +276,7 @@ def stock_lhb_jgmmtj_em(
     }
     
     try:
-        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
+        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY, cache_ttl=cache_ttl)
         data_json = r.json()
         
         if not data_json.get("result") or not data_json["result"].get("data"):
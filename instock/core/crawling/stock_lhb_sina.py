@@ -12,6 +12,7 @@ import requests
 from bs4 import BeautifulSoup
 from tqdm import tqdm
 from instock.core.singleton_proxy import proxys
+from instock.core.rate_limiter import rate_limiter
 
 
 def stock_lhb_detail_daily_sina(date: str = "20240222") -> pd.DataFrame:
@@ -26,6 +27,7 @@ def stock_lhb_detail_daily_sina(date: str = "20240222") -> pd.DataFrame:
     date = "-".join([date[:4], date[4:6], date[6:]])
     url = "https://vip.stock.finance.sina.com.cn/q/go.php/vInvestConsult/kind/lhb/index.phtml"
     params = {"tradedate": date}
+    rate_limiter.wait(url)
     r = requests.get(url, proxies = proxys().get_proxies(), params=params)
     soup = BeautifulSoup(r.text, features="lxml")
     selected_html = soup.find(name="div", attrs={"class": "list"}).find_all(
@@ -64,6 +66,7 @@ def _find_last_page(
         "last": recent_day,
         "p": "1",
     }
+    rate_limiter.wait(url)
     r = requests.get(url, proxies = proxys().get_proxies(), params=params)
     soup = BeautifulSoup(r.text, "lxml")
     try:
@@ -76,6 +79,7 @@ def _find_last_page(
                 "last": recent_day,
                 "p": previous_page,
             }
+            rate_limiter.wait(url)
             r = requests.get(url, proxies = proxys().get_proxies(), params=params)
             soup = BeautifulSoup(r.text, features="lxml")
             last_page = int(soup.find_all(attrs={"class": "page"})[-2].text)
@@ -106,6 +110,7 @@ def stock_lhb_ggtj_sina(symbol: str = "5") -> pd.DataFrame:
             "last": symbol,
             "p": page,
         }
+        rate_limiter.wait(url)
         r = requests.get(url, proxies = proxys().get_proxies(), params=params)
         temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
         big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
@@ -142,6 +147,7 @@ def stock_lhb_yytj_sina(symbol: str = "5") -> pd.DataFrame:
             "last": "5",
             "p": page,
         }
+        rate_limiter.wait(url)
         r = requests.get(url, proxies = proxys().get_proxies(), params=params)
         temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
         big_df = pd.concat([big_df, temp_df], ignore_index=True)
@@ -179,6 +185,7 @@ def stock_lhb_jgzz_sina(symbol: str = "5") -> pd.DataFrame:
             "last": symbol,
             "p": page,
         }
+        rate_limiter.wait(url)
         r = requests.get(url, proxies = proxys().get_proxies(), params=params)
         temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
         if temp_df.empty:
@@ -214,6 +221,7 @@ def stock_lhb_jgmx_sina() -> pd.DataFrame:
     params = {
         "p": "1",
     }
+    rate_limiter.wait(url)
     r = requests.get(url, proxies = proxys().get_proxies(), params=params)
     soup = BeautifulSoup(r.text, features="lxml")
     try:
@@ -225,6 +233,7 @@ def stock_lhb_jgmx_sina() -> pd.DataFrame:
         params = {
             "p": page,
         }
+        rate_limiter.wait(url)
         r = requests.get(url, proxies = proxys().get_proxies(), params=params)
         temp_df = pd.read_html(StringIO(r.text))[0].iloc[0:, :]
         big_df = pd.concat(objs=[big_df, temp_df], ignore_index=True)
@@ -11,6 +11,7 @@ import requests
 import re
 import numpy as np
 from instock.core.singleton_proxy import proxys
+from instock.core.http_cache import cached_request, ttl_for_date
 
 __author__ = 'myh '
 __date__ = '2025/5/9 '
@@ -26,7 +27,7 @@ def stock_limitup_reason(date: str = "2025-02-27") -> pd.DataFrame:
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.138 Safari/537.36 Thx"
     }
-    r = requests.get(url, proxies = proxys().get_proxies(), headers=headers)
+    r = cached_request(requests.get, url, ttl_for_date(date), proxies=proxys().get_proxies(), headers=headers)
     data_json = r.json()
 
     data = data_json["data"]
@@ -67,7 +68,7 @@ def stock_limitup_reason(date: str = "2025-02-27") -> pd.DataFrame:
             "_",
         ]
 
-    temp_df["详因"] = temp_df.apply(stock_limitup_detail, axis=1)
+    temp_df["详因"] = temp_df.apply(stock_limitup_detail, axis=1, cache_ttl=ttl_for_date(date))
     temp_df["换手率"] = round(temp_df["换手率"], 2)
     temp_df = temp_df[
         [
@@ -89,7 +90,7 @@ def stock_limitup_reason(date: str = "2025-02-27") -> pd.DataFrame:
     return temp_df
 
 
-def stock_limitup_detail(row):
+def stock_limitup_detail(row, cache_ttl=None):
     """
     同花顺涨停详因
     http://zx.10jqka.com.cn/event/harden/stockreason/id/70870005
@@ -100,7 +101,7 @@ def stock_limitup_detail(row):
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/89.0.4389.82 Safari/537.36"
     }
-    r = requests.get(url, proxies = proxys().get_proxies(), headers=headers)
+    r = cached_request(requests.get, url, cache_ttl, proxies=proxys().get_proxies(), headers=headers)
     data_text = r.text
 
     # match_title = re.search(r"var title = '(.*?)';", data_text)
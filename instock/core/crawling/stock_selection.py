@@ -1,19 +1,23 @@
 # -*- coding:utf-8 -*-
 # !/usr/bin/env python
 
-import math
-import random
-import time
 import logging
 import pandas as pd
 import instock.core.tablestructure as tbs
-from instock.core.multi_source_fetcher import multi_fetcher, DataSource
+from instock.core.multi_source_fetcher import multi_fetcher, DataSource, fetch_pages
 
 __author__ = 'myh '
 __date__ = '2025/12/31 '
 
 logger = logging.getLogger(__name__)
 
+def _parse_selection_page(r):
+    """选股器分页响应，返回(本页数据, 总条数)"""
+    data_json = r.json()
+    if not data_json.get("result") or not data_json["result"].get("data"):
+        return [], 0
+    return data_json["result"]["data"], data_json["result"]["count"]
+
 def stock_selection() -> pd.DataFrame:
     """
     东方财富网-个股-选股器
@@ -38,26 +42,11 @@ def stock_selection() -> pd.DataFrame:
     }
 
     try:
-        r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-        data_json = r.json()
-        
-        if not data_json.get("result") or not data_json["result"].get("data"):
+        data = fetch_pages(url, params, _parse_selection_page, page_key="p", page_size_key="ps",
+                           source=DataSource.EASTMONEY)
+        if not data:
             logger.warning("选股数据为空")
             return pd.DataFrame()
-        
-        data = data_json["result"]["data"]
-        data_count = data_json["result"]["count"]
-        page_count = math.ceil(data_count/page_size)
-        
-        while page_count > 1:
-            time.sleep(random.uniform(0.5, 1))
-            page_current += 1
-            params["p"] = page_current
-            r = multi_fetcher.make_request(url, params=params, source=DataSource.EASTMONEY)
-            data_json = r.json()
-            if data_json.get("result") and data_json["result"].get("data"):
-                data.extend(data_json["result"]["data"])
-            page_count -= 1
 
         temp_df = pd.DataFrame(data)
 
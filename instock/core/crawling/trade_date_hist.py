@@ -11,6 +11,7 @@ import pandas as pd
 import requests
 from py_mini_racer import MiniRacer
 from instock.core.singleton_proxy import proxys
+from instock.core.rate_limiter import rate_limiter
 
 hk_js_decode = """
 function d(t) {
@@ -311,6 +312,7 @@ def tool_trade_date_hist_sina() -> pd.DataFrame:
     :rtype: pandas.DataFrame
     """
     url = "https://finance.sina.com.cn/realstock/company/klc_td_sh.txt"
+    rate_limiter.wait(url)
     r = requests.get(url, proxies = proxys().get_proxies())
     js_code = MiniRacer()
     js_code.eval(hk_js_decode)
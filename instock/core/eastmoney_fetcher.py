@@ -10,6 +10,7 @@ import time
 import random
 import logging
 from instock.core.singleton_proxy import proxys
+from instock.core.rate_limiter import rate_limiter
 
 __author__ = 'myh '
 __date__ = '2025/12/31 '
@@ -48,8 +49,6 @@ class eastmoney_fetcher:
         self.base_dir = os.path.dirname(os.path.dirname(__file__))
         self.proxies = proxys().get_proxies()
         self.session = self._create_session()
-        self._last_request_time = 0
-        self._min_request_interval = 0.5
         self._request_count = 0
         self._max_requests_per_session = 500
         self._cookie_refresh_time = 0
@@ -164,19 +163,11 @@ class eastmoney_fetcher:
         
         session.headers.update(headers)
 
-    def _wait_for_rate_limit(self):
+    def _wait_for_rate_limit(self, url):
         """
-        请求频率控制，避免请求过快
+        请求频率控制，使用按站点共享的令牌桶，多线程安全
         """
-        current_time = time.time()
-        time_since_last = current_time - self._last_request_time
-        
-        if time_since_last < self._min_request_interval:
-            sleep_time = self._min_request_interval - time_since_last
-            sleep_time += random.uniform(0, 0.5)
-            time.sleep(sleep_time)
-        
-        self._last_request_time = time.time()
+        rate_limiter.wait(url)
 
     def _check_session_health(self):
         """
@@ -227,7 +218,7 @@ class eastmoney_fetcher:
         
         for attempt in range(retry):
             try:
-                self._wait_for_rate_limit()
+                self._wait_for_rate_limit(url)
                 self._check_session_health()
                 
                 self._update_session_headers(self.session, url)
@@ -239,6 +230,7 @@ class eastmoney_fetcher:
                     timeout=timeout,
                     verify=True
                 )
+                rate_limiter.on_response(url, response.status_code)
                 
                 if response.status_code == 403:
                     logger.warning(f"请求被拒绝(403)，尝试重建会话...")
@@ -306,7 +298,7 @@ class eastmoney_fetcher:
         
         for attempt in range(retry):
             try:
-                self._wait_for_rate_limit()
+                self._wait_for_rate_limit(url)
                 self._check_session_health()
                 
                 self._update_session_headers(self.session, url)
@@ -323,6 +315,7 @@ class eastmoney_fetcher:
                     timeout=timeout,
                     verify=True
                 )
+                rate_limiter.on_response(url, response.status_code)
                 
                 if response.status_code == 403:
                     logger.warning(f"POST请求被拒绝(403)，尝试重建会话...")
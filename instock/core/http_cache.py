@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import json
+import time
+import pickle
+import hashlib
+import logging
+import datetime
+import requests
+from requests.structures import CaseInsensitiveDict
+from instock.core.rate_limiter import rate_limiter
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 设置基础目录，每次加载使用。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+http_cache_path = os.path.join(cpath_current, 'cache', 'http')
+
+# 永久缓存，用于已收盘的历史日期数据
+CACHE_FOREVER = -1
+# 当天数据的默认缓存时间(秒)，避免重跑或异常重启时重复下载
+CACHE_TODAY_TTL = 5 * 60
+# 缓存中保存的响应头，用于条件请求重新验证
+CACHE_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+def ttl_for_date(date, today_ttl=CACHE_TODAY_TTL, settle_days=0):
+    """
+    按查询日期确定缓存时间：早于今天settle_days天以上的历史日期永久缓存，否则缓存today_ttl秒
+    settle_days用于上榜后几日涨跌幅等收盘后仍会更新的数据
+    """
+    if not date:
+        return today_ttl
+    if isinstance(date, str):
+        date = date.replace('-', '')
+        date = datetime.date(int(date[0:4]), int(date[4:6]), int(date[6:8]))
+    elif isinstance(date, datetime.datetime):
+        date = date.date()
+    if (datetime.date.today() - date).days > settle_days:
+        return CACHE_FOREVER
+    return today_ttl
+
+
+class ResponseCache:
+    """
+    HTTP响应缓存，按 方法+URL+参数 保存在本地文件
+    调用方按需开启并指定缓存时间；过期后有ETag/Last-Modified的发送条件请求，304时继续使用缓存
+    """
+
+    def __init__(self, base_dir=http_cache_path):
+        self.base_dir = base_dir
+        self.enabled = True
+
+    @staticmethod
+    def get_key(url, params=None, data=None, method='GET'):
+        key = json.dumps([method, url, params, data], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _get_file(self, key):
+        return os.path.join(self.base_dir, key[0:2], f"{key}.pkl")
+
+    def get(self, key):
+        """读取缓存条目，返回(条目, 是否未过期)，没有缓存返回(None, False)"""
+        if not self.enabled:
+            return None, False
+        cache_file = self._get_file(key)
+        if not os.path.isfile(cache_file):
+            return None, False
+        try:
+            with open(cache_file, 'rb') as f:
+                entry = pickle.load(f)
+        except Exception as e:
+            logging.error(f"http_cache.get处理异常：{cache_file}{e}")
+            return None, False
+        ttl = entry['ttl']
+        return entry, ttl == CACHE_FOREVER or time.time() - entry['time'] < ttl
+
+    def put(self, key, response, ttl):
+        if not self.enabled or response.status_code != 200:
+            return
+        entry = {
+            'url': response.url,
+            'content': response.content,
+            'encoding': response.encoding,
+            'headers': {h: response.headers[h] for h in CACHE_HEADERS if h in response.headers},
+            'time': time.time(),
+            'ttl': ttl,
+        }
+        self._write_file(key, entry)
+
+    def touch(self, key, entry, ttl):
+        """条件请求返回304，缓存内容未变化，重新计时"""
+        entry['time'] = time.time()
+        entry['ttl'] = ttl
+        self._write_file(key, entry)
+
+    def _write_file(self, key, entry):
+        cache_file = self._get_file(key)
+        cache_dir = os.path.dirname(cache_file)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            if not os.path.exists(cache_dir):
+                os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            logging.error(f"http_cache._write_file处理异常：{cache_file}{e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    @staticmethod
+    def get_validators(entry):
+        """过期条目的条件请求头"""
+        headers = {}
+        if entry is None:
+            return headers
+        if 'ETag' in entry['headers']:
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if 'Last-Modified' in entry['headers']:
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    @staticmethod
+    def to_response(entry):
+        """缓存条目还原为 requests.Response"""
+        response = requests.Response()
+        response._content = entry['content']
+        response.status_code = 200
+        response.encoding = entry['encoding']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.url = entry['url']
+        return response
+
+
+http_cache = ResponseCache()
+
+
+def cached_request(send, url, ttl=None, params=None, json=None, headers=None, **kwargs):
+    """
+    带缓存的请求，send为 requests.get/requests.post 或 session 的对应方法
+    ttl为None时不使用缓存，直接请求；实际发出请求前按站点限速
+    """
+    if ttl is None:
+        rate_limiter.wait(url)
+        return send(url, params=params, json=json, headers=headers, **kwargs)
+    method = getattr(send, '__name__', 'get').upper()
+    key = http_cache.get_key(url, params, json, method)
+    entry, fresh = http_cache.get(key)
+    if fresh:
+        return http_cache.to_response(entry)
+    _headers = dict(headers) if headers else {}
+    _headers.update(http_cache.get_validators(entry))
+    rate_limiter.wait(url)
+    response = send(url, params=params, json=json, headers=_headers, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        http_cache.touch(key, entry, ttl)
+        return http_cache.to_response(entry)
+    http_cache.put(key, response, ttl)
+    return response
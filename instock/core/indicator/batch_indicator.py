@@ -0,0 +1,648 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import numpy as np
+import pandas as pd
+import talib as tl
+import instock.core.tablestructure as tbs
+from instock.core.stock_hist_panel import StockHistPanel
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 横截面批量指标计算
+# 全部股票的最后CALC_THRESHOLD根K线拼成 (股票数, 天数) 二维数组，指标按天递推、按股票向量化，
+# 一次算出所有股票最后一天的指标，结果与 calculate_indicator.get_indicator 逐只计算一致。
+# 下面的 _sma/_ema/_rsi 等与talib同名函数的计算方法(种子值、起始位置、除零处理)一致。
+
+# 与 calculate_indicator.get_indicator 的 calc_threshold 一致
+CALC_THRESHOLD = 90
+# 多日期批量计算时K线窗口凑满该数量计算一次，限制中间数组占用的内存
+CHUNK_ROWS = 5000
+STATS_COLUMNS = tuple(tbs.STOCK_STATS_DATA['columns'])
+INPUT_COLUMNS = ('open', 'close', 'high', 'low', 'volume', 'amount', 'p_change')
+# talib 中判断为0的精度
+_EPSILON = 0.00000000000001
+
+
+def _nan_to_zero(x, inf=False):
+    x[np.isnan(x)] = 0.0
+    if inf:
+        x[np.isinf(x)] = 0.0
+    return x
+
+
+def _shift(x, n):
+    """按天后移n位，开头补0，与 Series.shift(n, fill_value=0.0) 一致"""
+    out = np.zeros_like(x)
+    out[:, n:] = x[:, :-n]
+    return out
+
+
+def _diff(x):
+    """与 np.insert(np.diff(x), 0, 0.0) 一致"""
+    out = np.zeros_like(x)
+    out[:, 1:] = np.diff(x, axis=1)
+    return out
+
+
+def _talib(func, *args, **kwargs):
+    """
+    与talib的处理方式一致：每只股票跳过开头含NaN的部分再计算，结果开头补NaN
+    开头位置相同的股票一起计算；args开头的二维数组为输入，其后为参数
+    """
+    count = 0
+    while count < len(args) and isinstance(args[count], np.ndarray):
+        count += 1
+    arrays, params = args[:count], args[count:]
+    if arrays[0].shape[0] == 1 and func in _TALIB_FUNCS:
+        # 只有一只股票时直接调用talib，talib只接受float64
+        result = _TALIB_FUNCS[func](*(a[0].astype(np.float64) for a in arrays), *params, **kwargs)
+        dtype = arrays[0].dtype
+        if isinstance(result, tuple):
+            return tuple(r.reshape(1, -1).astype(dtype, copy=False) for r in result)
+        return result.reshape(1, -1).astype(dtype, copy=False)
+    valid = ~np.isnan(arrays[0])
+    for a in arrays[1:]:
+        valid &= ~np.isnan(a)
+    size = arrays[0].shape[1]
+    begins = np.where(valid.any(axis=1), valid.argmax(axis=1), size)
+    if not begins.any():
+        return func(*arrays, *params, **kwargs)
+    results = None
+    for begin in np.unique(begins):
+        if begin >= size:
+            continue
+        rows = begins == begin
+        if rows.all():
+            # 全部股票开头位置相同时用切片，不复制数据
+            rows = slice(None)
+        result = func(*(a[rows, begin:] for a in arrays), *params, **kwargs)
+        result = result if isinstance(result, tuple) else (result,)
+        if results is None:
+            results = tuple(np.full_like(arrays[0], np.nan) for _ in result)
+        for out, r in zip(results, result):
+            out[rows, begin:] = r
+    if results is None:
+        return np.full_like(arrays[0], np.nan)
+    return results if len(results) > 1 else results[0]
+
+
+def _seq_sum(x):
+    """按列顺序累加，与talib的累加顺序一致，保证结果逐位相同"""
+    total = np.zeros(x.shape[0])
+    for t in range(x.shape[1]):
+        total = total + x[:, t]
+    return total
+
+
+def _sum(x, n):
+    """滚动求和，与talib相同先加新值再减旧值"""
+    out = np.full_like(x, np.nan)
+    if x.shape[1] < n:
+        return out
+    total = _seq_sum(x[:, :n - 1])
+    for t in range(n - 1, x.shape[1]):
+        total = total + x[:, t]
+        out[:, t] = total
+        total = total - x[:, t - n + 1]
+    return out
+
+
+def _sma(x, n):
+    return _sum(x, n) / n
+
+
+def _ema(x, n, seed_end=None):
+    """EMA，种子值为截止seed_end的n日简单平均(默认第n天)"""
+    seed_end = n - 1 if seed_end is None else seed_end
+    out = np.full_like(x, np.nan)
+    if x.shape[1] <= seed_end:
+        return out
+    k = 2.0 / (n + 1)
+    prev = _seq_sum(x[:, seed_end - n + 1:seed_end + 1]) / n
+    out[:, seed_end] = prev
+    for t in range(seed_end + 1, x.shape[1]):
+        prev = ((x[:, t] - prev) * k) + prev
+        out[:, t] = prev
+    return out
+
+
+def _window(x, n):
+    return np.lib.stride_tricks.sliding_window_view(x, n, axis=1)
+
+
+def _max(x, n):
+    out = np.full_like(x, np.nan)
+    if x.shape[1] >= n:
+        out[:, n - 1:] = _window(x, n).max(axis=2)
+    return out
+
+
+def _min(x, n):
+    out = np.full_like(x, np.nan)
+    if x.shape[1] >= n:
+        out[:, n - 1:] = _window(x, n).min(axis=2)
+    return out
+
+
+def _roc(x, n):
+    out = np.full_like(x, np.nan)
+    prev = x[:, :-n]
+    out[:, n:] = np.where(prev != 0.0, ((x[:, n:] / prev) - 1.0) * 100.0, 0.0)
+    return out
+
+
+def _macd(x, fast=12, slow=26, signal=9):
+    start = slow - 1
+    macd = _ema(x, fast, seed_end=start) - _ema(x, slow, seed_end=start)
+    macds = np.full_like(x, np.nan)
+    macds[:, start:] = _ema(macd[:, start:], signal)
+    macd[:, :start + signal - 1] = np.nan
+    return macd, macds, macd - macds
+
+
+def _ppo(x, fast=12, slow=26):
+    fast_ma = _ema(x, fast)
+    slow_ma = _ema(x, slow)
+    return np.where(np.abs(slow_ma) < _EPSILON, 0.0, ((fast_ma - slow_ma) / slow_ma) * 100.0)
+
+
+def _stoch(high, low, close, fastk=9, slowk=5, slowd=5):
+    highest = _max(high, fastk)
+    lowest = _min(low, fastk)
+    diff = (highest - lowest) / 100.0
+    fast_k = np.where(diff != 0.0, (close - lowest) / diff, 0.0)
+    fast_k[:, :fastk - 1] = np.nan
+    slow_k = _talib(_ema, fast_k, slowk)
+    slow_d = _talib(_ema, slow_k, slowd)
+    slow_k[np.isnan(slow_d)] = np.nan
+    return slow_k, slow_d
+
+
+def _bbands(x, n=20, nbdev=2.0):
+    middle = _sma(x, n)
+    variance = _sma(x * x, n) - middle * middle
+    std = np.where(variance < _EPSILON, 0.0, np.sqrt(np.abs(variance))) * nbdev
+    return middle + std, middle, middle - std
+
+
+def _trix(x, n):
+    return _talib(_roc, _talib(_ema, _talib(_ema, _ema(x, n), n), n), 1)
+
+
+def _tema(x, n):
+    e1 = _ema(x, n)
+    e2 = _talib(_ema, e1, n)
+    e3 = _talib(_ema, e2, n)
+    return e3 + ((3.0 * e1) - (3.0 * e2))
+
+
+def _rsi(x, n):
+    out = np.full_like(x, np.nan)
+    if x.shape[1] <= n:
+        return out
+    delta = np.diff(x, axis=1)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    prev_gain = _seq_sum(gain[:, :n]) / n
+    prev_loss = _seq_sum(loss[:, :n]) / n
+    for t in range(n, x.shape[1]):
+        if t > n:
+            prev_gain = (prev_gain * (n - 1) + gain[:, t - 1]) / n
+            prev_loss = (prev_loss * (n - 1) + loss[:, t - 1]) / n
+        total = prev_gain + prev_loss
+        out[:, t] = np.where(np.abs(total) < _EPSILON, 0.0, 100.0 * (prev_gain / np.where(total == 0, 1.0, total)))
+    return out
+
+
+def _trange(high, low, close):
+    out = np.full_like(high, np.nan)
+    prev_close = close[:, :-1]
+    out[:, 1:] = np.maximum(np.maximum(high[:, 1:] - low[:, 1:], np.abs(prev_close - high[:, 1:])),
+                            np.abs(prev_close - low[:, 1:]))
+    return out
+
+
+def _atr(high, low, close, n):
+    out = np.full_like(high, np.nan)
+    if high.shape[1] <= n:
+        return out
+    tr = _trange(high, low, close)
+    prev = _seq_sum(tr[:, 1:n + 1]) / n
+    out[:, n] = prev
+    for t in range(n + 1, high.shape[1]):
+        prev = (prev * (n - 1) + tr[:, t]) / n
+        out[:, t] = prev
+    return out
+
+
+def _willr(high, low, close, n):
+    highest = _max(high, n)
+    lowest = _min(low, n)
+    diff = (highest - lowest) / -100.0
+    out = np.where(diff != 0.0, (highest - close) / diff, 0.0)
+    out[:, :n - 1] = np.nan
+    return out
+
+
+def _cci(high, low, close, n):
+    out = np.full_like(high, np.nan)
+    if high.shape[1] < n:
+        return out
+    tp = (high + low + close) / 3
+    w = _window(tp, n)
+    avg = np.zeros(w.shape[:2])
+    for j in range(n):
+        avg = avg + w[:, :, j]
+    avg = avg / n
+    mean_dev = np.zeros(w.shape[:2])
+    for j in range(n):
+        mean_dev = mean_dev + np.abs(w[:, :, j] - avg)
+    mean_dev = mean_dev / n
+    dev = tp[:, n - 1:] - avg
+    out[:, n - 1:] = np.where((dev != 0.0) & (mean_dev != 0.0), dev / (0.015 * mean_dev), 0.0)
+    return out
+
+
+def _mfi(high, low, close, volume, n):
+    out = np.full_like(high, np.nan)
+    if high.shape[1] <= n:
+        return out
+    tp = (high + low + close) / 3.0
+    delta = np.diff(tp, axis=1)
+    money = tp[:, 1:] * volume[:, 1:]
+    positive = np.where(delta > 0, money, 0.0)
+    negative = np.where(delta < 0, money, 0.0)
+    # 与talib相同先减去移出窗口的值再加新值
+    pos = _seq_sum(positive[:, :n])
+    neg = _seq_sum(negative[:, :n])
+    for t in range(n, high.shape[1]):
+        if t > n:
+            pos = pos - positive[:, t - n - 1] + positive[:, t - 1]
+            neg = neg - negative[:, t - n - 1] + negative[:, t - 1]
+        total = pos + neg
+        out[:, t] = np.where(total < 1.0, 0.0, 100.0 * (pos / np.where(total == 0, 1.0, total)))
+    return out
+
+
+def _obv(close, volume):
+    signed = np.where(close[:, 1:] > close[:, :-1], volume[:, 1:],
+                      np.where(close[:, 1:] < close[:, :-1], -volume[:, 1:], 0.0))
+    out = np.empty_like(close)
+    out[:, 0] = volume[:, 0]
+    out[:, 1:] = volume[:, :1] + np.cumsum(signed, axis=1)
+    return out
+
+
+def _sar(high, low, acceleration=0.02, maximum=0.2):
+    out = np.full_like(high, np.nan)
+    if high.shape[1] < 2:
+        return out
+    # 第二天的 MINUS_DM 大于0时初始为空头
+    up = high[:, 1] - high[:, 0]
+    down = low[:, 0] - low[:, 1]
+    is_long = ~((down > 0) & (up < down))
+    af = np.full(high.shape[0], acceleration)
+    ep = np.where(is_long, high[:, 1], low[:, 1])
+    sar = np.where(is_long, low[:, 0], high[:, 0])
+    new_low, new_high = low[:, 1], high[:, 1]
+    for t in range(1, high.shape[1]):
+        prev_low, prev_high = new_low, new_high
+        new_low, new_high = low[:, t], high[:, t]
+        # 多头跌破、空头突破时反转
+        to_short = is_long & (new_low <= sar)
+        to_long = ~is_long & (new_high >= sar)
+        reverse = to_short | to_long
+        sar = np.where(reverse, ep, sar)
+        sar = np.where(to_short, np.maximum(np.maximum(sar, prev_high), new_high), sar)
+        sar = np.where(to_long, np.minimum(np.minimum(sar, prev_low), new_low), sar)
+        out[:, t] = sar
+        is_long = np.where(reverse, ~is_long, is_long)
+        new_ep = np.where(is_long, new_high > ep, new_low < ep) & ~reverse
+        ep = np.where(to_short, new_low, np.where(to_long, new_high, ep))
+        ep = np.where(new_ep, np.where(is_long, new_high, new_low), ep)
+        af = np.where(reverse, acceleration, np.where(new_ep, np.minimum(af + acceleration, maximum), af))
+        sar = sar + af * (ep - sar)
+        sar = np.where(is_long, np.minimum(np.minimum(sar, prev_low), new_low),
+                       np.maximum(np.maximum(sar, prev_high), new_high))
+    return out
+
+
+def _supertrend(close, b_ub, b_lb):
+    ub = np.empty_like(close)
+    lb = np.empty_like(close)
+    st = np.empty_like(close)
+    ub[:, 0] = b_ub[:, 0]
+    lb[:, 0] = b_lb[:, 0]
+    st[:, 0] = np.where(close[:, 0] <= ub[:, 0], ub[:, 0], lb[:, 0])
+    for i in range(1, close.shape[1]):
+        last_close = close[:, i - 1]
+        last_ub, last_lb, last_st = ub[:, i - 1], lb[:, i - 1], st[:, i - 1]
+        ub[:, i] = np.where((b_ub[:, i] < last_ub) | (last_close > last_ub), b_ub[:, i], last_ub)
+        lb[:, i] = np.where((b_lb[:, i] > last_lb) | (last_close < last_lb), b_lb[:, i], last_lb)
+        st[:, i] = np.where(last_st == last_ub, np.where(close[:, i] <= ub[:, i], ub[:, i], lb[:, i]),
+                            np.where(last_st == last_lb, np.where(close[:, i] > lb[:, i], lb[:, i], ub[:, i]),
+                                     np.nan))
+    return ub, lb, st
+
+
+# 对应的talib函数，计算单只股票(如 calculate_indicator.get_indicators_tail)时使用
+_TALIB_FUNCS = {
+    _sum: lambda x, n: tl.SUM(x, timeperiod=n),
+    _sma: lambda x, n: tl.MA(x, timeperiod=n),
+    _ema: lambda x, n: tl.EMA(x, timeperiod=n),
+    _max: lambda x, n: tl.MAX(x, timeperiod=n),
+    _min: lambda x, n: tl.MIN(x, timeperiod=n),
+    _roc: lambda x, n: tl.ROC(x, timeperiod=n),
+    _rsi: lambda x, n: tl.RSI(x, timeperiod=n),
+    _trix: lambda x, n: tl.TRIX(x, timeperiod=n),
+    _tema: lambda x, n: tl.TEMA(x, timeperiod=n),
+    _atr: lambda h, l, c, n: tl.ATR(h, l, c, timeperiod=n),
+    _willr: lambda h, l, c, n: tl.WILLR(h, l, c, timeperiod=n),
+    _cci: lambda h, l, c, n: tl.CCI(h, l, c, timeperiod=n),
+    _mfi: lambda h, l, c, v, n: tl.MFI(h, l, c, v, timeperiod=n),
+    _obv: tl.OBV,
+    _sar: tl.SAR,
+    _macd: lambda x: tl.MACD(x, fastperiod=12, slowperiod=26, signalperiod=9),
+    _ppo: lambda x: tl.PPO(x, fastperiod=12, slowperiod=26, matype=1),
+    _stoch: lambda h, l, c: tl.STOCH(h, l, c, fastk_period=9, slowk_period=5, slowk_matype=1, slowd_period=5,
+                                     slowd_matype=1),
+    _bbands: lambda x: tl.BBANDS(x, timeperiod=20, nbdevup=2, nbdevdn=2, matype=0),
+}
+
+
+def get_indicators_last(data):
+    """
+    批量计算指标
+    data: {列名: (股票数, 天数) 二维数组}，需含 INPUT_COLUMNS；数组为float32时按float32计算，中间数组内存减半
+    返回 (股票数, len(STATS_COLUMNS)) 二维数组，为各股票最后一天的指标，列顺序同 STOCK_STATS_DATA
+    """
+    r = {}
+    # 按天递推时逐列取值，转为列优先存储使每天的数据连续
+    data = {k: np.asfortranarray(data[k]) for k in INPUT_COLUMNS}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        o, c, h, l = data['open'], data['close'], data['high'], data['low']
+        v, a, p_change = data['volume'], data['amount'], data['p_change']
+        r['close'] = c
+
+        # macd
+        r['macd'], r['macds'], r['macdh'] = (_nan_to_zero(x) for x in _talib(_macd, c))
+
+        # kdj
+        kdjk, kdjd = (_nan_to_zero(x) for x in _talib(_stoch, h, l, c))
+        r['kdjk'], r['kdjd'], r['kdjj'] = kdjk, kdjd, 3 * kdjk - 2 * kdjd
+
+        # boll
+        r['boll_ub'], r['boll'], r['boll_lb'] = (_nan_to_zero(x) for x in _talib(_bbands, c))
+
+        # trix
+        r['trix'] = _nan_to_zero(_talib(_trix, c, n=12))
+        r['trix_20_sma'] = _nan_to_zero(_talib(_sma, r['trix'], 20))
+
+        # cr
+        m_price = a / v
+        m_price_sf1 = _shift(m_price, 1)
+        h_m = h - np.minimum(m_price_sf1, h)
+        m_l = m_price_sf1 - np.minimum(m_price_sf1, l)
+        cr = _nan_to_zero(_talib(_sum, h_m, 26) / _talib(_sum, m_l, 26), True) * 100
+        r['cr'] = cr
+        r['cr-ma1'] = _nan_to_zero(_talib(_sma, cr, 5))
+        r['cr-ma2'] = _nan_to_zero(_talib(_sma, cr, 10))
+        r['cr-ma3'] = _nan_to_zero(_talib(_sma, cr, 20))
+
+        # rsi
+        rsi = _nan_to_zero(_talib(_rsi, c, 14))
+        r['rsi'] = rsi
+        r['rsi_6'] = _nan_to_zero(_talib(_rsi, c, 6))
+        r['rsi_12'] = _nan_to_zero(_talib(_rsi, c, 12))
+        r['rsi_24'] = _nan_to_zero(_talib(_rsi, c, 24))
+
+        # vr
+        avs = _talib(_sum, np.where(p_change > 0, v, 0), 26)
+        bvs = _talib(_sum, np.where(p_change < 0, v, 0), 26)
+        cvs = _talib(_sum, np.where(p_change == 0, v, 0), 26)
+        vr = _nan_to_zero((avs + cvs / 2) / (bvs + cvs / 2), True) * 100
+        r['vr'] = vr
+        r['vr_6_sma'] = _nan_to_zero(_talib(_sma, vr, 6))
+
+        # atr
+        prev_close = _shift(c, 1)
+        h_l = h - l
+        h_cy = h - prev_close
+        cy_l = prev_close - l
+        r['tr'] = _nan_to_zero(np.fmax(np.fmax(h_l, np.abs(h_cy)), np.abs(cy_l)))
+        atr = _nan_to_zero(_talib(_atr, h, l, c, 14))
+        r['atr'] = atr
+
+        # DMI，stockstats计算公式
+        high_delta = _diff(h)
+        high_m = (high_delta + abs(high_delta)) / 2
+        low_delta = -_diff(l)
+        low_m = (low_delta + abs(low_delta)) / 2
+        pdm = _nan_to_zero(_talib(_ema, np.where(high_m > low_m, high_m, 0), 14))
+        pdi = _nan_to_zero(pdm / atr, True) * 100
+        mdm = _nan_to_zero(_talib(_ema, np.where(low_m > high_m, low_m, 0), 14))
+        mdi = _nan_to_zero(mdm / atr, True) * 100
+        dx = _nan_to_zero(abs(pdi - mdi) / (pdi + mdi), True) * 100
+        r['pdi'], r['mdi'], r['dx'] = pdi, mdi, dx
+        r['adx'] = _nan_to_zero(_talib(_ema, dx, 6))
+        r['adxr'] = _nan_to_zero(_talib(_ema, r['adx'], 6))
+
+        # wr
+        r['wr_6'] = _nan_to_zero(_talib(_willr, h, l, c, 6))
+        r['wr_10'] = _nan_to_zero(_talib(_willr, h, l, c, 10))
+        r['wr_14'] = _nan_to_zero(_talib(_willr, h, l, c, 14))
+
+        # cci
+        r['cci'] = _nan_to_zero(_talib(_cci, h, l, c, 14))
+        r['cci_84'] = _nan_to_zero(_talib(_cci, h, l, c, 84))
+
+        # dma
+        ma10 = _nan_to_zero(_talib(_sma, c, 10))
+        ma50 = _nan_to_zero(_talib(_sma, c, 50))
+        r['dma'] = ma10 - ma50
+        r['dma_10_sma'] = _nan_to_zero(_talib(_sma, r['dma'], 10))
+
+        # tema
+        r['tema'] = _nan_to_zero(_talib(_tema, c, 14))
+
+        # mfi
+        r['mfi'] = _nan_to_zero(_talib(_mfi, h, l, c, v, 14))
+        r['mfisma'] = _talib(_sma, r['mfi'], 6)
+
+        # vwma
+        r['vwma'] = _nan_to_zero(_talib(_sum, a, 14) / _talib(_sum, v, 14), True)
+        r['mvwma'] = _talib(_sma, r['vwma'], 6)
+
+        # ppo
+        r['ppo'] = _nan_to_zero(_talib(_ppo, c))
+        r['ppos'] = _nan_to_zero(_talib(_ema, r['ppo'], 9))
+        r['ppoh'] = r['ppo'] - r['ppos']
+
+        # stochrsi
+        rsi_min = _talib(_min, rsi, 14)
+        rsi_max = _talib(_max, rsi, 14)
+        r['stochrsi_k'] = _nan_to_zero((rsi - rsi_min) / (rsi_max - rsi_min), True) * 100
+        r['stochrsi_d'] = _talib(_sma, r['stochrsi_k'], 3)
+
+        # wt
+        esa = _nan_to_zero(_talib(_ema, m_price, 10))
+        esa_d = _talib(_ema, abs(m_price - esa), 10)
+        esa_ci = _nan_to_zero((m_price - esa) / (0.015 * esa_d), True)
+        r['wt1'] = _nan_to_zero(_talib(_ema, esa_ci, 21))
+        r['wt2'] = _nan_to_zero(_talib(_sma, r['wt1'], 4))
+
+        # Supertrend
+        m_atr = atr * 3
+        hl_avg = (h + l) / 2.0
+        r['supertrend_ub'], r['supertrend_lb'], r['supertrend'] = _supertrend(c, hl_avg + m_atr, hl_avg - m_atr)
+
+        # roc
+        r['roc'] = _nan_to_zero(_talib(_roc, c, 12))
+        r['rocma'] = _nan_to_zero(_talib(_sma, r['roc'], 6))
+        r['rocema'] = _nan_to_zero(_talib(_ema, r['roc'], 9))
+
+        # obv
+        r['obv'] = _nan_to_zero(_talib(_obv, c, v))
+
+        # sar
+        r['sar'] = _nan_to_zero(_talib(_sar, h, l))
+
+        # psy
+        price_up = np.where(c > prev_close, 1.0, 0.0)
+        r['psy'] = _nan_to_zero(_talib(_sum, price_up, 12) / 12.0) * 100
+        r['psyma'] = _talib(_sma, r['psy'], 6)
+
+        # BRAR
+        r['ar'] = _nan_to_zero(_talib(_sum, h - o, 26) / _talib(_sum, o - l, 26), True) * 100
+        r['br'] = _nan_to_zero(_talib(_sum, h_cy, 26) / _talib(_sum, cy_l, 26), True) * 100
+
+        # EMV
+        phl_avg = (_shift(h, 1) + _shift(l, 1)) / 2.0
+        r['emv'] = _nan_to_zero(_talib(_sum, (hl_avg - phl_avg) * h_l / a, 14))
+        r['emva'] = _nan_to_zero(_talib(_sma, r['emv'], 9))
+
+        # BIAS
+        ma6 = _nan_to_zero(_talib(_sma, c, 6))
+        r['bias'] = _nan_to_zero((c - ma6) / ma6, True) * 100
+
+        # DPO
+        r['dpo'] = _nan_to_zero(c - _shift(_talib(_sma, c, 11), 1))
+        r['madpo'] = _nan_to_zero(_talib(_sma, r['dpo'], 6))
+
+        # VHF
+        hcp_lcp = _nan_to_zero(_talib(_max, c, 28) - _talib(_min, c, 28))
+        r['vhf'] = _nan_to_zero(np.divide(hcp_lcp, _talib(_sum, abs(c - prev_close), 28)))
+
+        # RVI
+        rvi_x = ((c - o) + 2 * (prev_close - _shift(o, 1)) + 2 * (_shift(c, 2) - _shift(o, 2)) +
+                 (_shift(c, 3) - _shift(o, 3))) / 6
+        rvi_y = ((h - l) + 2 * (_shift(h, 1) - _shift(l, 1)) + 2 * (_shift(h, 2) - _shift(l, 2)) +
+                 (_shift(h, 3) - _shift(l, 3))) / 6
+        rvi = _nan_to_zero(_talib(_sma, rvi_x, 10) / _talib(_sma, rvi_y, 10), True)
+        r['rvi'] = rvi
+        r['rvis'] = (rvi + 2 * _shift(rvi, 1) + 2 * _shift(rvi, 2) + _shift(rvi, 3)) / 6
+
+        # FI
+        fi = _diff(c) * v
+        r['fi'] = fi
+        r['force_2'] = _nan_to_zero(_talib(_ema, fi, 2))
+        r['force_13'] = _nan_to_zero(_talib(_ema, fi, 13))
+
+        # ENE
+        r['ene_ue'] = (1 + 11 / 100) * ma10
+        r['ene_le'] = (1 - 9 / 100) * ma10
+        r['ene'] = (r['ene_ue'] + r['ene_le']) / 2
+
+        result = np.column_stack([r[k][:, -1] for k in STATS_COLUMNS])
+    # 与 get_indicator 一致，INF、NaN 返回0
+    result[~np.isfinite(result)] = 0.0
+    return result
+
+
+def get_indicator_batch(stocks, date=None, calc_threshold=CALC_THRESHOLD):
+    """
+    批量计算全部股票在date的指标
+    stocks: StockHistPanel 或 {(date, code): DataFrame}
+    返回 (DataFrame, 未计算的key列表)，DataFrame列为 date、code 及 STOCK_STATS_DATA 各列；
+    截止date的K线不足calc_threshold根的股票不批量计算，由调用方逐只计算
+    """
+    result, rests = get_indicator_batch_dates(stocks, [date], calc_threshold)
+    return result, rests[0]
+
+
+def get_indicator_batch_dates(stocks, dates, calc_threshold=CALC_THRESHOLD, chunk_rows=CHUNK_ROWS):
+    """
+    批量计算全部股票在多个日期的指标，每个日期的结果与 get_indicator_batch 单独计算该日期相同
+    各日期截止的K线窗口拼在一起，每凑满chunk_rows个窗口向量化计算一次
+    面板为紧凑存储(compact)时价格按最小变动单位还原为float64计算，结果与非紧凑存储相同，见 check_compact
+    返回 (DataFrame, [各日期未计算的key列表])，date为None时使用key中的日期
+    """
+    if not isinstance(stocks, StockHistPanel):
+        stocks = StockHistPanel.from_frames(stocks, use_shared_memory=False)
+    keys = stocks.keys_list
+    if len(keys) == 0:
+        return None, [[] for _ in dates]
+    end_dates = [date.strftime("%Y-%m-%d") if date is not None else keys[0][0] for date in dates]
+    try:
+        results = []
+        rests = []
+        chunk = []
+        for end_date in end_dates:
+            rows, data = stocks.get_tails(end_date, calc_threshold, INPUT_COLUMNS)
+            chunk.append((end_date, rows, data))
+            done = set(rows.tolist())
+            rests.append([k for i, k in enumerate(keys) if i not in done])
+            if sum(len(c[1]) for c in chunk) >= chunk_rows:
+                results.append(_calc_chunk(chunk, keys))
+                chunk = []
+        if chunk:
+            results.append(_calc_chunk(chunk, keys))
+    except Exception as e:
+        logging.error(f"batch_indicator.get_indicator_batch_dates处理异常：{e}")
+        return None, [list(keys) for _ in dates]
+    return pd.concat(results, ignore_index=True), rests
+
+
+def _calc_chunk(chunk, keys):
+    # 多个日期的K线窗口按行拼接后一次计算
+    rows = np.concatenate([c[1] for c in chunk])
+    if len(rows) > 0:
+        data = {col: np.concatenate([c[2][col] for c in chunk]) for col in INPUT_COLUMNS}
+        values = get_indicators_last(data)
+    else:
+        values = np.empty((0, len(STATS_COLUMNS)))
+    result = pd.DataFrame(values, columns=list(STATS_COLUMNS))
+    result.insert(0, 'code', [keys[i][1] for i in rows])
+    result.insert(0, 'date', np.repeat([c[0] for c in chunk], [len(c[1]) for c in chunk]))
+    return result
+
+
+def check_compact(stocks, date=None, calc_threshold=CALC_THRESHOLD, rtol=1e-9):
+    """
+    比较紧凑存储与非紧凑存储批量计算的结果
+    误差为 |差| / max(1, |非紧凑存储结果|)，返回各列误差的 DataFrame(最大值、99分位、超过rtol的股票数)
+    """
+    if isinstance(stocks, StockHistPanel):
+        frames = {k: stocks.get_frame(i) for i, k in enumerate(stocks.keys_list)}
+    else:
+        frames = stocks
+    result64, _ = get_indicator_batch(StockHistPanel.from_frames(frames, use_shared_memory=False, compact=False),
+                                      date, calc_threshold)
+    result_compact, _ = get_indicator_batch(StockHistPanel.from_frames(frames, use_shared_memory=False, compact=True),
+                                      date, calc_threshold)
+    if result64 is None or result_compact is None:
+        return None
+    result_compact = result_compact.set_index('code').loc[result64['code']]
+    errors = []
+    for c in STATS_COLUMNS:
+        expected = result64[c].values.astype(np.float64)
+        err = np.abs(result_compact[c].values.astype(np.float64) - expected) / np.maximum(1, np.abs(expected))
+        errors.append((c, err.max(initial=0.0), np.percentile(err, 99) if len(err) else 0.0,
+                       int((err > rtol).sum())))
+    errors = pd.DataFrame(errors, columns=['column', 'max', 'p99', 'count']).set_index('column')
+    if (errors['p99'] > rtol).any():
+        logging.error(f"batch_indicator.check_compact误差超过{rtol}：{list(errors.index[errors['p99'] > rtol])}")
+    return errors
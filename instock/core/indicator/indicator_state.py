@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import math
+import pickle
+import logging
+import threading
+from collections import deque
+import numpy as np
+import pandas as pd
+import instock.core.stock_hist_slice as hsl
+import instock.core.job_executor as jexe
+from instock.core.stock_hist_store import date_to_int
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 增量指标计算
+# 递推类、滚动窗口类指标保存每只股票的计算状态，新K线到来时只用新K线更新，每根K线O(1)。
+# 计算方法与talib一致，结果等于对从建立状态时第一根K线开始的全部历史调用talib，
+# 即 calculate_indicator.get_indicators 不指定calc_threshold时的结果(与K线图的指标相同)。
+# 每日指标作业原来按最近90根K线计算，递推类指标的种子每天变化，不能增量计算；
+# 开启后作业中 STATE_COLUMNS 各列改为增量指标，即全部历史的计算结果。
+
+# 设置基础目录，每次加载使用。
+cpath_current = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+indicator_state_path = os.path.join(cpath_current, 'cache', 'indicator_state')
+
+# 每日指标作业使用增量指标，设置环境变量 INSTOCK_INDICATOR_STATE=1 开启
+INDICATOR_STATE = os.environ.get('INSTOCK_INDICATOR_STATE', '0') == '1'
+# 支持增量计算的指标列
+STATE_COLUMNS = ('close', 'macd', 'macds', 'macdh', 'kdjk', 'kdjd', 'kdjj', 'cr', 'rsi_6', 'rsi_12', 'rsi',
+                 'rsi_24', 'vr', 'tr', 'atr', 'obv', 'sar', 'psy', 'br', 'ar')
+# talib 中判断为0的精度
+_EPSILON = 0.00000000000001
+
+
+def _zero(value, inf=False):
+    """与 calculate_indicator 中 NaN(及INF) 置0 一致"""
+    if value is None or math.isnan(value) or (inf and math.isinf(value)):
+        return 0.0
+    return value
+
+
+def _minimum(a, b):
+    """与 np.minimum 一致，有NaN时返回NaN"""
+    if math.isnan(a) or math.isnan(b):
+        return math.nan
+    return min(a, b)
+
+
+class StreamSum:
+    """滚动求和，与talib SUM相同先加新值再减旧值"""
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+        self.value = None
+
+    def update(self, x):
+        if len(self.window) == 0 and math.isnan(x):
+            # talib跳过开头的NaN
+            return None
+        self.window.append(x)
+        if len(self.window) < self.period:
+            self.total = self.total + x
+            return None
+        total = self.total + x
+        self.value = total
+        self.total = total - self.window[0]
+        return self.value
+
+
+class StreamSMA(StreamSum):
+
+    def update(self, x):
+        value = super().update(x)
+        return None if value is None else value / self.period
+
+
+class StreamEMA:
+    """
+    EMA，种子值为前period个值的简单平均
+    seed_count大于period时，种子为第seed_count个值前period个值的平均(talib MACD的快线)
+    """
+
+    def __init__(self, period, seed_count=None):
+        self.period = period
+        self.seed_count = period if seed_count is None else seed_count
+        self.k = 2.0 / (period + 1)
+        self.seed = []
+        self.value = None
+
+    def update(self, x):
+        if self.value is None:
+            if len(self.seed) == 0 and math.isnan(x):
+                return None
+            self.seed.append(x)
+            if len(self.seed) < self.seed_count:
+                return None
+            total = 0.0
+            for v in self.seed[-self.period:]:
+                total = total + v
+            self.value = total / self.period
+            self.seed = None
+            return self.value
+        self.value = ((x - self.value) * self.k) + self.value
+        return self.value
+
+
+class StreamRSI:
+    """Wilder RSI"""
+
+    def __init__(self, period):
+        self.period = period
+        self.prev = None
+        self.count = 0
+        self.gain = 0.0
+        self.loss = 0.0
+        self.value = None
+
+    def update(self, x):
+        if self.prev is None:
+            if not math.isnan(x):
+                self.prev = x
+            return None
+        delta = x - self.prev
+        self.prev = x
+        self.count += 1
+        n = self.period
+        if self.count <= n:
+            if delta < 0:
+                self.loss -= delta
+            else:
+                self.gain += delta
+            if self.count < n:
+                return None
+            self.loss /= n
+            self.gain /= n
+        else:
+            self.loss *= (n - 1)
+            self.gain *= (n - 1)
+            if delta < 0:
+                self.loss -= delta
+            else:
+                self.gain += delta
+            self.loss /= n
+            self.gain /= n
+        total = self.gain + self.loss
+        self.value = 0.0 if -_EPSILON < total < _EPSILON else 100.0 * (self.gain / total)
+        return self.value
+
+
+class StreamATR:
+    """Wilder ATR，第一根K线没有真实波幅"""
+
+    def __init__(self, period):
+        self.period = period
+        self.prev_close = None
+        self.seed = StreamSMA(period)
+        self.value = None
+
+    def update(self, high, low, close):
+        prev_close, self.prev_close = self.prev_close, close
+        if prev_close is None:
+            return None
+        tr = max(high - low, abs(prev_close - high), abs(prev_close - low))
+        if self.value is None:
+            self.value = self.seed.update(tr)
+            return self.value
+        n = self.period
+        self.value = (self.value * (n - 1) + tr) / n
+        return self.value
+
+
+class StreamMACD:
+    """talib MACD，快线与慢线同时以第slow个值为种子"""
+
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamEMA(fast, seed_count=slow)
+        self.slow = StreamEMA(slow)
+        self.signal = StreamEMA(signal)
+        self.value = (None, None, None)
+
+    def update(self, x):
+        fast = self.fast.update(x)
+        slow = self.slow.update(x)
+        if fast is None or slow is None:
+            return self.value
+        macd = fast - slow
+        signal = self.signal.update(macd)
+        if signal is not None:
+            self.value = (macd, signal, macd - signal)
+        return self.value
+
+
+class StreamSTOCH:
+    """talib STOCH，slowk、slowd 均为EMA"""
+
+    def __init__(self, fastk=9, slowk=5, slowd=5):
+        self.highs = deque(maxlen=fastk)
+        self.lows = deque(maxlen=fastk)
+        self.slowk = StreamEMA(slowk)
+        self.slowd = StreamEMA(slowd)
+        self.value = (None, None)
+
+    def update(self, high, low, close):
+        self.highs.append(high)
+        self.lows.append(low)
+        if len(self.highs) < self.highs.maxlen:
+            return self.value
+        highest = max(self.highs)
+        lowest = min(self.lows)
+        diff = (highest - lowest) / 100.0
+        fastk = (close - lowest) / diff if diff != 0.0 else 0.0
+        slowk = self.slowk.update(fastk)
+        if slowk is None:
+            return self.value
+        slowd = self.slowd.update(slowk)
+        if slowd is not None:
+            self.value = (slowk, slowd)
+        return self.value
+
+
+class StreamSAR:
+    """talib SAR，第二根K线确定初始方向"""
+
+    def __init__(self, acceleration=0.02, maximum=0.2):
+        self.acceleration = acceleration
+        self.maximum = maximum
+        self.first = None
+        self.is_long = None
+        self.value = None
+
+    def update(self, high, low):
+        if self.first is None:
+            self.first = (high, low)
+            return None
+        if self.is_long is None:
+            first_high, first_low = self.first
+            up = high - first_high
+            down = first_low - low
+            self.is_long = not (down > 0 and up < down)
+            self.af = self.acceleration
+            self.ep = high if self.is_long else low
+            self.sar = first_low if self.is_long else first_high
+            self.new_high, self.new_low = high, low
+        prev_high, prev_low = self.new_high, self.new_low
+        self.new_high, self.new_low = high, low
+        sar, ep, af = self.sar, self.ep, self.af
+        if self.is_long:
+            if low <= sar:
+                self.is_long = False
+                sar = max(ep, prev_high, high)
+                self.value = sar
+                af = self.acceleration
+                ep = low
+                sar = sar + af * (ep - sar)
+                sar = max(sar, prev_high, high)
+            else:
+                self.value = sar
+                if high > ep:
+                    ep = high
+                    af = min(af + self.acceleration, self.maximum)
+                sar = sar + af * (ep - sar)
+                sar = min(sar, prev_low, low)
+        else:
+            if high >= sar:
+                self.is_long = True
+                sar = min(ep, prev_low, low)
+                self.value = sar
+                af = self.acceleration
+                ep = high
+                sar = sar + af * (ep - sar)
+                sar = min(sar, prev_low, low)
+            else:
+                self.value = sar
+                if low < ep:
+                    ep = low
+                    af = min(af + self.acceleration, self.maximum)
+                sar = sar + af * (ep - sar)
+                sar = max(sar, prev_high, high)
+        self.sar, self.ep, self.af = sar, ep, af
+        return self.value
+
+
+class IndicatorState:
+    """
+    单只股票的增量指标状态
+    update 按日期顺序逐根传入K线，values 为最新一根K线的 STATE_COLUMNS 各指标
+    """
+
+    def __init__(self):
+        self.last_date = None
+        self.last_close = None
+        self.prev_close = 0.0
+        self.prev_m_price = 0.0
+        self.macd = StreamMACD()
+        self.stoch = StreamSTOCH()
+        self.rsi = {k: StreamRSI(n) for k, n in (('rsi_6', 6), ('rsi_12', 12), ('rsi', 14), ('rsi_24', 24))}
+        self.atr = StreamATR(14)
+        self.sar = StreamSAR()
+        self.obv = None
+        self.sums = {k: StreamSum(n) for k, n in (('h_m', 26), ('m_l', 26), ('av', 26), ('bv', 26), ('cv', 26),
+                                                   ('h_o', 26), ('o_l', 26), ('h_cy', 26), ('cy_l', 26),
+                                                   ('price_up', 12))}
+        self.values = {}
+
+    def update(self, date, open, close, high, low, volume, amount, p_change):
+        prev_close = self.prev_close
+        with np.errstate(divide='ignore', invalid='ignore'):
+            m_price = float(np.float64(amount) / np.float64(volume))
+        m_price_sf1 = self.prev_m_price
+        h_cy = high - prev_close
+        cy_l = prev_close - low
+        inputs = {
+            'h_m': high - _minimum(m_price_sf1, high),
+            'm_l': m_price_sf1 - _minimum(m_price_sf1, low),
+            'av': volume if p_change > 0 else 0.0,
+            'bv': volume if p_change < 0 else 0.0,
+            'cv': volume if p_change == 0 else 0.0,
+            'h_o': high - open,
+            'o_l': open - low,
+            'h_cy': h_cy,
+            'cy_l': cy_l,
+            'price_up': 1.0 if close > prev_close else 0.0,
+        }
+        s = {k: self.sums[k].update(x) for k, x in inputs.items()}
+
+        v = {'close': close}
+        macd, macds, macdh = self.macd.update(close)
+        v['macd'], v['macds'], v['macdh'] = _zero(macd), _zero(macds), _zero(macdh)
+        kdjk, kdjd = self.stoch.update(high, low, close)
+        v['kdjk'], v['kdjd'] = _zero(kdjk), _zero(kdjd)
+        v['kdjj'] = 3 * v['kdjk'] - 2 * v['kdjd']
+        v['cr'] = _zero(self._ratio(s['h_m'], s['m_l']), True) * 100
+        for k, stream in self.rsi.items():
+            v[k] = _zero(stream.update(close))
+        if s['av'] is None:
+            v['vr'] = 0.0
+        else:
+            v['vr'] = _zero(self._ratio(s['av'] + s['cv'] / 2, s['bv'] + s['cv'] / 2), True) * 100
+        v['tr'] = _zero(max(high - low, abs(h_cy), abs(cy_l)))
+        v['atr'] = _zero(self.atr.update(high, low, close))
+        self.obv = volume if self.obv is None else (
+            self.obv + volume if close > self.last_close else self.obv - volume if close < self.last_close else self.obv)
+        v['obv'] = _zero(self.obv)
+        v['sar'] = _zero(self.sar.update(high, low))
+        v['psy'] = _zero(None if s['price_up'] is None else s['price_up'] / 12.0) * 100
+        v['br'] = _zero(self._ratio(s['h_cy'], s['cy_l']), True) * 100
+        v['ar'] = _zero(self._ratio(s['h_o'], s['o_l']), True) * 100
+
+        self.prev_close = close
+        self.prev_m_price = m_price
+        self.last_close = close
+        self.last_date = date_to_int(date)
+        self.values = v
+        return v
+
+    @staticmethod
+    def _ratio(a, b):
+        if a is None or b is None:
+            return None
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return float(np.float64(a) / np.float64(b))
+
+    def update_frame(self, data):
+        """按顺序传入DataFrame中的全部K线"""
+        columns = [data[c].values for c in ('date', 'open', 'close', 'high', 'low', 'volume', 'amount', 'p_change')]
+        for row in zip(*columns):
+            self.update(pd.Timestamp(row[0]), *(float(x) for x in row[1:]))
+        return self.values
+
+    @classmethod
+    def from_frame(cls, data):
+        state = cls()
+        state.update_frame(data)
+        return state
+
+
+class IndicatorStateStore:
+    """
+    增量指标状态的本地存储，每只股票一个文件
+    历史K线复权后与状态中的最后收盘价不一致时，从头重新计算
+    """
+
+    def __init__(self, base_dir=indicator_state_path):
+        self.base_dir = base_dir
+        self._lock = threading.Lock()
+
+    def _get_file(self, code):
+        return os.path.join(self.base_dir, f"{code}.pkl")
+
+    def get(self, code):
+        cache_file = self._get_file(code)
+        if not os.path.isfile(cache_file):
+            return None
+        try:
+            with open(cache_file, 'rb') as f:
+                return pickle.load(f)
+        except Exception as e:
+            logging.error(f"indicator_state.get处理异常：{cache_file}{e}")
+        return None
+
+    def put(self, code, state):
+        if not os.path.exists(self.base_dir):
+            os.makedirs(self.base_dir, exist_ok=True)
+        cache_file = self._get_file(code)
+        tmp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            logging.error(f"indicator_state.put处理异常：{cache_file}{e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def update(self, code, data, save=True):
+        """
+        用历史K线更新股票的指标状态，返回最新指标
+        状态的最后日期在data中且收盘价一致时只计算之后的新K线，否则从data第一根K线重新计算
+        """
+        state = self.get(code)
+        dates = pd.to_datetime(data['date'])
+        dates = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).values
+        if state is not None:
+            i = np.searchsorted(dates, state.last_date)
+            if i < len(dates) and dates[i] == state.last_date and data['close'].values[i] == state.last_close:
+                if i == len(dates) - 1:
+                    return state.values
+                state.update_frame(data.iloc[i + 1:])
+            else:
+                state = None
+        if state is None:
+            state = IndicatorState.from_frame(data)
+        if save:
+            self.put(code, state)
+        return state.values
+
+
+indicator_state_store = IndicatorStateStore()
+
+
+def get_indicator_state(code_name, data, date=None):
+    """单只股票截止date的增量指标，返回 STATE_COLUMNS 各指标的值列表"""
+    end_date = code_name[0] if date is None else date.strftime("%Y-%m-%d")
+    data = hsl.as_of(data, end_date)
+    if data is None or len(data.index) == 0:
+        return None
+    values = indicator_state_store.update(code_name[1], data)
+    return [values[c] for c in STATE_COLUMNS]
+
+
+def update_indicators(data, stocks, dates, workers=None):
+    """
+    每日指标作业的结果data中 STATE_COLUMNS 各列替换为增量指标
+    dates按升序逐日更新状态，date为None时使用stocks中key的日期
+    """
+    try:
+        frames = []
+        for date in dates:
+            end_date = next(iter(stocks.keys()))[0] if date is None else date.strftime("%Y-%m-%d")
+            results = jexe.run_stocks(get_indicator_state, stocks.keys(), stocks, kwargs={'date': date},
+                                      workers=workers, name='indicator_state.update_indicators')
+            if not results:
+                continue
+            state = pd.DataFrame(list(results.values()), columns=list(STATE_COLUMNS))
+            state.insert(0, 'code', [k[1] for k in results.keys()])
+            state.insert(0, 'date', end_date)
+            frames.append(state)
+        if not frames:
+            return data
+        columns = list(data.columns)
+        data = data.set_index(['date', 'code'])
+        data.update(pd.concat(frames).set_index(['date', 'code']))
+        return data.reset_index()[columns]
+    except Exception as e:
+        logging.error(f"indicator_state.update_indicators处理异常：{e}")
+    return data
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 指标中逐行递推的计算
+# 安装了numba时编译为机器码执行；没有安装时按Python循环执行，输入先转为list，比逐个取numpy元素快。
+# 计算结果与 calculate_indicator 原来的逐行计算逐位相同，由 tools/golden.py 的 indicators_reference 检查。
+
+USE_NUMBA = numba is not None
+
+
+def _jit(func):
+    if not USE_NUMBA:
+        return func
+    return numba.njit(cache=True)(func)
+
+
+@_jit
+def _supertrend_loop(close, b_ub, b_lb, ub, lb, st):
+    size = len(close)
+    if size == 0:
+        return
+    ub[0] = b_ub[0]
+    lb[0] = b_lb[0]
+    if close[0] <= ub[0]:
+        st[0] = ub[0]
+    else:
+        st[0] = lb[0]
+    for i in range(1, size):
+        last_close = close[i - 1]
+        last_ub = ub[i - 1]
+        last_lb = lb[i - 1]
+        last_st = st[i - 1]
+
+        # calculate current upper band
+        if b_ub[i] < last_ub or last_close > last_ub:
+            ub[i] = b_ub[i]
+        else:
+            ub[i] = last_ub
+
+        # calculate current lower band
+        if b_lb[i] > last_lb or last_close < last_lb:
+            lb[i] = b_lb[i]
+        else:
+            lb[i] = last_lb
+
+        # calculate supertrend
+        if last_st == last_ub:
+            if close[i] <= ub[i]:
+                st[i] = ub[i]
+            else:
+                st[i] = lb[i]
+        elif last_st == last_lb:
+            if close[i] > lb[i]:
+                st[i] = lb[i]
+            else:
+                st[i] = ub[i]
+        else:
+            # 前一天为NaN(输入含NaN)时无法判断趋势
+            st[i] = np.nan
+
+
+def supertrend(close, b_ub, b_lb):
+    """
+    Supertrend 上轨、下轨、趋势线
+    close、b_ub、b_lb 为一维数组，返回 (ub, lb, st)
+    """
+    close = np.asarray(close, dtype=np.float64)
+    b_ub = np.asarray(b_ub, dtype=np.float64)
+    b_lb = np.asarray(b_lb, dtype=np.float64)
+    size = len(close)
+    if USE_NUMBA:
+        ub = np.empty(size, dtype=np.float64)
+        lb = np.empty(size, dtype=np.float64)
+        st = np.empty(size, dtype=np.float64)
+        _supertrend_loop(close, b_ub, b_lb, ub, lb, st)
+        return ub, lb, st
+    ub, lb, st = [0.0] * size, [0.0] * size, [0.0] * size
+    _supertrend_loop(close.tolist(), b_ub.tolist(), b_lb.tolist(), ub, lb, st)
+    return np.array(ub, dtype=np.float64), np.array(lb, dtype=np.float64), np.array(st, dtype=np.float64)
+
+
+def shift(x, n, fill_value=0.0):
+    """一维数组后移n位，开头补fill_value，与 Series.shift(n, fill_value=fill_value).values 一致"""
+    x = np.asarray(x)
+    out = np.full(x.shape, fill_value, dtype=x.dtype)
+    if n < len(x):
+        out[n:] = x[:len(x) - n]
+    return out
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import logging
+import multiprocessing
+import concurrent.futures
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 逐只股票计算的执行方式：
+# thread 线程池(默认40线程)，process 进程池(不超过CPU核数)，serial 当前线程顺序执行
+# 可用环境变量 INSTOCK_JOB_EXECUTOR 指定，默认多核用 process，单核用 thread
+EXECUTOR_MODES = ('thread', 'process', 'serial')
+DEFAULT_MODE = os.environ.get('INSTOCK_JOB_EXECUTOR', 'process' if (os.cpu_count() or 1) > 1 else 'thread')
+THREAD_WORKERS = 40
+# 进程池每个任务处理的股票数，减少任务分发的开销
+CHUNK_SIZE = 50
+
+# 进程池子进程中的共享数据，由 _init_worker 设置
+_worker_args = None
+
+
+def get_mode(mode=None):
+    mode = DEFAULT_MODE if mode is None else mode
+    if mode not in EXECUTOR_MODES:
+        logging.error(f"job_executor.get_mode不支持的执行方式：{mode}")
+        return 'thread'
+    return mode
+
+
+def _call(func, key, data, by_key, args, kwargs):
+    if by_key:
+        return func(key, data.get(key) if data is not None else None, *args, **kwargs)
+    return func(key, data, *args, **kwargs)
+
+
+def _run_keys(func, keys, data, by_key, args, kwargs, name):
+    results = []
+    for key in keys:
+        try:
+            result = _call(func, key, data, by_key, args, kwargs)
+            if result is not None:
+                results.append((key, result))
+        except Exception as e:
+            logging.error(f"{name}处理异常：{key[1]}代码{e}")
+    return results
+
+
+def _init_worker(*args):
+    global _worker_args
+    _worker_args = args
+
+
+def _run_chunk(keys):
+    func, data, by_key, args, kwargs, name = _worker_args
+    return _run_keys(func, keys, data, by_key, args, kwargs, name)
+
+
+def _get_context():
+    # forkserver 的子进程由单线程的服务进程创建，调用方有其它线程时也不会死锁；
+    # 历史数据面板在共享内存中，传给子进程时只传共享内存名称。
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def run_stocks(func, keys, data=None, args=(), kwargs=None, by_key=True, mode=None, workers=None,
+               chunk_size=CHUNK_SIZE, name='job_executor.run_stocks'):
+    """
+    对每只股票执行 func，返回 {key: 结果}，结果为None或处理异常的股票不返回
+    by_key为True时调用 func(key, data.get(key), *args, **kwargs)，否则 func(key, data, *args, **kwargs)
+    process 方式时 func 需是模块级函数，data 应为 StockHistPanel 以避免复制
+    """
+    kwargs = {} if kwargs is None else kwargs
+    keys = list(keys)
+    mode = get_mode(mode)
+    if len(keys) == 0:
+        return {}
+    if mode == 'serial':
+        return dict(_run_keys(func, keys, data, by_key, args, kwargs, name))
+    if mode == 'process':
+        try:
+            workers = min(workers or THREAD_WORKERS, os.cpu_count() or 1)
+            chunks = [keys[i:i + chunk_size] for i in range(0, len(keys), chunk_size)]
+            results = {}
+            with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=min(workers, len(chunks)), mp_context=_get_context(), initializer=_init_worker,
+                    initargs=(func, data, by_key, args, kwargs, name)) as executor:
+                for chunk_result in executor.map(_run_chunk, chunks):
+                    results.update(chunk_result)
+            return results
+        except Exception as e:
+            # 进程池不可用(如函数不能序列化)时改用线程池
+            logging.error(f"{name}进程池处理异常：{e}，改用线程池")
+    results = {}
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=THREAD_WORKERS if workers is None else workers) \
+                as executor:
+            future_to_data = {executor.submit(_call, func, key, data, by_key, args, kwargs): key for key in keys}
+            for future in concurrent.futures.as_completed(future_to_data):
+                key = future_to_data[future]
+                try:
+                    result = future.result()
+                    if result is not None:
+                        results[key] = result
+                except Exception as e:
+                    logging.error(f"{name}处理异常：{key[1]}代码{e}")
+    except Exception as e:
+        logging.error(f"{name}处理异常：{e}")
+    return results
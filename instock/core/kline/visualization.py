@@ -30,7 +30,11 @@ def get_plot_kline(code, stock, date, stock_name):
     plot_list = []
     try:
 
-        data = idr.get_indicators(stock, date, threshold=360)
+        # 只计算图中显示的指标
+        indicators = ["ma10", "ma20", "ma50", "ma200", "vol_5", "vol_10"]
+        for conf in iwd.indicators_dic:
+            indicators.extend(name for name in conf["dic"] if name != "close")
+        data = idr.get_indicators(stock, date, threshold=360, indicators=indicators)
         if data is None:
             return None
 
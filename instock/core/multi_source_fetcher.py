@@ -8,8 +8,15 @@ from urllib3.util.retry import Retry
 import time
 import random
 import logging
+import re
 import json
+import math
+import asyncio
+import functools
 from functools import lru_cache
+from instock.core.rate_limiter import rate_limiter
+import instock.core.async_fetcher as afe
+from instock.core.http_cache import http_cache
 
 __author__ = 'myh '
 __date__ = '2025/12/31 '
@@ -68,9 +75,6 @@ class MultiSourceFetcher:
         MultiSourceFetcher._initialized = True
         
         self.base_dir = os.path.dirname(os.path.dirname(__file__))
-        self._last_request_time = 0
-        # 增加请求间隔以避免触发API限制
-        self._min_request_interval = 2.5
         self._current_source = DataSource.AUTO
         self._source_status = {
             DataSource.EASTMONEY: {'available': True, 'last_check': 0, 'fail_count': 0, 'consecutive_failures': 0},
@@ -149,22 +153,23 @@ class MultiSourceFetcher:
         url_lower = url.lower()
         return any(domain in url_lower for domain in SINA_DOMAINS)
     
-    def _wait_for_rate_limit(self):
-        """请求频率控制"""
-        current_time = time.time()
-        time_since_last = current_time - self._last_request_time
-        if time_since_last < self._min_request_interval:
-            sleep_time = self._min_request_interval - time_since_last
-            sleep_time += random.uniform(0, 0.5)
-            time.sleep(sleep_time)
-        self._last_request_time = time.time()
+    def _wait_for_rate_limit(self, url):
+        """请求频率控制，按站点共享令牌桶，多线程安全"""
+        rate_limiter.wait(url)
     
-    def _wait_for_consecutive_failure(self, source):
-        """根据连续失败次数增加等待时间"""
+    def _get_consecutive_failure_wait(self, source):
+        """根据连续失败次数计算等待时间"""
         status = self._source_status[source]
         if status.get('consecutive_failures', 0) > 0:
             wait_time = self._consecutive_failure_penalty * status['consecutive_failures']
             logger.info(f"数据源 {source} 连续失败{status['consecutive_failures']}次，等待{wait_time}秒...")
+            return wait_time
+        return 0
+    
+    def _wait_for_consecutive_failure(self, source):
+        """根据连续失败次数增加等待时间"""
+        wait_time = self._get_consecutive_failure_wait(source)
+        if wait_time > 0:
             time.sleep(wait_time)
     
     def _update_source_status(self, source, success):
@@ -205,16 +210,8 @@ class MultiSourceFetcher:
         
         return DataSource.SINA
     
-    def make_request(self, url, params=None, source=None, retry=5, timeout=20):
-        """
-        发送请求，支持多数据源
-        注意：不同数据源的API URL不同，不会自动转换URL
-        
-        优化策略：
-        - 增加重试次数
-        - 使用指数退避算法
-        - 456错误使用更长的等待时间
-        """
+    def _resolve_source(self, url, source):
+        """选择数据源，URL只能由对应的数据源访问"""
         if source is None:
             source = self.get_available_source()
         
@@ -231,86 +228,207 @@ class MultiSourceFetcher:
             else:
                 logger.warning(f"新浪API不可用，无法通过东方财富数据源访问: {url[:50]}...")
                 raise requests.exceptions.RequestException(f"新浪数据源不可用")
+        return source
+    
+    def _prepare_request(self, url, source, session):
+        """设置请求头，返回实际请求的URL"""
+        if source == DataSource.SINA:
+            session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+        else:
+            session.headers['User-Agent'] = random.choice(USER_AGENTS)
+        
+        if source == DataSource.SINA and self._is_sina_url(url):
+            return url
+        elif url.startswith('http://'):
+            return 'https://' + url[7:]
+        return url
+    
+    def _get_status_wait(self, source, status_code, attempt):
+        """
+        根据响应码计算重试前的等待时间，不需要重试返回None
+        456错误使用指数退避，每次重试等待时间翻倍
+        """
+        if status_code == 403:
+            logger.warning(f"{source} 请求被拒绝(403)")
+            self._update_source_status(source, False)
+            return (2 ** attempt) + random.uniform(5, 15)
+        if status_code == 456:
+            logger.warning(f"{source} 请求频率过高(456)，尝试 {attempt+1}")
+            self._update_source_status(source, False)
+            return (2 ** attempt) * 15 + random.uniform(10, 30)
+        if status_code >= 500:
+            logger.warning(f"{source} 服务器错误({status_code})")
+            self._update_source_status(source, False)
+            return (2 ** attempt) + random.uniform(3, 8)
+        return None
+    
+    def _get_error_wait(self, source, attempt, e):
+        """根据请求异常计算重试前的等待时间"""
+        self._update_source_status(source, False)
+        if isinstance(e, requests.exceptions.ConnectionError):
+            logger.warning(f"{source} 连接错误: {str(e)[:100]}")
+            return (2 ** attempt) + random.uniform(5, 10)
+        if isinstance(e, requests.exceptions.Timeout):
+            logger.warning(f"{source} 超时: {e}")
+        else:
+            logger.warning(f"{source} 请求错误: {str(e)[:100]}")
+        return (2 ** attempt) + random.uniform(3, 8)
+    
+    def make_request(self, url, params=None, source=None, retry=5, timeout=20, cache_ttl=None):
+        """
+        发送请求，支持多数据源
+        注意：不同数据源的API URL不同，不会自动转换URL
         
-        self._wait_for_rate_limit()
+        优化策略：
+        - 增加重试次数
+        - 使用指数退避算法
+        - 456错误使用更长的等待时间
+        - cache_ttl不为None时使用响应缓存(秒，http_cache.CACHE_FOREVER永久)
+        """
+        cache_key = cache_entry = None
+        if cache_ttl is not None:
+            cache_key = http_cache.get_key(url, params)
+            cache_entry, fresh = http_cache.get(cache_key)
+            if fresh:
+                return http_cache.to_response(cache_entry)
+        
+        source = self._resolve_source(url, source)
         self._wait_for_consecutive_failure(source)
         
         session = self.sina_session if source == DataSource.SINA else self.eastmoney_session
         
         for attempt in range(retry):
             try:
-                if source == DataSource.SINA:
-                    session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-                else:
-                    session.headers['User-Agent'] = random.choice(USER_AGENTS)
-                
-                if source == DataSource.SINA and self._is_sina_url(url):
-                    pass
-                elif url.startswith('http://'):
-                    url = 'https://' + url[7:]
-                
+                url = self._prepare_request(url, source, session)
+                self._wait_for_rate_limit(url)
                 logger.info(f"正在请求 [{source}]: {url[:80]}...")
-                response = session.get(url, params=params, timeout=timeout, verify=True)
-                
-                if response.status_code == 403:
-                    logger.warning(f"{source} 请求被拒绝(403)")
-                    self._update_source_status(source, False)
-                    if attempt < retry - 1:
-                        wait_time = (2 ** attempt) + random.uniform(5, 15)
-                        logger.info(f"等待 {wait_time:.1f} 秒后重试...")
-                        time.sleep(wait_time)
-                        continue
+                response = session.get(url, params=params, timeout=timeout, verify=True,
+                                       headers=http_cache.get_validators(cache_entry))
+                rate_limiter.on_response(url, response.status_code)
                 
-                if response.status_code == 456:
-                    logger.warning(f"{source} 请求频率过高(456)，尝试 {attempt+1}/{retry}")
-                    self._update_source_status(source, False)
-                    if attempt < retry - 1:
-                        # 使用指数退避，每次重试等待时间翻倍
-                        wait_time = (2 ** attempt) * 15 + random.uniform(10, 30)
-                        logger.info(f"指数退避：等待 {wait_time:.1f} 秒后重试...")
-                        time.sleep(wait_time)
-                        continue
+                if response.status_code == 304 and cache_entry is not None:
+                    # 内容未变化，继续使用缓存
+                    http_cache.touch(cache_key, cache_entry, cache_ttl)
+                    self._update_source_status(source, True)
+                    return http_cache.to_response(cache_entry)
                 
-                if response.status_code >= 500:
-                    logger.warning(f"{source} 服务器错误({response.status_code})")
-                    self._update_source_status(source, False)
-                    if attempt < retry - 1:
-                        wait_time = (2 ** attempt) + random.uniform(3, 8)
-                        time.sleep(wait_time)
-                        continue
+                wait_time = self._get_status_wait(source, response.status_code, attempt)
+                if wait_time is not None and attempt < retry - 1:
+                    logger.info(f"等待 {wait_time:.1f} 秒后重试...")
+                    time.sleep(wait_time)
+                    continue
                 
                 response.raise_for_status()
                 self._update_source_status(source, True)
+                if cache_key is not None:
+                    http_cache.put(cache_key, response, cache_ttl)
                 return response
                 
-            except requests.exceptions.ConnectionError as e:
-                logger.warning(f"{source} 连接错误: {str(e)[:100]}")
-                self._update_source_status(source, False)
+            except requests.exceptions.RequestException as e:
+                wait_time = self._get_error_wait(source, attempt, e)
                 if attempt < retry - 1:
-                    wait_time = (2 ** attempt) + random.uniform(5, 10)
                     time.sleep(wait_time)
                     continue
-                    
-            except requests.exceptions.Timeout as e:
-                logger.warning(f"{source} 超时: {e}")
-                self._update_source_status(source, False)
-                if attempt < retry - 1:
-                    wait_time = (2 ** attempt) + random.uniform(3, 8)
-                    time.sleep(wait_time)
+        
+        raise requests.exceptions.RequestException(f"数据源 {source} 请求失败")
+    
+    async def make_request_async(self, url, params=None, source=None, retry=5, timeout=20):
+        """
+        make_request 的协程版本，数据源切换、重试和限速策略相同
+        等待都用 asyncio.sleep，不占用线程；请求本身在事件循环的线程池中执行
+        """
+        source = self._resolve_source(url, source)
+        wait_time = self._get_consecutive_failure_wait(source)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
+        
+        session = self.sina_session if source == DataSource.SINA else self.eastmoney_session
+        loop = asyncio.get_running_loop()
+        
+        for attempt in range(retry):
+            try:
+                url = self._prepare_request(url, source, session)
+                await asyncio.sleep(rate_limiter.reserve(url))
+                logger.info(f"正在请求 [{source}]: {url[:80]}...")
+                response = await loop.run_in_executor(
+                    None, functools.partial(session.get, url, params=params, timeout=timeout, verify=True))
+                rate_limiter.on_response(url, response.status_code)
+                
+                wait_time = self._get_status_wait(source, response.status_code, attempt)
+                if wait_time is not None and attempt < retry - 1:
+                    logger.info(f"等待 {wait_time:.1f} 秒后重试...")
+                    await asyncio.sleep(wait_time)
                     continue
-                    
+                
+                response.raise_for_status()
+                self._update_source_status(source, True)
+                return response
+                
             except requests.exceptions.RequestException as e:
-                logger.warning(f"{source} 请求错误: {str(e)[:100]}")
-                self._update_source_status(source, False)
+                wait_time = self._get_error_wait(source, attempt, e)
                 if attempt < retry - 1:
-                    wait_time = (2 ** attempt) + random.uniform(3, 8)
-                    time.sleep(wait_time)
+                    await asyncio.sleep(wait_time)
                     continue
         
         raise requests.exceptions.RequestException(f"数据源 {source} 请求失败")
 
 multi_fetcher = MultiSourceFetcher()
 
+# 分页接口并发请求页数，实际请求频率仍由 rate_limiter 按站点控制。
+PAGE_CONCURRENCY = 8
+
+
+def fetch_pages(url, params, parse, page_key="pn", page_size_key="pz", source=None, total=None,
+                concurrency=PAGE_CONCURRENCY):
+    """
+    分页接口并发获取
+    先请求第1页，parse(response)返回(本页数据列表, 总条数)，据此计算页数，
+    其余页在一个事件循环中并发请求，按页码顺序拼接返回
+    total: 已知总条数时传入，不使用parse返回的总条数
+    总条数内的页获取失败或为空时抛出异常，不返回不完整的数据
+    """
+    params = dict(params)
+    first_page = int(params[page_key])
+    page_size = int(params[page_size_key])
+    r = multi_fetcher.make_request(url, params=params, source=source)
+    data, _total = parse(r)
+    if not data:
+        if total:
+            raise requests.exceptions.RequestException(f"分页数据为空，第{first_page}页: {url[:50]}...")
+        return []
+    data = list(data)
+    if total is None:
+        total = _total
+    if not total:
+        return data
+    page_count = math.ceil(int(total) / page_size)
+    if page_count <= 1:
+        return data
+
+    async def _fetch_page(page):
+        _params = dict(params)
+        _params[page_key] = page
+        _r = await multi_fetcher.make_request_async(url, params=_params, source=source)
+        # 总条数内的页为空与获取失败相同
+        return parse(_r)[0] or None
+
+    pages = list(range(first_page + 1, first_page + page_count))
+    results = afe.run_limited(_fetch_page, [(page,) for page in pages], concurrency)
+    for page, rows in zip(pages, results):
+        if rows is None:
+            raise requests.exceptions.RequestException(f"分页数据获取失败或为空，第{page}页: {url[:50]}...")
+        data.extend(rows)
+    return data
+
+
+def parse_clist_page(r):
+    """东方财富clist分页响应，返回(本页数据, 总条数)，用作 fetch_pages 的parse"""
+    data_json = r.json()
+    if not data_json.get("data") or not data_json["data"].get("diff"):
+        return [], 0
+    return data_json["data"]["diff"], data_json["data"]["total"]
+
+
 class sina_data_fetcher:
     """新浪财经数据获取器"""
     
@@ -369,6 +487,47 @@ class sina_data_fetcher:
                 logger.warning(f"东方财富网获取股票列表也失败: {e2}")
             return []
     
+    @staticmethod
+    def get_stock_count(node="hs_a"):
+        """获取A股股票总数，失败返回None"""
+        url = "http://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/Market_Center.getHQNodeStockCount"
+        try:
+            r = multi_fetcher.make_request(url, params={"node": node}, source=DataSource.SINA)
+            return int(re.findall(r"\d+", r.text)[0])
+        except Exception as e:
+            logger.warning(f"获取股票总数失败: {e}")
+            return None
+    
+    @staticmethod
+    def get_stock_list_all(page_size=100):
+        """
+        获取全部A股股票列表，先取股票总数，各页并发请求
+        获取总数失败或列表条数与总数不一致时返回None，由调用方逐页获取，不用不完整的列表更新代码表
+        """
+        count = sina_data_fetcher.get_stock_count()
+        if not count:
+            return None
+        url = "http://vip.stock.finance.sina.com.cn/quotes_service/api/json_v2.php/Market_Center.getHQNodeData"
+        params = {
+            "page": 1,
+            "num": page_size,
+            "sort": "symbol",
+            "asc": 1,
+            "node": "hs_a",
+            "symbol": "",
+            "_s_r_a": "page"
+        }
+        try:
+            data = fetch_pages(url, params, lambda r: (r.json(), None), page_key="page", page_size_key="num",
+                               source=DataSource.SINA, total=count)
+        except Exception as e:
+            logger.warning(f"并发获取股票列表失败: {e}")
+            return None
+        if len(data) != count:
+            logger.warning(f"并发获取股票列表不完整: {len(data)}/{count}")
+            return None
+        return data
+    
     @staticmethod
     def get_stock_realtime(codes):
         """获取股票实时行情"""
@@ -382,6 +541,16 @@ class sina_data_fetcher:
         except:
             return ""
     
+    @staticmethod
+    async def get_stock_realtime_async(codes):
+        """获取股票实时行情，get_stock_realtime 的协程版本，失败时抛出异常"""
+        if isinstance(codes, list):
+            codes = ','.join(codes)
+        
+        url = f"http://hq.sinajs.cn/list={codes}"
+        r = await multi_fetcher.make_request_async(url, source=DataSource.SINA, timeout=10)
+        return r.text
+    
     @staticmethod
     def get_kline_data(symbol, scale=240, datalen=365):
         """获取K线数据
@@ -399,6 +568,19 @@ class sina_data_fetcher:
         r = multi_fetcher.make_request(url, params=params, source=DataSource.SINA)
         return r.json()
     
+    @staticmethod
+    async def get_kline_data_async(symbol, scale=240, datalen=365):
+        """获取K线数据，get_kline_data 的协程版本"""
+        url = "https://quotes.sina.cn/cn/api/json_v2.php/CN_MarketDataService.getKLineData"
+        params = {
+            "symbol": symbol,
+            "scale": scale,
+            "ma": "no",
+            "datalen": datalen
+        }
+        r = await multi_fetcher.make_request_async(url, params=params, source=DataSource.SINA)
+        return r.json()
+    
     @staticmethod
     def get_stock_info(code):
         """获取个股信息"""
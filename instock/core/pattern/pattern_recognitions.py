@@ -2,6 +2,7 @@
 # -*- coding: utf-8 -*-
 
 import logging
+import instock.core.stock_hist_slice as hsl
 
 __author__ = 'myh '
 __date__ = '2023/3/24 '
@@ -10,8 +11,7 @@ __date__ = '2023/3/24 '
 def get_pattern_recognitions(data, stock_column, end_date=None, threshold=120, calc_threshold=None):
     isCopy = False
     if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask]
+        data = hsl.as_of(data, end_date)
         isCopy = True
     if calc_threshold is not None:
         data = data.tail(n=calc_threshold)
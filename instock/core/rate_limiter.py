@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+import logging
+import threading
+from urllib.parse import urlparse
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+logger = logging.getLogger(__name__)
+
+# 各站点请求频率配置，按域名后缀匹配
+# rate: 初始每秒请求数, burst: 允许的突发请求数, min_rate/max_rate: 自适应调整的上下限
+HOST_RATE_LIMITS = {
+    'eastmoney.com': {'rate': 2.0, 'burst': 4, 'min_rate': 0.2, 'max_rate': 10.0},
+    'sina.com.cn': {'rate': 0.5, 'burst': 2, 'min_rate': 0.1, 'max_rate': 5.0},
+    'sinajs.cn': {'rate': 0.5, 'burst': 2, 'min_rate': 0.1, 'max_rate': 5.0},
+    'sina.cn': {'rate': 0.5, 'burst': 2, 'min_rate': 0.1, 'max_rate': 5.0},
+    '10jqka.com.cn': {'rate': 1.0, 'burst': 2, 'min_rate': 0.1, 'max_rate': 5.0},
+}
+DEFAULT_RATE_LIMIT = {'rate': 1.0, 'burst': 2, 'min_rate': 0.1, 'max_rate': 5.0}
+
+# 被限流(456/429/403)时速率减半，成功时每次增加RATE_INCREASE，直到上限
+RATE_DECREASE_FACTOR = 0.5
+RATE_INCREASE = 0.02
+THROTTLE_STATUS_CODES = (403, 429, 456)
+
+
+class TokenBucket:
+    """
+    线程安全的令牌桶
+    令牌按rate匀速生成，最多累积burst个，每个请求消耗一个令牌
+    """
+
+    def __init__(self, rate, burst, min_rate=None, max_rate=None):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.min_rate = float(min_rate if min_rate is not None else rate)
+        self.max_rate = float(max_rate if max_rate is not None else rate)
+        self._tokens = float(burst)
+        self._last_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._last_time) * self.rate)
+        self._last_time = now
+
+    def reserve(self):
+        """预占一个令牌，返回需要等待的秒数，由调用方等待(线程sleep或协程asyncio.sleep)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # 先预占令牌，在锁外等待，这样各线程按到达顺序排队。
+            self._tokens -= 1.0
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self):
+        """取一个令牌，没有令牌时等待，返回等待秒数"""
+        wait_time = self.reserve()
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+    def penalize(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate * RATE_DECREASE_FACTOR)
+            self._tokens = min(self._tokens, 0.0)
+            return self.rate
+
+    def reward(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + RATE_INCREASE)
+            return self.rate
+
+
+class RateLimiter:
+    """
+    按站点共享的请求频率控制
+    所有爬虫模块共用，每个站点一个令牌桶，根据456/429/403响应自适应降速
+    """
+
+    def __init__(self, limits=None, default=None):
+        self._limits = dict(HOST_RATE_LIMITS if limits is None else limits)
+        self._default = dict(DEFAULT_RATE_LIMIT if default is None else default)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _get_key(self, url):
+        host = urlparse(url).hostname or url
+        host = host.lower()
+        for suffix in self._limits:
+            if host == suffix or host.endswith('.' + suffix):
+                return suffix
+        return host
+
+    def get_bucket(self, url):
+        key = self._get_key(url)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(**self._limits.get(key, self._default))
+        return bucket
+
+    def configure(self, host, rate=None, burst=None, min_rate=None, max_rate=None):
+        """修改站点频率配置，已创建的令牌桶同时生效"""
+        with self._lock:
+            limit = dict(self._limits.get(host, self._default))
+            for k, v in (('rate', rate), ('burst', burst), ('min_rate', min_rate), ('max_rate', max_rate)):
+                if v is not None:
+                    limit[k] = v
+            self._limits[host] = limit
+            self._buckets[host] = TokenBucket(**limit)
+
+    def wait(self, url):
+        return self.get_bucket(url).acquire()
+
+    def reserve(self, url):
+        return self.get_bucket(url).reserve()
+
+    def on_response(self, url, status_code):
+        """根据响应码调整速率"""
+        bucket = self.get_bucket(url)
+        if status_code in THROTTLE_STATUS_CODES:
+            rate = bucket.penalize()
+            logger.info(f"{self._get_key(url)} 被限流({status_code})，请求频率降为 {rate:.2f}次/秒")
+        elif status_code < 400:
+            bucket.reward()
+
+
+rate_limiter = RateLimiter()
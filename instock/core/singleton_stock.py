@@ -6,6 +6,7 @@ import concurrent.futures
 import instock.core.stockfetch as stf
 import instock.core.tablestructure as tbs
 import instock.lib.trade_time as trd
+from instock.core.stock_hist_panel import StockHistPanel
 from instock.lib.singleton_type import singleton_type
 
 __author__ = 'myh '
@@ -25,15 +26,28 @@ class stock_data(metaclass=singleton_type):
 
 
 # 读取股票历史数据
+# date_start(YYYYMMDD)早于默认区间的开始日期时从date_start开始，多日期作业用最早日期的区间。
 class stock_hist_data(metaclass=singleton_type):
-    def __init__(self, date=None, stocks=None, workers=16):
+    def __init__(self, date=None, stocks=None, workers=16, date_start=None):
+        spot = None
         if stocks is None:
-            _subset = stock_data(date).get_data()[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
+            spot = stock_data(date).get_data()
+            _subset = spot[list(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])]
             stocks = [tuple(x) for x in _subset.values]
         if stocks is None:
             self.data = None
             return
-        date_start, is_cache = trd.get_trade_hist_interval(stocks[0][0])  # 提高运行效率，只运行一次
+        _date_start, is_cache = trd.get_trade_hist_interval(stocks[0][0])  # 提高运行效率，只运行一次
+        if date_start is None or _date_start < date_start:
+            date_start = _date_start
+        if is_cache and spot is not None:
+            # 收盘后用已加载的实时行情补当日K线，只有缺失更多K线的股票才请求历史数据。
+            count = stf.stock_hist_append_spot(spot)
+            logging.info(f"singleton.stock_hist_data实时行情补当日K线：{count}只")
+        if is_cache:
+            # 缺失K线在一个事件循环中批量获取写入本地存储，下面逐只读取时不再请求网络。
+            count = stf.prefetch_stock_hist(stocks, date_start, is_cache)
+            logging.info(f"singleton.stock_hist_data批量预取历史数据：{count}只")
         _data = {}
         try:
             # max_workers是None还是没有给出，将默认为机器cup个数*5
@@ -45,9 +59,8 @@ class stock_hist_data(metaclass=singleton_type):
                     try:
                         __data = future.result()
                         if __data is not None:
-                            # 使用(date, code)作为key，保留与股票列表一致的格式
-                            stock_key = (stock[0], stock[1])
-                            _data[stock_key] = __data
+                            # 使用股票列表的(date, code, name)作为key，各任务按此取名称
+                            _data[tuple(stock)] = __data
                     except Exception as e:
                         logging.error(f"singleton.stock_hist_data处理异常：{stock[1]}代码{e}")
         except Exception as e:
@@ -55,7 +68,13 @@ class stock_hist_data(metaclass=singleton_type):
         if not _data:
             self.data = None
         else:
-            self.data = _data
+            # 按股票列表顺序合并为连续存储的面板，各任务按(date, code)取DataFrame的用法不变。
+            _data = {k: _data[k] for k in (tuple(s) for s in stocks) if k in _data}
+            try:
+                self.data = StockHistPanel.from_frames(_data)
+            except Exception as e:
+                logging.error(f"singleton.stock_hist_data构建面板处理异常：{e}")
+                self.data = _data
 
     def get_data(self):
         return self.data
@@ -10,12 +10,20 @@ __date__ = '2023/3/10 '
 
 
 # 读取股票交易日历数据
+# dates为排序的交易日列表，用于二分查找；data为集合，用于判断是否交易日
 class stock_trade_date(metaclass=singleton_type):
     def __init__(self):
+        self.data = None
+        self.dates = None
         try:
-            self.data = stf.fetch_stocks_trade_date()
+            self.dates = stf.fetch_stocks_trade_date()
+            if self.dates is not None:
+                self.data = set(self.dates)
         except Exception as e:
             logging.error(f"singleton.stock_trade_date处理异常：{e}")
 
     def get_data(self):
         return self.data
+
+    def get_dates(self):
+        return self.dates
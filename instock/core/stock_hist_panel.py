@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import weakref
+import logging
+import collections.abc
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from instock.core.stock_hist_store import HIST_COLUMNS, date_to_int, ints_to_datetime
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 面板中的数值列，与 stockfetch.fetch_stock_hist 返回的DataFrame一致(多一列p_change)
+PANEL_COLUMNS = HIST_COLUMNS[1:] + ('p_change',)
+# 紧凑存储：价格等列用float32，成交量、成交额放大为整数用int64，取出时转回float64
+# 设置环境变量 INSTOCK_COMPACT_DTYPE=1 开启
+COMPACT_DTYPE = os.environ.get('INSTOCK_COMPACT_DTYPE', '0') == '1'
+# 紧凑存储时按整数保存的列及放大倍数：成交量(股)，成交额(分)
+INT_COLUMNS = {'volume': 1, 'amount': 100}
+# 整数列中表示空值的数
+_INT_NAN = np.iinfo(np.int64).min
+# 紧凑存储时按最小变动单位保存的列及小数位数，取出float64时四舍五入还原为原来的数值(与非紧凑存储逐位相同)
+# 其它float32列(p_change)取出时只转换类型
+DECIMAL_COLUMNS = {'open': 2, 'close': 2, 'high': 2, 'low': 2, 'amplitude': 2, 'quote_change': 2,
+                   'ups_downs': 2, 'turnover': 2}
+
+
+class StockHistPanel(collections.abc.Mapping):
+    """
+    全部股票历史K线的连续存储面板
+    所有股票的K线按股票顺序首尾相接：日期为int32数组，数值列为 (列数, 总行数) 的float64二维数组，
+    offsets[i]:offsets[i+1] 是第i只股票的行范围。
+    数组放在共享内存中，传给进程池时只传共享内存名称，子进程直接映射，不复制数据。
+    按 (date, code, name) 取值时返回与原来相同格式的DataFrame，原有按字典使用的代码不需要修改。
+    紧凑存储(compact)时 values 为float32，INT_COLUMNS 中的列放大后存入int64的 ints，取出的数据仍为float64。
+    """
+
+    def __init__(self, keys, offsets, dates, values, columns=PANEL_COLUMNS, shms=None, owner=False, ints=None):
+        self.keys_list = list(keys)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.dates = dates
+        self.values = values
+        self.ints = ints
+        self.compact = ints is not None
+        self.columns = tuple(columns)
+        self._key_index = {k: i for i, k in enumerate(self.keys_list)}
+        self._code_index = {k[1]: i for i, k in enumerate(self.keys_list)}
+        # 列名 → (是否整数列, 所在数组的行)
+        float_columns, int_columns = self._split_columns(self.columns, self.compact)
+        self._column_index = {c: (False, i) for i, c in enumerate(float_columns)}
+        self._column_index.update({c: (True, i) for i, c in enumerate(int_columns)})
+        self._datetimes = None
+        self._shms = shms
+        self._owner = owner
+        # 创建者在面板被回收或进程退出时删除共享内存；finalize不引用面板本身，不会使面板一直不被回收
+        self._finalizer = weakref.finalize(self, StockHistPanel._release, shms, True) \
+            if owner and shms is not None else None
+
+    @staticmethod
+    def _split_columns(columns, compact):
+        if not compact:
+            return tuple(columns), ()
+        return tuple(c for c in columns if c not in INT_COLUMNS), tuple(c for c in columns if c in INT_COLUMNS)
+
+    @staticmethod
+    def _get_shapes(columns, compact, total):
+        """日期、浮点数、整数三个数组的 (形状, 类型)"""
+        float_columns, int_columns = StockHistPanel._split_columns(columns, compact)
+        return (((total,), np.int32), ((len(float_columns), total), np.float32 if compact else np.float64),
+                ((len(int_columns), total), np.int64))
+
+    @classmethod
+    def from_frames(cls, frames, columns=PANEL_COLUMNS, use_shared_memory=True, compact=None):
+        """
+        由 {(date, code, name): DataFrame} 构建面板，DataFrame需含date列和columns中的列
+        compact为None时按 COMPACT_DTYPE 设置
+        """
+        compact = COMPACT_DTYPE if compact is None else compact
+        keys = [k for k, v in frames.items() if v is not None and len(v.index) > 0]
+        lengths = np.array([len(frames[k].index) for k in keys], dtype=np.int64)
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        total = int(offsets[-1])
+        shapes = cls._get_shapes(columns, compact, total)
+
+        shms = None
+        arrays = None
+        if use_shared_memory and total > 0:
+            shms = []
+            try:
+                arrays = []
+                for shape, dtype in shapes:
+                    shm = shared_memory.SharedMemory(create=True, size=max(int(np.prod(shape)), 1) * np.dtype(dtype).itemsize)
+                    shms.append(shm)
+                    arrays.append(np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+                shms = tuple(shms)
+            except Exception as e:
+                # /dev/shm 空间不足等情况使用进程内数组，传给子进程时复制。
+                logging.error(f"stock_hist_panel.from_frames共享内存处理异常：{e}")
+                cls._release(shms, True)
+                shms = None
+        if shms is None:
+            arrays = [np.empty(shape, dtype=dtype) for shape, dtype in shapes]
+        dates, values, ints = arrays
+
+        float_columns, int_columns = cls._split_columns(columns, compact)
+        for i, k in enumerate(keys):
+            data = frames[k]
+            start, end = offsets[i], offsets[i + 1]
+            _dates = pd.to_datetime(data['date'])
+            dates[start:end] = (_dates.dt.year * 10000 + _dates.dt.month * 100 + _dates.dt.day).values
+            for j, c in enumerate(float_columns):
+                if c in data.columns:
+                    values[j, start:end] = pd.to_numeric(data[c], errors='coerce').values
+                else:
+                    values[j, start:end] = np.nan
+            for j, c in enumerate(int_columns):
+                _values = pd.to_numeric(data[c], errors='coerce').values if c in data.columns \
+                    else np.full(end - start, np.nan)
+                isnan = np.isnan(_values)
+                ints[j, start:end] = np.where(isnan, 0, np.rint(_values * INT_COLUMNS[c]))
+                ints[j, start:end][isnan] = _INT_NAN
+        return cls(keys, offsets, dates, values, columns, shms=shms, owner=True, ints=ints if compact else None)
+
+    @classmethod
+    def _attach(cls, keys, offsets, columns, compact, names):
+        shms = tuple(shared_memory.SharedMemory(name=name) for name in names)
+        shapes = cls._get_shapes(columns, compact, int(offsets[-1]))
+        dates, values, ints = (np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+                               for (shape, dtype), shm in zip(shapes, shms))
+        return cls(keys, offsets, dates, values, columns, shms=shms, owner=False, ints=ints if compact else None)
+
+    def __reduce__(self):
+        # 共享内存只传名称，子进程映射同一块内存；进程内数组按普通对象复制。
+        if self._shms is not None:
+            return (StockHistPanel._attach,
+                    (self.keys_list, self.offsets, self.columns, self.compact, tuple(shm.name for shm in self._shms)))
+        return StockHistPanel, (self.keys_list, self.offsets, self.dates, self.values, self.columns, None, False,
+                                self.ints)
+
+    @staticmethod
+    def _release(shms, unlink):
+        if shms is None:
+            return
+        for shm in shms:
+            # 还有数组引用共享内存时close会失败，仍要删除共享内存
+            try:
+                shm.close()
+            except Exception:
+                pass
+            if unlink:
+                try:
+                    shm.unlink()
+                except Exception:
+                    pass
+
+    def close(self):
+        """释放共享内存，创建者同时删除共享内存"""
+        shms, self._shms = self._shms, None
+        if shms is None:
+            return
+        self.dates = self.values = self.ints = None
+        if self._finalizer is not None:
+            self._finalizer()
+        else:
+            self._release(shms, False)
+
+    def __len__(self):
+        return len(self.keys_list)
+
+    def __iter__(self):
+        return iter(self.keys_list)
+
+    def __contains__(self, key):
+        return key in self._key_index
+
+    def __getitem__(self, key):
+        return self.get_frame(self._key_index[key])
+
+    def index_of(self, key):
+        """(date, code) 或 code 对应的股票序号，不存在返回None"""
+        if isinstance(key, tuple):
+            return self._key_index.get(key)
+        return self._code_index.get(key)
+
+    def get_slice(self, i):
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def get_datetimes(self):
+        """全部行的datetime64数组，每个进程只转换一次"""
+        if self._datetimes is None:
+            self._datetimes = ints_to_datetime(self.dates).values
+        return self._datetimes
+
+    def get_column(self, column, index=slice(None), dtype=np.float64):
+        """
+        列数据，index为行切片或行号数组，转换为dtype
+        非紧凑存储且dtype为float64时，行切片返回视图，不复制数据
+        """
+        is_int, row = self._column_index[column]
+        if not is_int:
+            values = self.values[row, index] if isinstance(index, slice) else self.values[row][index]
+            if self.compact and dtype == np.float64 and column in DECIMAL_COLUMNS:
+                return np.round(values.astype(np.float64), DECIMAL_COLUMNS[column])
+            return values if values.dtype == dtype else values.astype(dtype)
+        ints = self.ints[row, index] if isinstance(index, slice) else self.ints[row][index]
+        values = ints.astype(dtype)
+        values[ints == _INT_NAN] = np.nan
+        scale = INT_COLUMNS[column]
+        return values if scale == 1 else values / dtype(scale)
+
+    def _get_block(self, s):
+        # 行范围内全部列的 (列数, 行数) float64数组
+        if not self.compact:
+            return self.values[:, s]
+        return np.vstack([self.get_column(c, s) for c in self.columns])
+
+    def view(self, key, column=None):
+        """
+        按股票取只读数组视图，不复制数据(紧凑存储时转换为float64，会复制)
+        column为None返回 (日期int数组, (列数, 行数)数值数组)，否则返回该列数组
+        """
+        i = key if isinstance(key, (int, np.integer)) else self.index_of(key)
+        s = self.get_slice(i)
+        if column is None:
+            dates, values = self.dates[s], self._get_block(s)
+            dates.flags.writeable = False
+            values.flags.writeable = False
+            return dates, values
+        values = self.get_column(column, s)
+        values.flags.writeable = False
+        return values
+
+    def get_frame(self, i, date_end=None):
+        """
+        第i只股票的DataFrame，格式与 stockfetch.fetch_stock_hist 一致
+        数据从面板复制，调用方可以任意修改；date_end 截止到该日期(含)
+        """
+        s = self.get_slice(i)
+        if date_end is not None:
+            end = s.start + int(np.searchsorted(self.dates[s], date_to_int(date_end), side='right'))
+            s = slice(s.start, end)
+        dates = self.get_datetimes()[s]
+        data = pd.DataFrame(self._get_block(s).T, columns=list(self.columns), copy=True)
+        data.insert(0, 'date', dates)
+        data.index = pd.DatetimeIndex(dates, name='日期')
+        return data
+
+    def get_tails(self, date_end=None, length=90, columns=None, dtype=np.float64):
+        """
+        各股票截止date_end(含)的最后length根K线，右对齐拼成 (股票数, length) 二维数组
+        返回 (股票序号数组, {列名: 二维数组})，K线不足length根的股票不在结果中
+        """
+        columns = self.columns if columns is None else columns
+        starts = self.offsets[:-1]
+        if date_end is None:
+            ends = self.offsets[1:].copy()
+        else:
+            date_end = date_to_int(date_end)
+            ends = np.array([s + np.searchsorted(self.dates[s:e], date_end, side='right')
+                             for s, e in zip(starts, self.offsets[1:])], dtype=np.int64)
+        rows = np.flatnonzero(ends - starts >= length)
+        idx = (ends[rows] - length)[:, None] + np.arange(length)
+        return rows, {c: self.get_column(c, idx, dtype) for c in columns}
+
+    def get_code(self, code):
+        """按股票代码取DataFrame，不存在返回None"""
+        i = self._code_index.get(code)
+        return None if i is None else self.get_frame(i)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime
+import numpy as np
+import pandas as pd
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 历史K线按日期截取
+# K线按日期升序排列，用二分查找定位行号再按位置切片，代替 data.loc[data['date'] <= end_date] 逐行比较和复制。
+# 返回的DataFrame与原数据共用内存，需要增加列或修改数据时由调用方复制。
+# date列可以是datetime64、'YYYY-MM-DD'字符串或date对象，与原来的比较结果一致。
+
+
+def _search(data, date, side):
+    values = data['date'].values
+    if len(values) == 0:
+        return 0
+    if np.issubdtype(values.dtype, np.datetime64):
+        key = pd.Timestamp(date).to_datetime64().astype(values.dtype)
+    elif isinstance(values[0], str):
+        key = date if isinstance(date, str) else date.strftime("%Y-%m-%d")
+    elif isinstance(values[0], datetime.datetime):
+        key = pd.Timestamp(date).to_pydatetime()
+    else:
+        key = to_date(date)
+    return int(np.searchsorted(values, key, side=side))
+
+
+def as_of(data, end_date):
+    """截止end_date(含)的K线，end_date为None时返回原数据"""
+    if end_date is None:
+        return data
+    return data.iloc[:_search(data, end_date, 'right')]
+
+
+def before(data, end_date):
+    """end_date(不含)之前的K线"""
+    return data.iloc[:_search(data, end_date, 'left')]
+
+
+def since(data, start_date):
+    """start_date(含)起的K线"""
+    return data.iloc[_search(data, start_date, 'left'):]
+
+
+def after(data, start_date):
+    """start_date(不含)之后的K线"""
+    return data.iloc[_search(data, start_date, 'right'):]
+
+
+def to_date(value):
+    """date列的值(datetime64、'YYYY-MM-DD'字符串、date/datetime)转为date"""
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    return pd.Timestamp(value).date()
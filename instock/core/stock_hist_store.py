@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import logging
+import threading
+import numpy as np
+import pandas as pd
+import instock.core.tablestructure as tbs
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 设置基础目录，每次加载使用。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+stock_hist_store_path = os.path.join(cpath_current, 'cache', 'hist_store')
+
+# 历史K线列存储结构：每只股票一个定长记录文件，日期用int32(yyyymmdd)，其余字段float64。
+# 文件只追加，可直接用 numpy.memmap 映射读取，不需要解压。
+HIST_COLUMNS = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+HIST_DTYPE = np.dtype([('date', '<i4')] + [(c, '<f8') for c in HIST_COLUMNS[1:]])
+
+
+def date_to_int(date):
+    """日期转int(yyyymmdd)，支持 'YYYY-MM-DD'、'YYYYMMDD'、date/datetime"""
+    if date is None:
+        return None
+    if isinstance(date, str):
+        return int(date.replace('-', '')[0:8])
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def ints_to_datetime(dates):
+    """int(yyyymmdd)数组转 datetime64 数组"""
+    dates = np.asarray(dates, dtype=np.int64)
+    return pd.to_datetime(pd.DataFrame({'year': dates // 10000, 'month': dates // 100 % 100, 'day': dates % 100}))
+
+
+def frame_to_records(data):
+    """历史K线DataFrame转为定长记录数组，按日期排序并去重"""
+    dates = pd.to_datetime(data['date'])
+    records = np.empty(len(data.index), dtype=HIST_DTYPE)
+    records['date'] = (dates.dt.year * 10000 + dates.dt.month * 100 + dates.dt.day).values
+    for c in HIST_COLUMNS[1:]:
+        records[c] = pd.to_numeric(data[c], errors='coerce').values
+    records = np.sort(records, order='date', kind='stable')
+    _, idx = np.unique(records['date'][::-1], return_index=True)
+    return records[len(records) - 1 - idx]
+
+
+def records_to_frame(records):
+    """定长记录数组转为与 stock_zh_a_hist 返回格式一致的DataFrame"""
+    dates = ints_to_datetime(records['date'])
+    data = pd.DataFrame({c: records[c] for c in HIST_COLUMNS[1:]})
+    data.insert(0, 'date', dates.values)
+    data.index = pd.DatetimeIndex(dates.values, name='日期')
+    return data
+
+
+class StockHistStore:
+    """
+    股票历史K线列存储
+    每只股票一个只追加的定长记录文件 {adjust}/{code}.bin
+    """
+
+    def __init__(self, base_dir=stock_hist_store_path):
+        self.base_dir = base_dir
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _get_file(self, code, adjust=''):
+        return os.path.join(self.base_dir, adjust if adjust else 'none', f"{code}.bin")
+
+    def _get_lock(self, code, adjust=''):
+        key = (code, adjust)
+        with self._locks_lock:
+            lock = self._locks.get(key)
+            if lock is None:
+                lock = self._locks[key] = threading.Lock()
+        return lock
+
+    def open_memmap(self, code, adjust=''):
+        """只读映射股票记录文件，无数据返回None"""
+        cache_file = self._get_file(code, adjust)
+        if not os.path.isfile(cache_file):
+            return None
+        count = os.path.getsize(cache_file) // HIST_DTYPE.itemsize
+        if count == 0:
+            return None
+        return np.memmap(cache_file, dtype=HIST_DTYPE, mode='r', shape=(count,))
+
+    def read_records(self, code, adjust=''):
+        cache_file = self._get_file(code, adjust)
+        if not os.path.isfile(cache_file):
+            return None
+        with self._get_lock(code, adjust):
+            # 只读取完整记录，忽略异常中断时写了一半的尾部数据。
+            count = os.path.getsize(cache_file) // HIST_DTYPE.itemsize
+            records = np.fromfile(cache_file, dtype=HIST_DTYPE, count=count)
+        if len(records) == 0:
+            return None
+        return records
+
+    def last_date(self, code, adjust=''):
+        """最后一根K线的日期int(yyyymmdd)，无数据返回None"""
+        cache_file = self._get_file(code, adjust)
+        try:
+            size = os.path.getsize(cache_file)
+        except OSError:
+            return None
+        count = size // HIST_DTYPE.itemsize
+        if count == 0:
+            return None
+        with open(cache_file, 'rb') as f:
+            f.seek((count - 1) * HIST_DTYPE.itemsize)
+            record = np.frombuffer(f.read(HIST_DTYPE.itemsize), dtype=HIST_DTYPE)
+        return int(record['date'][0])
+
+    def _get_start_file(self, code, adjust=''):
+        return os.path.join(self.base_dir, adjust if adjust else 'none', f"{code}.start")
+
+    def covers(self, code, adjust, date_start):
+        """
+        本地数据是否包含date_start(含)之后的全部K线
+        第一根K线不晚于date_start，或全量获取时的开始日期(上市晚于该日期的股票)不晚于date_start
+        """
+        if date_start is None:
+            return True
+        date_start = date_to_int(date_start)
+        cache_file = self._get_file(code, adjust)
+        try:
+            with open(cache_file, 'rb') as f:
+                record = np.frombuffer(f.read(HIST_DTYPE.itemsize), dtype=HIST_DTYPE)
+        except OSError:
+            return False
+        if len(record) == 0:
+            return False
+        if int(record['date'][0]) <= date_start:
+            return True
+        try:
+            with open(self._get_start_file(code, adjust), 'r') as f:
+                return int(f.read().strip()) <= date_start
+        except (OSError, ValueError):
+            return False
+
+    def write_full(self, code, adjust, data, date_start):
+        """写入从date_start开始全量获取的数据，并记录开始日期"""
+        self.write(code, adjust, data)
+        start_file = self._get_start_file(code, adjust)
+        try:
+            with open(start_file, 'w') as f:
+                f.write(str(date_to_int(date_start)))
+        except Exception as e:
+            logging.error(f"stock_hist_store.write_full处理异常：{start_file}{e}")
+
+    def read(self, code, adjust='', date_start=None, date_end=None):
+        records = self.read_records(code, adjust)
+        if records is None:
+            return None
+        start = 0
+        end = len(records)
+        if date_start is not None:
+            start = np.searchsorted(records['date'], date_to_int(date_start), side='left')
+        if date_end is not None:
+            end = np.searchsorted(records['date'], date_to_int(date_end), side='right')
+        if start >= end:
+            return None
+        return records_to_frame(records[start:end])
+
+    def write(self, code, adjust, data):
+        """整体重写股票记录文件"""
+        records = data if isinstance(data, np.ndarray) else frame_to_records(data)
+        cache_file = self._get_file(code, adjust)
+        with self._get_lock(code, adjust):
+            self._write_file(cache_file, records)
+
+    def append(self, code, adjust, data, rewrite=True):
+        """
+        合并新数据，只追加比已存最后日期新的K线
+        重叠部分收盘价不一致(复权因子变化)时整体重写
+        rewrite=False 时遇到不一致或没有重叠不写入，返回False，由调用方全量重新获取
+        """
+        records = data if isinstance(data, np.ndarray) else frame_to_records(data)
+        if len(records) == 0:
+            return True
+        cache_file = self._get_file(code, adjust)
+        with self._get_lock(code, adjust):
+            count = os.path.getsize(cache_file) // HIST_DTYPE.itemsize if os.path.isfile(cache_file) else 0
+            if count == 0:
+                self._write_file(cache_file, records)
+                return True
+            stored = np.fromfile(cache_file, dtype=HIST_DTYPE, count=count)
+            _, idx_stored, idx_new = np.intersect1d(stored['date'], records['date'], assume_unique=True,
+                                                    return_indices=True)
+            if not rewrite and len(idx_stored) == 0 and records['date'][0] > stored['date'][-1]:
+                return False
+            if len(idx_stored) > 0 and not np.allclose(stored['close'][idx_stored], records['close'][idx_new],
+                                                       rtol=1e-6, equal_nan=True):
+                if not rewrite:
+                    return False
+                self._write_file(cache_file, records)
+                return True
+            new_records = records[records['date'] > stored['date'][-1]]
+            if len(new_records) == 0:
+                return True
+            if os.path.getsize(cache_file) != count * HIST_DTYPE.itemsize:
+                # 尾部有不完整记录，先截断。
+                with open(cache_file, 'r+b') as f:
+                    f.truncate(count * HIST_DTYPE.itemsize)
+            with open(cache_file, 'ab') as f:
+                f.write(new_records.tobytes())
+        return True
+
+    @staticmethod
+    def _write_file(cache_file, records):
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        tmp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_file, 'wb') as f:
+                f.write(np.ascontiguousarray(records, dtype=HIST_DTYPE).tobytes())
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            logging.error(f"stock_hist_store._write_file处理异常：{cache_file}{e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+hist_store = StockHistStore()
@@ -1,11 +1,11 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import logging
 import os.path
+import time
+import logging
 import datetime
 import numpy as np
-import pandas as pd
 import talib as tl
 import instock.core.tablestructure as tbs
 import instock.lib.trade_time as trd
@@ -20,16 +20,19 @@ import instock.core.crawling.stock_fund_em as sff
 import instock.core.crawling.stock_fhps_em as sfe
 import instock.core.crawling.stock_chip_race as scr
 import instock.core.crawling.stock_limitup_reason as slr
+import instock.core.async_fetcher as afe
+from instock.core.stock_hist_store import hist_store, date_to_int
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
-# 设置基础目录，每次加载使用。
+# 交易日历缓存文件，排序的int32(yyyymmdd)数组
 cpath_current = os.path.dirname(os.path.dirname(__file__))
-stock_hist_cache_path = os.path.join(cpath_current, 'cache', 'hist')
-if not os.path.exists(stock_hist_cache_path):
-    os.makedirs(stock_hist_cache_path)  # 创建多个文件夹结构。
-
+stock_trade_date_cache_file = os.path.join(cpath_current, 'cache', 'trade_date.npy')
+# 交易日历缓存有效期(秒)，按缓存文件修改时间判断，到期后重新获取
+TRADE_DATE_CACHE_TTL = 7 * 24 * 60 * 60
+# 缓存已不包含今天之后的日期(如年末新一年的日历还没有发布)时的有效期，尽快取到新发布的日历
+TRADE_DATE_CACHE_TTL_ENDED = 24 * 60 * 60
 
 # 600 601 603 605开头的股票是上证A股
 # 600开头的股票是上证A股，属于大盘股，其中6006开头的股票是最早上市的股票，
@@ -59,19 +62,57 @@ def is_open_with_line(price):
     return price != '-'
 
 
-# 读取股票交易日历数据
+# 读取股票交易日历数据，返回排序的日期列表
+# 优先读取本地缓存，不需要每个进程都请求网络并执行js解密。
 def fetch_stocks_trade_date():
+    dates = read_stocks_trade_date_cache()
+    if dates is not None:
+        ttl = TRADE_DATE_CACHE_TTL if dates[-1] > date_to_int(datetime.date.today()) else TRADE_DATE_CACHE_TTL_ENDED
+        if time.time() - os.path.getmtime(stock_trade_date_cache_file) < ttl:
+            return ints_to_dates(dates)
     try:
         data = tdh.tool_trade_date_hist_sina()
-        if data is None or len(data.index) == 0:
-            return None
-        data_date = set(data['trade_date'].values.tolist())
-        return data_date
+        if data is not None and len(data.index) > 0:
+            data_date = sorted(set(data['trade_date'].values.tolist()))
+            write_stocks_trade_date_cache(np.array([date_to_int(d) for d in data_date], dtype=np.int32))
+            return data_date
     except Exception as e:
         logging.error(f"stockfetch.fetch_stocks_trade_date处理异常：{e}")
+    # 获取失败时使用过期的缓存
+    if dates is not None:
+        return ints_to_dates(dates)
+    return None
+
+
+def ints_to_dates(dates):
+    return [datetime.date(d // 10000, d // 100 % 100, d % 100) for d in dates.tolist()]
+
+
+def read_stocks_trade_date_cache():
+    try:
+        if os.path.isfile(stock_trade_date_cache_file):
+            dates = np.load(stock_trade_date_cache_file)
+            if len(dates) > 0:
+                return dates
+    except Exception as e:
+        logging.error(f"stockfetch.read_stocks_trade_date_cache处理异常：{e}")
     return None
 
 
+def write_stocks_trade_date_cache(dates):
+    cache_dir = os.path.dirname(stock_trade_date_cache_file)
+    tmp_file = f"{stock_trade_date_cache_file}.{os.getpid()}.tmp.npy"
+    try:
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        np.save(tmp_file, dates)
+        os.replace(tmp_file, stock_trade_date_cache_file)
+    except Exception as e:
+        logging.error(f"stockfetch.write_stocks_trade_date_cache处理异常：{e}")
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+
 # 读取当天股票数据
 def fetch_etfs(date):
     try:
@@ -381,6 +422,33 @@ def fetch_etf_hist(data_base, date_start=None, date_end=None, adjust='qfq'):
     return None
 
 
+# 批量读取ETF历史数据，在一个事件循环中有限并发请求，返回以(date, code)为key的字典
+def fetch_etfs_hist(etfs, date_start=None, adjust='qfq', concurrency=afe.DEFAULT_CONCURRENCY):
+    if not etfs:
+        return None
+    if date_start is None:
+        date_start, is_cache = trd.get_trade_hist_interval(etfs[0][0])
+    try:
+        results = afe.run_limited(fetch_etf_hist_async, [(etf, date_start, adjust) for etf in etfs], concurrency)
+        data = {(etf[0], etf[1]): r for etf, r in zip(etfs, results) if r is not None}
+        return data if data else None
+    except Exception as e:
+        logging.error(f"stockfetch.fetch_etfs_hist处理异常：{e}")
+    return None
+
+
+async def fetch_etf_hist_async(data_base, date_start, adjust='qfq'):
+    data = await fee.fund_etf_hist_em_async(symbol=data_base[1], period="daily", start_date=date_start, adjust=adjust)
+    if data is None or len(data.index) == 0:
+        return None
+    data.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+    data = data.sort_index()
+    data.loc[:, 'p_change'] = tl.ROC(data['close'].values, 1)
+    data['p_change'].values[np.isnan(data['p_change'].values)] = 0.0
+    data["volume"] = data['volume'].values.astype('double') * 100  # 成交量单位从手变成股。
+    return data
+
+
 # 读取股票历史数据
 def fetch_stock_hist(data_base, date_start=None, is_cache=True):
     date = data_base[0]
@@ -390,7 +458,7 @@ def fetch_stock_hist(data_base, date_start=None, is_cache=True):
         date_start, is_cache = trd.get_trade_hist_interval(date)  # 提高运行效率，只运行一次
         # date_end = date_end.strftime("%Y%m%d")
     try:
-        data = stock_hist_cache(code, date_start, None, is_cache, 'qfq')
+        data = stock_hist_cache(code, date_start, None, is_cache, 'qfq', date_last=date)
         if data is not None:
             # 创建DataFrame的深拷贝以确保完全可写
             data = data.copy(deep=True)
@@ -406,37 +474,151 @@ def fetch_stock_hist(data_base, date_start=None, is_cache=True):
 
 
 # 增加读取股票缓存方法。加快处理速度。多线程解决效率
-def stock_hist_cache(code, date_start, date_end=None, is_cache=True, adjust=''):
-    cache_dir = os.path.join(stock_hist_cache_path, date_start[0:6], date_start)
-    # 如果没有文件夹创建一个。月文件夹和日文件夹。方便删除。
+# 历史K线保存在只追加的列存储中，本地数据已覆盖到date_last时直接读取，不再请求网络。
+# 本地数据落后时只请求缺失的K线(多取几根用来校验复权)，校验不通过再全量获取。
+def stock_hist_cache(code, date_start, date_end=None, is_cache=True, adjust='', date_last=None):
+    if date_last is None:
+        date_last = date_end
     try:
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-    except Exception:
-        pass
-    cache_file = os.path.join(cache_dir, "%s%s.gzip.pickle" % (code, adjust))
-    # 如果缓存存在就直接返回缓存数据。压缩方式。
-    try:
-        if os.path.isfile(cache_file):
-            return pd.read_pickle(cache_file, compression="gzip")
+        # 本地数据不包含date_start开始的全部K线时(多日期作业需要更早的历史)全量重新获取
+        covered = is_cache and hist_store.covers(code, adjust, date_start)
+        if covered and date_last is not None:
+            last_date = hist_store.last_date(code, adjust)
+            if last_date is not None:
+                if last_date >= date_to_int(date_last):
+                    return hist_store.read(code, adjust, date_start, date_end)
+                if date_end is None:
+                    stock = stock_hist_delta(code, last_date, date_last, adjust)
+                    if stock is not None and hist_store.append(code, adjust, stock, rewrite=False):
+                        return hist_store.read(code, adjust, date_start, date_end)
+
+        if date_end is not None:
+            stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, end_date=date_end,
+                                        adjust=adjust)
         else:
-            if date_end is not None:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, end_date=date_end,
-                                            adjust=adjust)
-            else:
-                stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, adjust=adjust)
-
-            if stock is None or len(stock.index) == 0:
-                return None
-            stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
-            stock = stock.sort_index()  # 将数据按照日期排序下。
-            try:
-                if is_cache:
-                    stock.to_pickle(cache_file, compression="gzip")
-            except Exception:
-                pass
-            # time.sleep(1)
-            return stock
+            stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=date_start, adjust=adjust)
+
+        if stock is None or len(stock.index) == 0:
+            return None
+        stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+        stock = stock.sort_index()  # 将数据按照日期排序下。
+        try:
+            if is_cache:
+                if covered:
+                    hist_store.append(code, adjust, stock)
+                elif date_end is None:
+                    hist_store.write_full(code, adjust, stock, date_start)
+        except Exception:
+            pass
+        return stock
     except Exception as e:
         logging.error(f"stockfetch.stock_hist_cache处理异常：{code}代码{e}")
     return None
+
+
+# 增量获取股票历史数据，从最后存储日期开始取，这一根已有K线用来校验复权。
+# 请求条数按自然日数计算(不小于缺失的交易日数)，另加HIST_DELTA_OVERLAP根余量。
+HIST_DELTA_OVERLAP = 3
+
+
+def stock_hist_delta_args(last_date, date_last):
+    last_date = datetime.datetime.strptime(str(last_date), "%Y%m%d").date()
+    need_date = datetime.datetime.strptime(str(date_to_int(date_last)), "%Y%m%d").date()
+    datalen = (need_date - last_date).days + HIST_DELTA_OVERLAP
+    return last_date.strftime("%Y%m%d"), datalen
+
+
+def stock_hist_delta(code, last_date, date_last, adjust=''):
+    start_date, datalen = stock_hist_delta_args(last_date, date_last)
+    stock = she.stock_zh_a_hist(symbol=code, period="daily", start_date=start_date, adjust=adjust, datalen=datalen)
+    if stock is None or len(stock.index) == 0:
+        return None
+    stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+    return stock.sort_index()
+
+
+# 批量预取股票历史数据到本地存储，所有股票在一个事件循环中有限并发请求，请求频率由rate_limiter控制。
+# 预取完成后 fetch_stock_hist 直接读取本地存储；预取失败的股票仍按原方式逐只获取。
+def prefetch_stock_hist(stocks, date_start, is_cache=True, adjust='qfq', concurrency=afe.DEFAULT_CONCURRENCY):
+    if not is_cache or not stocks:
+        return 0
+    try:
+        results = afe.run_limited(stock_hist_prefetch_async,
+                                  [(stock[1], date_start, stock[0], adjust) for stock in stocks], concurrency)
+        return sum(1 for r in results if r)
+    except Exception as e:
+        logging.error(f"stockfetch.prefetch_stock_hist处理异常：{e}")
+    return 0
+
+
+async def stock_hist_prefetch_async(code, date_start, date_last, adjust='qfq'):
+    covered = hist_store.covers(code, adjust, date_start)
+    last_date = hist_store.last_date(code, adjust) if covered else None
+    if last_date is not None:
+        if last_date >= date_to_int(date_last):
+            return True
+        start_date, datalen = stock_hist_delta_args(last_date, date_last)
+        stock = await she.stock_zh_a_hist_async(symbol=code, period="daily", start_date=start_date, adjust=adjust,
+                                                datalen=datalen)
+        if stock is not None and len(stock.index) > 0:
+            stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+            if hist_store.append(code, adjust, stock.sort_index(), rewrite=False):
+                return True
+    stock = await she.stock_zh_a_hist_async(symbol=code, period="daily", start_date=date_start, adjust=adjust)
+    if stock is None or len(stock.index) == 0:
+        return False
+    stock.columns = tuple(tbs.CN_STOCK_HIST_DATA['columns'])
+    if not covered:
+        hist_store.write_full(code, adjust, stock.sort_index(), date_start)
+        return True
+    return hist_store.append(code, adjust, stock.sort_index())
+
+
+# 实时行情昨收与存储的上一交易日收盘价的允许误差，超过说明除权除息，存储的前复权历史需要重新获取。
+SPOT_PRE_CLOSE_TOL = 0.005
+
+
+# 收盘后用当日实时行情快照生成当日K线，追加到历史K线存储。
+# 只处理存储已到上一交易日且昨收与存储收盘价一致的股票，这样当日历史数据不需要逐只请求。
+def stock_hist_append_spot(data, adjust='qfq'):
+    try:
+        if data is None or len(data.index) == 0:
+            return 0
+        date = datetime.datetime.strptime(data.iloc[0]['date'], "%Y-%m-%d").date()
+        # 快照只代表今天的行情，不能用于补历史日期。
+        if date != datetime.datetime.now().date() or not trd.is_trade_date(date):
+            return 0
+        date_int = date_to_int(date)
+        prev_date_int = date_to_int(trd.get_previous_trade_date(date))
+        count = 0
+        for code, _open, _close, _high, _low, _pre_close, _volume in zip(
+                data['code'].values, data['open_price'].values, data['new_price'].values,
+                data['high_price'].values, data['low_price'].values, data['pre_close_price'].values,
+                data['volume'].values):
+            if hist_store.last_date(code, adjust) != prev_date_int:
+                continue
+            if np.isnan(_open) or np.isnan(_close) or np.isnan(_high) or np.isnan(_low) or _open <= 0:
+                continue
+            records = hist_store.read_records(code, adjust)
+            prev_close = records['close'][-1]
+            # 除权除息日前复权历史整体变化，不能直接追加，留给增量/全量获取重新复权。
+            if np.isnan(_pre_close) or abs(_pre_close - prev_close) > SPOT_PRE_CLOSE_TOL:
+                continue
+            bar = np.zeros(1, dtype=records.dtype)
+            bar['date'] = date_int
+            bar['open'] = _open
+            bar['close'] = _close
+            bar['high'] = _high
+            bar['low'] = _low
+            bar['volume'] = _volume
+            # 与 stock_zh_a_hist 计算方式一致
+            if prev_close:
+                bar['amplitude'] = (_high - _low) / prev_close * 100
+                bar['ups_downs'] = _close - prev_close
+                bar['quote_change'] = (_close - prev_close) / prev_close * 100
+            if hist_store.append(code, adjust, bar):
+                count += 1
+        return count
+    except Exception as e:
+        logging.error(f"stockfetch.stock_hist_append_spot处理异常：{e}")
+    return 0
@@ -1,9 +1,9 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
-import numpy as np
-import talib as tl
-from datetime import datetime, timedelta
+import instock.core.indicator.calculate_indicator as idr
+from datetime import timedelta
+import instock.core.stock_hist_slice as hsl
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -20,17 +20,14 @@ def check(code_name, data, date=None, threshold=60):
     else:
         end_date = date.strftime("%Y-%m-%d")
 
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask].copy()
+    data = hsl.as_of(data, end_date)
     if len(data.index) < 250:
         return False
 
-    # 计算MA250，避免只读问题
-    ma250 = tl.MA(data['close'].values, timeperiod=250)
-    ma250 = np.nan_to_num(ma250, nan=0.0)
-    data = data.copy()
-    data['ma250'] = ma250
+    # 计算MA250
+    data = idr.get_indicators(data.copy(), threshold=None, indicators=('ma250',))
+    if data is None:
+        return False
 
     data = data.tail(n=threshold)
 
@@ -55,8 +52,8 @@ def check(code_name, data, date=None, threshold=60):
     if lowest_row[1] == 0 or highest_row[1] == 0:
         return False
 
-    data_front = data.loc[(data['date'] < highest_row[2])]
-    data_end = data.loc[(data['date'] >= highest_row[2])]
+    data_front = hsl.before(data, highest_row[2])
+    data_end = hsl.since(data, highest_row[2])
 
     if data_front.empty:
         return False
@@ -75,8 +72,7 @@ def check(code_name, data, date=None, threshold=60):
                 recent_lowest_row[1] = _volume
                 recent_lowest_row[2] = _date
 
-    date_diff = datetime.date(datetime.strptime(recent_lowest_row[2], '%Y-%m-%d')) - \
-                datetime.date(datetime.strptime(highest_row[2], '%Y-%m-%d'))
+    date_diff = hsl.to_date(recent_lowest_row[2]) - hsl.to_date(highest_row[2])
 
     if not (timedelta(days=10) <= date_diff <= timedelta(days=50)):
         return False
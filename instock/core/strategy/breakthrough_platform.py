@@ -1,10 +1,9 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
-from datetime import datetime
-import numpy as np
-import talib as tl
+import instock.core.indicator.calculate_indicator as idr
 from instock.core.strategy import enter
+import instock.core.stock_hist_slice as hsl
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -20,31 +19,29 @@ def check(code_name, data, date=None, threshold=60):
         end_date = code_name[0]
     else:
         end_date = date.strftime("%Y-%m-%d")
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask].copy()
+    data = hsl.as_of(data, end_date)
     if len(data.index) < threshold:
         return False
 
-    # 计算MA60，避免只读问题
-    ma60 = tl.MA(data['close'].values, timeperiod=60)
-    ma60 = np.nan_to_num(ma60, nan=0.0)
-    data = data.copy()
-    data['ma60'] = ma60
+    # 计算MA60
+    data = idr.get_indicators(data.copy(), threshold=None, indicators=('ma60',))
+    if data is None:
+        return False
 
     data = data.tail(n=threshold)
 
     breakthrough_row = None
     for _close, _open, _date, _ma60 in zip(data['close'].values, data['open'].values, data['date'].values, data['ma60'].values):
         if _open < _ma60 <= _close:
-            if enter.check_volume(code_name, origin_data, date=datetime.date(datetime.strptime(_date, '%Y-%m-%d')), threshold=threshold):
+            if enter.check_volume(code_name, origin_data, date=hsl.to_date(_date), threshold=threshold):
                 breakthrough_row = _date
                 break
 
     if breakthrough_row is None:
         return False
 
-    data_front = data.loc[(data['date'] < breakthrough_row) & (data['ma60'] > 0)]
+    data_front = hsl.before(data, breakthrough_row)
+    data_front = data_front.loc[data_front['ma60'] > 0]
     for _close, _ma60 in zip(data_front['close'].values, data_front['ma60'].values):
         if not (-0.05 < ((_ma60 - _close) / _ma60) < 0.2):
             return False
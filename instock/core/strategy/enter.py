@@ -1,8 +1,8 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
-import numpy as np
-import talib as tl
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.stock_hist_slice as hsl
 
 
 __author__ = 'myh '
@@ -18,9 +18,7 @@ def check_volume(code_name, data, date=None, threshold=60):
         end_date = code_name[0]
     else:
         end_date = date.strftime("%Y-%m-%d")
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask].copy()
+    data = hsl.as_of(data, end_date)
     if len(data.index) < threshold:
         return False
 
@@ -28,11 +26,10 @@ def check_volume(code_name, data, date=None, threshold=60):
     if p_change < 2 or data.iloc[-1]['close'] < data.iloc[-1]['open']:
         return False
 
-    # 计算5日成交量均线，避免只读问题
-    vol_ma5 = tl.MA(data['volume'].values, timeperiod=5)
-    vol_ma5 = np.nan_to_num(vol_ma5, nan=0.0)
-    data = data.copy()
-    data['vol_ma5'] = vol_ma5
+    # 计算5日成交量均线
+    data = idr.get_indicators(data.copy(), threshold=None, indicators=('vol_5',))
+    if data is None:
+        return False
 
     data = data.tail(n=threshold + 1)
     if len(data) < threshold + 1:
@@ -51,7 +48,7 @@ def check_volume(code_name, data, date=None, threshold=60):
 
     data = data.head(n=threshold)
 
-    mean_vol = data.iloc[-1]['vol_ma5']
+    mean_vol = data.iloc[-1]['vol_5']
 
     vol_ratio = last_vol / mean_vol
     if vol_ratio >= 2:
@@ -1,6 +1,8 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
+import instock.core.stock_hist_slice as hsl
+
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -18,9 +20,7 @@ def check_high_tight(code_name, data, date=None, threshold=60, istop=False):
         end_date = code_name[0]
     else:
         end_date = date.strftime("%Y-%m-%d")
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask]
+    data = hsl.as_of(data, end_date)
     if len(data.index) < threshold:
         return False
 
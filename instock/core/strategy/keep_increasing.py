@@ -1,8 +1,8 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
-import numpy as np
-import talib as tl
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.stock_hist_slice as hsl
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -17,17 +17,14 @@ def check(code_name, data, date=None, threshold=30):
         end_date = code_name[0]
     else:
         end_date = date.strftime("%Y-%m-%d")
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask].copy()
+    data = hsl.as_of(data, end_date)
     if len(data.index) < threshold:
         return False
 
-    # 计算MA30，避免只读问题
-    ma30 = tl.MA(data['close'].values, timeperiod=30)
-    ma30 = np.nan_to_num(ma30, nan=0.0)
-    data = data.copy()
-    data['ma30'] = ma30
+    # 计算MA30
+    data = idr.get_indicators(data.copy(), threshold=None, indicators=('ma30',))
+    if data is None:
+        return False
 
     data = data.tail(n=threshold)
 
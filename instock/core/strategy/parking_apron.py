@@ -1,8 +1,8 @@
 #!/usr/local/bin/python
 # -*- coding: utf-8 -*-
 
-from datetime import datetime
-from instock.core.strategy import turtle_trade
+import numpy as np
+import instock.core.stock_hist_slice as hsl
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -12,48 +12,47 @@ __date__ = '2023/3/10 '
 # 1.最近15日有涨幅大于9.5%，且必须是放量上涨
 # 2.紧接的下个交易日必须高开，收盘价必须上涨，且与开盘价不能大于等于相差3%
 # 3.接下2、3个交易日必须高开，收盘价必须上涨，且与开盘价不能大于等于相差3%，且每天涨跌幅在5%间
+# 涨停日的海龟交易法则判断用最近threshold日最高收盘价数组，一次计算窗口内全部K线，不再对每个涨停日重新截取全部历史。
 def check(code_name, data, date=None, threshold=15):
-    origin_data = data
     if date is None:
         end_date = code_name[0]
     else:
         end_date = date.strftime("%Y-%m-%d")
-    if end_date is not None:
-        mask = (data['date'] <= end_date)
-        data = data.loc[mask]
-    if len(data.index) < threshold:
+    data = hsl.as_of(data, end_date)
+    count = len(data.index)
+    if count < threshold:
         return False
 
-    data = data.tail(n=threshold)
-
-    limitup_row = [1000000, '']
-    # 找出涨停日
-    for _close, _p_change, _date in zip(data['close'].values, data['p_change'].values, data['date'].values):
-        if _p_change > 9.5:
-            if turtle_trade.check_enter(code_name, origin_data, date=datetime.date(datetime.strptime(_date, '%Y-%m-%d')), threshold=threshold):
-                limitup_row[0] = _close
-                limitup_row[1] = _date
-                if check_internal(data, limitup_row):
-                    return True
-    return False
-
-def check_internal(data, limitup_row):
-    limitup_price = limitup_row[0]
-    limitup_end = data.loc[(data['date'] > limitup_row[1])]
-    limitup_end = limitup_end.head(n=3)
-    if len(limitup_end.index) < 3:
-        return False
-
-    consolidation_day1 = limitup_end.iloc[0]
-    consolidation_day23 = limitup_end.tail(n=2)
-
-    if not (consolidation_day1['close'] > limitup_price and consolidation_day1['open'] > limitup_price and
-            0.97 < consolidation_day1['close'] / consolidation_day1['open'] < 1.03):
-        return False
-
-    for _close, _p_change, _open in zip(consolidation_day23['close'].values, consolidation_day23['p_change'].values, consolidation_day23['open'].values):
-        if not (0.97 < (_close / _open) < 1.03 and -5 < _p_change < 5
-                and _close > limitup_price and _open > limitup_price):
-            return False
-
-    return True
+    # 窗口为最后threshold根K线，之前再取threshold-1根计算窗口内每天的最近threshold日最高收盘价
+    size = threshold * 2 - 1
+    close, open_, p_change = (_pad(data[c].values[-size:], size) for c in ('close', 'open', 'p_change'))
+    # 每根K线截止时的K线数
+    counts = count - size + 1 + np.arange(size)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # 海龟交易法则：收盘价为最近threshold日最高收盘价(初始0，跳过NaN)
+        windows = np.lib.stride_tricks.sliding_window_view(close, threshold)
+        max_close = np.fmax.reduce(windows, axis=1, initial=0.0)
+        w = slice(threshold - 1, size)
+        close, open_, p_change, counts = close[w], open_[w], p_change[w], counts[w]
+        turtle = (counts >= threshold) & (close >= max_close)
+
+        # 涨停日之后在窗口内还有3个交易日
+        last = threshold - 3
+        price = close[:last]
+        ratio = close / open_
+        ok = (p_change[:last] > 9.5) & turtle[:last]
+        ok &= (close[1:last + 1] > price) & (open_[1:last + 1] > price) & \
+              (0.97 < ratio[1:last + 1]) & (ratio[1:last + 1] < 1.03)
+        for i in (2, 3):
+            s = slice(i, last + i)
+            ok &= (0.97 < ratio[s]) & (ratio[s] < 1.03) & (-5 < p_change[s]) & (p_change[s] < 5) & \
+                  (close[s] > price) & (open_[s] > price)
+    return bool(ok.any())
+
+
+def _pad(values, size):
+    # 不足size根时开头补NaN
+    if len(values) >= size:
+        return values.astype(np.float64)
+    return np.concatenate([np.full(size - len(values), np.nan), values.astype(np.float64)])
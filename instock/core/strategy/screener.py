@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import numpy as np
+import talib as tl
+import instock.core.tablestructure as tbs
+from instock.core.stock_hist_panel import StockHistPanel, date_to_int
+import instock.core.strategy.enter as enter
+import instock.core.strategy.keep_increasing as keep_increasing
+import instock.core.strategy.parking_apron as parking_apron
+import instock.core.strategy.backtrace_ma250 as backtrace_ma250
+import instock.core.strategy.breakthrough_platform as breakthrough_platform
+import instock.core.strategy.low_backtrace_increase as low_backtrace_increase
+import instock.core.strategy.turtle_trade as turtle_trade
+import instock.core.strategy.high_tight_flag as high_tight_flag
+import instock.core.strategy.climax_limitdown as climax_limitdown
+import instock.core.strategy.low_atr as low_atr
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 全部策略的向量化选股
+# 历史数据面板上一次算出各策略共用的逐行数据(均线、K线数、放量上涨/海龟信号)，
+# 每个策略按股票截止日期取出最后若干根K线的二维数组，用数组运算一次判断全部股票。
+# 判断条件与各策略模块的 check 函数逐项一致(含初始值、严格大于/小于、NaN的处理)。
+
+
+class Screener:
+    """
+    面板上的选股计算，逐行数据只计算一次，可以对多个日期重复选股
+    ends 为截止行(面板中的行号，含该行)，rows 为对应的股票序号
+    """
+
+    def __init__(self, stocks):
+        if not isinstance(stocks, StockHistPanel):
+            stocks = StockHistPanel.from_frames(stocks, use_shared_memory=False)
+        self.panel = stocks
+        self.starts = stocks.offsets[:-1]
+        self.total = int(stocks.offsets[-1])
+        self.values = {c: stocks.get_column(c) for c in ('open', 'close', 'high', 'low', 'volume', 'p_change')}
+        # 日期转为天数，用于计算相差的自然日
+        self.days = stocks.get_datetimes().astype('datetime64[D]').astype(np.int64)
+        # 每行是该股票的第几根K线(从1开始)
+        stock_index = np.repeat(np.arange(len(self.starts)), np.diff(stocks.offsets))
+        self.stock_index = stock_index
+        self.counts = np.arange(self.total) - self.starts[stock_index] + 1
+        self._cache = {}
+
+    def get_ends(self, date):
+        """各股票截止date(含)的最后一行，返回 (股票序号数组, 行号数组)，date之前没有K线的股票不返回"""
+        date = date_to_int(date)
+        ends = np.array([s + np.searchsorted(self.panel.dates[s:e], date, side='right') - 1
+                         for s, e in zip(self.starts, self.panel.offsets[1:])], dtype=np.int64)
+        rows = np.flatnonzero(ends >= self.starts)
+        return rows, ends[rows]
+
+    def get_ends_dates(self, dates):
+        """
+        多个日期的截止行，返回 (日期序号数组, 股票序号数组, 行号数组)
+        与逐个日期 get_ends 的结果按日期顺序连接相同
+        """
+        keys = np.array([date_to_int(d) for d in dates], dtype=self.panel.dates.dtype)
+        ends = np.empty((len(keys), len(self.starts)), dtype=np.int64)
+        for i, (s, e) in enumerate(zip(self.starts, self.panel.offsets[1:])):
+            ends[:, i] = s + np.searchsorted(self.panel.dates[s:e], keys, side='right') - 1
+        date_index, rows = np.nonzero(ends >= self.starts)
+        return date_index, rows, ends[date_index, rows]
+
+    def get_value(self, column):
+        """逐行数据：K线列或计算列"""
+        if column in self.values:
+            return self.values[column]
+        if column not in self._cache:
+            self._cache[column] = _FEATURES[column](self)
+        return self._cache[column]
+
+    def window(self, column, ends, length):
+        """截止各行的最后length行，(行数, length) 二维数组，超出股票开头的位置为NaN"""
+        values = self.get_value(column)
+        idx = ends[:, None] + np.arange(1 - length, 1)
+        out = values[np.maximum(idx, 0)].astype(np.float64)
+        out[idx < self.starts[self.stock_index[ends]][:, None]] = np.nan
+        return out
+
+    def window_days(self, ends, length):
+        """截止各行的最后length行的日期(天数)"""
+        idx = ends[:, None] + np.arange(1 - length, 1)
+        return self.days[np.maximum(idx, 0)]
+
+    def ma(self, column, timeperiod):
+        """各股票全部历史计算的均线，空值为0，与 calculate_indicator._calc_ma 一致"""
+        values = self.get_value(column)
+        out = np.empty(self.total)
+        for s, e in zip(self.starts, self.panel.offsets[1:]):
+            out[s:e] = tl.MA(values[s:e], timeperiod=timeperiod)
+        out[np.isnan(out)] = 0.0
+        return out
+
+
+def _shift_rows(screener, values, n, fill=np.nan):
+    # 逐行数据在股票内后移n行
+    out = np.full(screener.total, fill)
+    out[n:] = values[:-n]
+    out[screener.counts <= n] = fill
+    return out
+
+
+def _enter_rows(s, threshold=60):
+    # 每一行按 enter.check_volume 判断的结果
+    c, o = s.get_value('close'), s.get_value('open')
+    v, p = s.get_value('volume'), s.get_value('p_change')
+    vol_5 = _shift_rows(s, s.get_value('vol_5'), 1)
+    return (s.counts >= threshold + 1) & ~(p < 2) & ~(c < o) & ~(c * v < 200000000) & (v / vol_5 >= 2)
+
+
+def _turtle_rows(s, threshold):
+    # 每一行按 turtle_trade.check_enter 判断的结果：收盘价为最近threshold日最高收盘价
+    close = s.get_value('close')
+    # 逐行后移取最大值，fmax跳过NaN，与逐根比较 if _close > max_price 一致
+    max_price = np.fmax(close, 0.0)
+    for n in range(1, threshold):
+        max_price = np.fmax(max_price, _shift_rows(s, close, n))
+    return (s.counts >= threshold) & (close >= max_price)
+
+
+_FEATURES = {
+    'ma30': lambda s: s.ma('close', 30),
+    'ma60': lambda s: s.ma('close', 60),
+    'ma250': lambda s: s.ma('close', 250),
+    'vol_5': lambda s: s.ma('volume', 5),
+    'enter': _enter_rows,
+    'turtle_15': lambda s: _turtle_rows(s, 15),
+}
+
+
+def _window_max(close):
+    # 与逐根比较 if _close > max_price 一致：初始0，跳过NaN，返回 (最高价, 第一次出现的位置)
+    filled = np.where(np.isnan(close), -np.inf, close)
+    idx = np.argmax(filled, axis=1)
+    return np.maximum(filled[np.arange(len(close)), idx], 0.0), idx
+
+
+def _running_low(close):
+    """
+    与 if _close > highest: ... elif _close < lowest: ... 一致
+    不是新高的K线中第一次出现的最低价，返回 (是否存在, 位置)
+    """
+    before = np.fmax.accumulate(np.concatenate([np.zeros((len(close), 1)), close[:, :-1]], axis=1), axis=1)
+    candidate = ~(close > before) & (close < 1000000)
+    filled = np.where(candidate, close, np.inf)
+    return candidate.any(axis=1), np.argmin(filled, axis=1)
+
+
+def _check_enter(s, rows, ends, threshold=60):
+    return s.get_value('enter')[ends]
+
+
+def _check_keep_increasing(s, rows, ends, threshold=30):
+    ma30 = s.window('ma30', ends, threshold)
+    step1, step2 = round(threshold / 3), round(threshold * 2 / 3)
+    m0, m1, m2, m3 = ma30[:, 0], ma30[:, step1], ma30[:, step2], ma30[:, -1]
+    return (s.counts[ends] >= threshold) & (m0 < m1) & (m1 < m2) & (m2 < m3) & (m3 > 1.2 * m0)
+
+
+def _check_parking_apron(s, rows, ends, threshold=15):
+    close, open_ = s.window('close', ends, threshold), s.window('open', ends, threshold)
+    p_change = s.window('p_change', ends, threshold)
+    turtle = s.window('turtle_15', ends, threshold) == 1
+    result = np.zeros(len(ends), dtype=bool)
+    ratio = close / open_
+    # 涨停日之后在窗口内还有3个交易日
+    for k in range(threshold - 3):
+        price = close[:, k]
+        day1 = (close[:, k + 1] > price) & (open_[:, k + 1] > price) & (0.97 < ratio[:, k + 1]) & \
+               (ratio[:, k + 1] < 1.03)
+        day23 = np.ones(len(ends), dtype=bool)
+        for j in (k + 2, k + 3):
+            day23 &= (0.97 < ratio[:, j]) & (ratio[:, j] < 1.03) & (-5 < p_change[:, j]) & (p_change[:, j] < 5) & \
+                     (close[:, j] > price) & (open_[:, j] > price)
+        result |= (p_change[:, k] > 9.5) & turtle[:, k] & day1 & day23
+    return (s.counts[ends] >= threshold) & result
+
+
+def _check_backtrace_ma250(s, rows, ends, threshold=60):
+    close, volume = s.window('close', ends, threshold), s.window('volume', ends, threshold)
+    ma250, days = s.window('ma250', ends, threshold), s.window_days(ends, threshold)
+    n = np.arange(len(ends))
+    highest, h = _window_max(close)
+    has_low, low = _running_low(close)
+    h_volume = np.where(highest > 0, volume[n, h], 0.0)
+    ok = (s.counts[ends] >= 250) & has_low & (volume[n, low] != 0) & (h_volume != 0) & (h > 0)
+    # 前段由年线以下向上突破
+    ok &= (close[:, 0] < ma250[:, 0]) & (close[n, h - 1] > ma250[n, h - 1])
+    # 后段在年线以上运行
+    after = np.arange(threshold) >= h[:, None]
+    ok &= ~((close < ma250) & after).any(axis=1)
+    recent = np.argmin(np.where(after & (close < 1000000), close, np.inf), axis=1)
+    date_diff = days[n, recent] - days[n, h]
+    ok &= (10 <= date_diff) & (date_diff <= 50)
+    # 回踩伴随缩量
+    ok &= (h_volume / volume[n, recent] > 2) & (close[n, recent] / highest < 0.8)
+    return ok
+
+
+def _check_breakthrough_platform(s, rows, ends, threshold=60):
+    close, open_ = s.window('close', ends, threshold), s.window('open', ends, threshold)
+    ma60 = s.window('ma60', ends, threshold)
+    signal = (open_ < ma60) & (ma60 <= close) & (s.window('enter', ends, threshold) == 1)
+    found = signal.any(axis=1)
+    j = np.argmax(signal, axis=1)
+    # 突破日之前均线偏离在-5%~20%之间
+    before = (np.arange(threshold) < j[:, None]) & (ma60 > 0)
+    deviation = (ma60 - close) / ma60
+    ok = ~before | ((-0.05 < deviation) & (deviation < 0.2))
+    return (s.counts[ends] >= threshold) & found & ok.all(axis=1)
+
+
+def _check_low_backtrace_increase(s, rows, ends, threshold=60):
+    close, open_ = s.window('close', ends, threshold), s.window('open', ends, threshold)
+    p_change = s.window('p_change', ends, threshold)
+    ratio_increase = (close[:, -1] - close[:, 0]) / close[:, 0]
+    previous_p_change = np.concatenate([np.full((len(ends), 1), 100.0), p_change[:, :-1]], axis=1)
+    previous_open = np.concatenate([np.full((len(ends), 1), -1000000.0), open_[:, :-1]], axis=1)
+    fail = (p_change < -7) | ((close - open_) / open_ * 100 < -7) | (previous_p_change + p_change < -10) | \
+           ((close - previous_open) / previous_open * 100 < -10)
+    return (s.counts[ends] >= threshold) & ~(ratio_increase < 0.6) & ~fail.any(axis=1)
+
+
+def _check_turtle_trade(s, rows, ends, threshold=60):
+    close = s.window('close', ends, threshold)
+    return (s.counts[ends] >= threshold) & (close[:, -1] >= np.fmax.reduce(close, axis=1, initial=0.0))
+
+
+def _check_high_tight_flag(s, rows, ends, threshold=60, istop=None):
+    if istop is None:
+        return np.zeros(len(ends), dtype=bool)
+    data = slice(threshold - 24, threshold - 10)
+    low = s.window('low', ends, threshold)[:, data].min(axis=1)
+    high = s.window('high', ends, threshold)[:, data][:, -1]
+    p_change = s.window('p_change', ends, threshold)[:, data] >= 9.5
+    # 连续两天涨幅大于等于9.5%
+    twice = (p_change[:, 1:] & p_change[:, :-1]).any(axis=1)
+    return istop & (s.counts[ends] >= threshold) & ~(high / low < 1.9) & twice
+
+
+def _check_climax_limitdown(s, rows, ends, threshold=60):
+    c, v, p = (s.get_value(col)[ends] for col in ('close', 'volume', 'p_change'))
+    vol_5 = _shift_rows(s, s.get_value('vol_5'), 1)[ends]
+    return (s.counts[ends] >= threshold + 1) & ~(p > -9.5) & ~(c * v < 200000000) & (v / vol_5 >= 4)
+
+
+def _check_low_atr(s, rows, ends, ma_long=250, threshold=10):
+    close, p_change = s.window('close', ends, threshold), s.window('p_change', ends, threshold)
+    # 按顺序累加，与逐根累加的结果逐位相同
+    total_change = np.zeros(len(ends))
+    for t in range(threshold):
+        total_change = total_change + np.where((p_change[:, t] > 0) | (p_change[:, t] < 0),
+                                               np.abs(p_change[:, t]), 0.0)
+    atr = total_change / threshold
+    highest, _ = _window_max(close)
+    has_low, low = _running_low(close)
+    lowest = np.where(has_low, close[np.arange(len(ends)), low], 1000000)
+    ratio = (highest - lowest) / lowest
+    return (s.counts[ends] >= ma_long) & ~(atr > 10) & (ratio > 1.1)
+
+
+# 策略函数 → 向量化计算
+SCREEN_FUNCS = {
+    enter.check_volume: _check_enter,
+    keep_increasing.check: _check_keep_increasing,
+    parking_apron.check: _check_parking_apron,
+    backtrace_ma250.check: _check_backtrace_ma250,
+    breakthrough_platform.check: _check_breakthrough_platform,
+    low_backtrace_increase.check: _check_low_backtrace_increase,
+    turtle_trade.check_enter: _check_turtle_trade,
+    high_tight_flag.check_high_tight: _check_high_tight_flag,
+    climax_limitdown.check: _check_climax_limitdown,
+    low_atr.check_low_increase: _check_low_atr,
+}
+
+
+def screen_rows(screener, strategy, rows, ends, stock_tops=None, istop=None):
+    """
+    策略在各截止行的判断结果，布尔数组
+    istop 为各行是否龙虎榜机构买入的布尔数组，未给出时按 stock_tops 计算
+    """
+    func = SCREEN_FUNCS[strategy['func']]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if func is _check_high_tight_flag:
+            if istop is None and stock_tops:
+                codes = [screener.panel.keys_list[i][1] for i in rows]
+                istop = np.array([c in stock_tops for c in codes], dtype=bool)
+            return func(screener, rows, ends, istop=istop)
+        return func(screener, rows, ends)
+
+
+def screen(stocks, date, strategies=None, stock_tops=None):
+    """
+    全部股票按各策略选股
+    stocks: StockHistPanel、{(date, code, name): DataFrame} 或 Screener
+    strategies 默认 tbs.TABLE_CN_STOCK_STRATEGIES；stock_tops 为龙虎榜机构买入的代码集合(高而窄的旗形使用)
+    返回 {策略表名: [选中股票的key]}，与 strategy_data_daily_job.run_check 的结果相同
+    """
+    screener = stocks if isinstance(stocks, Screener) else Screener(stocks)
+    strategies = tbs.TABLE_CN_STOCK_STRATEGIES if strategies is None else strategies
+    rows, ends = screener.get_ends(date)
+    results = {}
+    for strategy in strategies:
+        try:
+            selected = screen_rows(screener, strategy, rows, ends, stock_tops)
+            results[strategy['name']] = [screener.panel.keys_list[i] for i in rows[selected]]
+        except Exception as e:
+            logging.error(f"screener.screen处理异常：{strategy['name']}策略{e}")
+    return results
+
+
+# 历史回放每批计算的截止行数，限制窗口二维数组占用的内存
+REPLAY_CHUNK = 50000
+
+
+def replay(stocks, dates, strategies=None, stock_tops=None):
+    """
+    多个日期的历史选股回放，逐行数据只计算一次，全部日期的截止行一起按策略向量化判断(按REPLAY_CHUNK分批)
+    stocks 同 screen；stock_tops 为 {日期: 龙虎榜机构买入的代码集合}
+    返回 {策略表名: [(日期'YYYY-MM-DD', 代码, 名称)]}，每个日期的选股结果与 screen 单独计算该日期相同
+    """
+    screener = stocks if isinstance(stocks, Screener) else Screener(stocks)
+    strategies = tbs.TABLE_CN_STOCK_STRATEGIES if strategies is None else strategies
+    keys = screener.panel.keys_list
+    date_index, rows, ends = screener.get_ends_dates(dates)
+    dates_str = [d.strftime("%Y-%m-%d") for d in dates]
+    istop = None
+    if stock_tops:
+        istop = np.zeros(len(rows), dtype=bool)
+        for i, date in enumerate(dates):
+            tops = stock_tops.get(date)
+            if tops:
+                at = np.flatnonzero(date_index == i)
+                istop[at] = [keys[r][1] in tops for r in rows[at]]
+    results = {}
+    for strategy in strategies:
+        try:
+            selected = np.zeros(len(rows), dtype=bool)
+            for c in range(0, len(rows), REPLAY_CHUNK):
+                s = slice(c, c + REPLAY_CHUNK)
+                selected[s] = screen_rows(screener, strategy, rows[s], ends[s],
+                                          istop=None if istop is None else istop[s])
+            results[strategy['name']] = [(dates_str[d], keys[r][1], keys[r][2])
+                                         for d, r in zip(date_index[selected], rows[selected])]
+        except Exception as e:
+            logging.error(f"screener.replay处理异常：{strategy['name']}策略{e}")
+    return results
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os.path
+import time
+import logging
+import threading
+import pandas as pd
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 设置基础目录，每次加载使用。
+cpath_current = os.path.dirname(os.path.dirname(__file__))
+symbol_master_path = os.path.join(cpath_current, 'cache', 'symbol')
+
+# 代码表有效期(秒)，过期后第一次读取时重新获取，一天最多刷新一次。
+SYMBOL_MASTER_TTL = 24 * 60 * 60
+# 刷新失败后多少秒内不再重新获取，直接使用过期的数据
+SYMBOL_MASTER_RETRY = 10 * 60
+# 代码表字段：代码、市场标识(东方财富secid前缀 0深/北 1沪)、名称、上市状态(1上市 0已不在列表中)
+# 获取函数返回的其它列(如股本等)原样保存在这些字段之后
+SYMBOL_COLUMNS = ('code', 'market', 'name', 'status')
+
+
+class SymbolMaster:
+    """
+    证券代码表，按类别(stock/etf)保存在本地文件，多进程共用
+    各爬虫模块注册获取函数，过期或不存在时调用获取函数刷新
+    """
+
+    def __init__(self, base_dir=symbol_master_path, ttl=SYMBOL_MASTER_TTL, retry=SYMBOL_MASTER_RETRY):
+        self.base_dir = base_dir
+        self.ttl = ttl
+        self.retry = retry
+        # 类别 → 最近一次刷新失败的时间
+        self._failed = {}
+        self._loaders = {}
+        self._data = {}
+        self._maps = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def _get_file(self, kind):
+        return os.path.join(self.base_dir, f"{kind}.pkl")
+
+    def register(self, kind, loader):
+        """注册代码表获取函数，loader() 返回含 code、market、name 列的DataFrame"""
+        self._loaders[kind] = loader
+
+    def _is_fresh(self, loaded_time):
+        return time.time() - loaded_time < self.ttl
+
+    def _read_file(self, kind):
+        cache_file = self._get_file(kind)
+        if not os.path.isfile(cache_file):
+            return None, 0
+        try:
+            return pd.read_pickle(cache_file), os.path.getmtime(cache_file)
+        except Exception as e:
+            logging.error(f"symbol_master._read_file处理异常：{cache_file}{e}")
+        return None, 0
+
+    def _get_cached(self, kind):
+        """读取内存或本地文件中的代码表，返回(数据, 是否未过期)"""
+        with self._lock:
+            data, loaded_time = self._data.get(kind, (None, 0))
+            if data is not None and self._is_fresh(loaded_time):
+                return data, True
+            file_data, file_time = self._read_file(kind)
+            if file_data is not None:
+                data, loaded_time = file_data, file_time
+                self._data[kind] = (data, loaded_time)
+            return data, data is not None and self._is_fresh(loaded_time)
+
+    def _is_backoff(self, kind):
+        # 刷新失败后retry秒内不再获取
+        return time.time() - self._failed.get(kind, 0) < self.retry
+
+    def get(self, kind):
+        """
+        读取代码表，内存、本地文件都过期时重新获取
+        获取失败时使用过期的数据，retry秒内不再重新获取
+        """
+        data, fresh = self._get_cached(kind)
+        if fresh or self._is_backoff(kind):
+            return data
+        # 同一时间只有一个线程刷新，其它线程等待后直接使用刷新结果。
+        with self._refresh_lock:
+            data, fresh = self._get_cached(kind)
+            if fresh or self._is_backoff(kind):
+                return data
+            loader = self._loaders.get(kind)
+            if loader is not None:
+                try:
+                    new_data = loader()
+                    if new_data is not None and len(new_data.index) > 0:
+                        self._failed.pop(kind, None)
+                        return self.update(kind, new_data)
+                except Exception as e:
+                    logging.error(f"symbol_master.get处理异常：{kind}{e}")
+                self._failed[kind] = time.time()
+        return data
+
+    def update(self, kind, data):
+        """
+        用最新获取的完整代码列表更新代码表并保存
+        原有代码不在新列表中的保留，上市状态置为0
+        """
+        data = data.drop_duplicates(subset='code', keep='last').copy()
+        data['status'] = 1
+        with self._lock:
+            old, _ = self._data.get(kind, (None, 0))
+            if old is None:
+                old, _ = self._read_file(kind)
+            if old is not None:
+                missing = old[~old['code'].isin(data['code'])].copy()
+                if len(missing.index) > 0:
+                    missing['status'] = 0
+                    data = pd.concat([data, missing], ignore_index=True)
+            columns = list(SYMBOL_COLUMNS) + [c for c in data.columns if c not in SYMBOL_COLUMNS]
+            data = data[columns].sort_values('code').reset_index(drop=True)
+            self._write_file(kind, data)
+            self._data[kind] = (data, time.time())
+        return data
+
+    def _write_file(self, kind, data):
+        if not os.path.exists(self.base_dir):
+            os.makedirs(self.base_dir, exist_ok=True)
+        cache_file = self._get_file(kind)
+        tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+        try:
+            data.to_pickle(tmp_file)
+            os.replace(tmp_file, cache_file)
+        except Exception as e:
+            logging.error(f"symbol_master._write_file处理异常：{cache_file}{e}")
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+    def get_market_map(self, kind, listed_only=False):
+        """代码→市场标识字典"""
+        data = self.get(kind)
+        if data is None:
+            return {}
+        key = (kind, listed_only)
+        cached = self._maps.get(key)
+        if cached is not None and cached[0] is data:
+            return cached[1]
+        _data = data[data['status'] == 1] if listed_only else data
+        market_map = dict(zip(_data['code'].values, _data['market'].values))
+        self._maps[key] = (data, market_map)
+        return market_map
+
+
+symbol_master = SymbolMaster()
@@ -36,13 +36,19 @@ def prepare():
     for k in stocks_data:
         date = k[0]
         break
+    # 收益率在历史数据面板上批量计算，各表共用。
+    try:
+        calculator = rate.RatesCalculator(stocks_data)
+    except Exception as e:
+        logging.error(f"backtest_data_daily_job.prepare处理异常：{e}")
+        return
     # 回归测试表
     with concurrent.futures.ThreadPoolExecutor() as executor:
         for table in tables:
-            executor.submit(process, table, stocks_data, date, backtest_column)
+            executor.submit(process, table, calculator, date, backtest_column)
 
 
-def process(table, data_all, date, backtest_column):
+def process(table, calculator, date, backtest_column):
     table_name = table['name']
     if not mdb.checkTableIsExist(table_name):
         return
@@ -60,40 +66,16 @@ def process(table, data_all, date, backtest_column):
         subset = subset.astype({'date': 'string'})
         stocks = [tuple(x) for x in subset.values]
 
-        results = run_check(stocks, data_all, date, backtest_column)
-        if results is None:
+        data_new = rate.get_rates_batch(stocks, calculator, date, backtest_column, len(backtest_column) - 1)
+        if data_new is None:
             return
 
-        data_new = pd.DataFrame(results.values())
         mdb.update_db_from_df(data_new, table_name, ('date', 'code'))
 
     except Exception as e:
         logging.error(f"backtest_data_daily_job.process处理异常：{table}表{e}")
 
 
-def run_check(stocks, data_all, date, backtest_column, workers=40):
-    data = {}
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(rate.get_rates, stock,
-                                              data_all.get((date, stock[1], stock[2])), backtest_column,
-                                              len(backtest_column) - 1): stock for stock in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"backtest_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
-    except Exception as e:
-        logging.error(f"backtest_data_daily_job.run_check处理异常：{e}")
-    if not data:
-        return None
-    else:
-        return data
-
-
 def main():
     prepare()
 
@@ -3,7 +3,6 @@
 
 
 import logging
-import concurrent.futures
 import pandas as pd
 import os.path
 import sys
@@ -12,75 +11,82 @@ cpath_current = os.path.dirname(os.path.dirname(__file__))
 cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.lib.run_template as runt
+import instock.lib.trade_time as trd
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
 import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.batch_indicator as bidr
+import instock.core.indicator.indicator_state as istate
+import instock.core.job_executor as jexe
 from instock.core.singleton_stock import stock_hist_data
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
 
+# 多日期作业每次写入数据库的日期数
+DATES_PER_WRITE = 20
+
 
 def prepare(date):
+    prepare_dates([date])
+
+
+# 多个日期一次加载历史数据、批量计算，按DATES_PER_WRITE个日期一批删除老数据并写入。
+def prepare_dates(dates):
     try:
-        stocks_data = stock_hist_data(date=date).get_data()
+        # 按最后日期取股票列表，历史数据从最早日期的区间开始，各日期与单日作业的K线相同
+        stocks_data = stock_hist_data(date=dates[-1], date_start=trd.get_trade_hist_start(dates)).get_data()
         if stocks_data is None:
             return
-        results = run_check(stocks_data, date=date)
-        if results is None:
-            return
-
         table_name = tbs.TABLE_CN_STOCK_INDICATORS['name']
-        # 删除老数据。
-        if mdb.checkTableIsExist(table_name):
-            del_sql = f"DELETE FROM `{table_name}` where `date` = '{date}'"
-            mdb.executeSql(del_sql)
-            cols_type = None
-        else:
-            cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_INDICATORS['columns'])
-
-        dataKey = pd.DataFrame(results.keys())
-        _columns = tuple(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns'])
-        dataKey.columns = _columns
-
-        dataVal = pd.DataFrame(results.values())
-        dataVal.drop('date', axis=1, inplace=True)  # 删除日期字段，然后和原始数据合并。
-
-        data = pd.merge(dataKey, dataVal, on=['code'], how='left')
-        # data.set_index('code', inplace=True)
-        # 单例，时间段循环必须改时间
-        date_str = date.strftime("%Y-%m-%d")
-        if date.strftime("%Y-%m-%d") != data.iloc[0]['date']:
-            data['date'] = date_str
-        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+        for i in range(0, len(dates), DATES_PER_WRITE):
+            _dates = dates[i:i + DATES_PER_WRITE]
+            data = run_check(stocks_data, dates=_dates)
+            if data is None:
+                continue
+
+            # 删除老数据。
+            if mdb.checkTableIsExist(table_name):
+                _dates_str = "','".join(date.strftime("%Y-%m-%d") for date in _dates)
+                del_sql = f"DELETE FROM `{table_name}` where `date` in ('{_dates_str}')"
+                mdb.executeSql(del_sql)
+                cols_type = None
+            else:
+                cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_INDICATORS['columns'])
+
+            mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
 
     except Exception as e:
         logging.error(f"indicators_data_daily_job.prepare处理异常：{e}")
 
 
-def run_check(stocks, date=None, workers=40):
-    data = {}
+# 全部股票一次批量计算，K线不足的股票逐只计算。开启增量指标时递推类指标用保存的状态更新。
+# dates为多个日期时各日期一起批量计算，每个日期的结果与单独计算该日期相同。
+# 返回DataFrame，列为 TABLE_CN_STOCK_FOREIGN_KEY 各列及 STOCK_STATS_DATA 各列，date为计算的日期。
+def run_check(stocks, date=None, workers=40, dates=None):
     columns = list(tbs.STOCK_STATS_DATA['columns'])
     columns.insert(0, 'code')
     columns.insert(0, 'date')
     data_column = columns
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(idr.get_indicator, k, stocks[k], data_column, date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"indicators_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
-    except Exception as e:
-        logging.error(f"indicators_data_daily_job.run_check处理异常：{e}")
-    if not data:
+    dates = [date] if dates is None else dates
+    batch, stocks_rests = bidr.get_indicator_batch_dates(stocks, dates)
+    results = [batch] if batch is not None and len(batch.index) > 0 else []
+    for _date, stocks_rest in zip(dates, stocks_rests):
+        data = jexe.run_stocks(idr.get_indicator, stocks_rest, stocks, args=(data_column,), kwargs={'date': _date},
+                               workers=workers, name='indicators_data_daily_job.run_check')
+        if data:
+            results.append(pd.DataFrame(data.values()))
+    if not results:
         return None
-    else:
-        return data
+    dataVal = pd.concat(results, ignore_index=True)
+
+    dataKey = pd.DataFrame([(k[1], k[2]) for k in stocks.keys()], columns=['code', 'name'])
+    data = pd.merge(dataKey, dataVal, on=['code'], how='inner')
+    data = data[list(tbs.TABLE_CN_STOCK_INDICATORS['columns'])]
+    if istate.INDICATOR_STATE:
+        # 递推类指标用保存的状态增量计算
+        data = istate.update_indicators(data, stocks, dates)
+    return data
 
 
 # 对每日指标数据，进行筛选。将符合条件的。二次筛选出来。
@@ -154,8 +160,8 @@ def guess_sell(date):
 
 
 def main():
-    # 使用方法传递。
-    runt.run_with_args(prepare)
+    # 使用方法传递。多个日期一起批量计算。
+    runt.run_with_dates(prepare_dates)
     # 二次筛选数据。直接计算买卖股票数据。
     runt.run_with_args(guess_buy)
     runt.run_with_args(guess_sell)
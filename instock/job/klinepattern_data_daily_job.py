@@ -3,7 +3,6 @@
 
 
 import logging
-import concurrent.futures
 import pandas as pd
 import os.path
 import sys
@@ -16,6 +15,7 @@ import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
 from instock.core.singleton_stock import stock_hist_data
 import instock.core.pattern.pattern_recognitions as kpr
+import instock.core.job_executor as jexe
 
 __author__ = 'myh '
 __date__ = '2023/3/10 '
@@ -57,22 +57,10 @@ def prepare(date):
 
 
 def run_check(stocks, date=None, workers=40):
-    data = {}
     columns = tbs.STOCK_KLINE_PATTERN_DATA['columns']
     data_column = columns
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            future_to_data = {executor.submit(kpr.get_pattern_recognition, k, stocks[k], data_column, date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    _data_ = future.result()
-                    if _data_ is not None:
-                        data[stock] = _data_
-                except Exception as e:
-                    logging.error(f"klinepattern_data_daily_job.run_check处理异常：{stock[1]}代码{e}")
-    except Exception as e:
-        logging.error(f"klinepattern_data_daily_job.run_check处理异常：{e}")
+    data = jexe.run_stocks(kpr.get_pattern_recognition, stocks, stocks, args=(data_column,), kwargs={'date': date},
+                           workers=workers, name='klinepattern_data_daily_job.run_check')
     if not data:
         return None
     else:
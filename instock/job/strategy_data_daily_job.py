@@ -2,7 +2,6 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import concurrent.futures
 import pandas as pd
 import os.path
 import sys
@@ -11,8 +10,11 @@ cpath_current = os.path.dirname(os.path.dirname(__file__))
 cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
 sys.path.append(cpath)
 import instock.lib.run_template as runt
+import instock.lib.trade_time as trd
 import instock.core.tablestructure as tbs
 import instock.lib.database as mdb
+import instock.core.job_executor as jexe
+import instock.core.strategy.screener as scr
 from instock.core.singleton_stock import stock_hist_data
 from instock.core.stockfetch import fetch_stock_top_entity_data
 
@@ -28,8 +30,78 @@ def prepare(date, strategy):
         table_name = strategy['name']
         strategy_func = strategy['func']
         results = run_check(strategy_func, table_name, stocks_data, date)
-        if results is None:
+        save(date, strategy, results)
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.prepare处理异常：{strategy}策略{e}")
+
+
+# 历史数据只加载一次，全部策略向量化一起选股，再逐个策略写入。
+def prepare_screen(date):
+    try:
+        stocks_data = stock_hist_data(date=date).get_data()
+        if stocks_data is None:
             return
+        stock_tops = fetch_stock_top_entity_data(date)
+        results = scr.screen(stocks_data, date, stock_tops=stock_tops)
+        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+            if strategy['name'] in results:
+                save(date, strategy, results[strategy['name']])
+            else:
+                # 向量化计算异常的策略逐只股票计算
+                prepare(date, strategy)
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.prepare_screen处理异常：{e}")
+
+
+# 历史回放：多个日期一次加载历史数据(从最早日期所需的历史开始)，全部策略在全部日期上一起向量化选股，每个策略一次删除老数据并写入。
+def prepare_replay(dates):
+    try:
+        stocks_data = stock_hist_data(date=dates[-1], date_start=trd.get_trade_hist_start(dates)).get_data()
+        if stocks_data is None:
+            return
+        stock_tops = {date: fetch_stock_top_entity_data(date) for date in dates}
+        results = scr.replay(stocks_data, dates, stock_tops=stock_tops)
+        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+            if strategy['name'] in results:
+                save_dates(dates, strategy, results[strategy['name']])
+            else:
+                # 向量化计算异常的策略逐日逐只股票计算
+                for date in dates:
+                    prepare(date, strategy)
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.prepare_replay处理异常：{e}")
+
+
+# results为 [(date, code, name)]，各日期的选股结果一次写入。
+def save_dates(dates, strategy, results):
+    try:
+        if not results:
+            return
+        table_name = strategy['name']
+
+        # 删除老数据。
+        if mdb.checkTableIsExist(table_name):
+            _dates_str = "','".join(date.strftime("%Y-%m-%d") for date in dates)
+            del_sql = f"DELETE FROM `{table_name}` where `date` in ('{_dates_str}')"
+            mdb.executeSql(del_sql)
+            cols_type = None
+        else:
+            cols_type = tbs.get_field_types(tbs.TABLE_CN_STOCK_STRATEGIES[0]['columns'])
+
+        data = pd.DataFrame(results, columns=tuple(tbs.TABLE_CN_STOCK_FOREIGN_KEY['columns']))
+        _columns_backtest = tuple(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
+        data = pd.concat([data, pd.DataFrame(columns=_columns_backtest)])
+        mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
+
+    except Exception as e:
+        logging.error(f"strategy_data_daily_job.save_dates处理异常：{strategy}策略{e}")
+
+
+def save(date, strategy, results):
+    try:
+        if not results:
+            return
+        table_name = strategy['name']
 
         # 删除老数据。
         if mdb.checkTableIsExist(table_name):
@@ -51,42 +123,32 @@ def prepare(date, strategy):
         mdb.insert_db_from_df(data, table_name, cols_type, False, "`date`,`code`")
 
     except Exception as e:
-        logging.error(f"strategy_data_daily_job.prepare处理异常：{strategy}策略{e}")
+        logging.error(f"strategy_data_daily_job.save处理异常：{strategy}策略{e}")
+
+
+def check_strategy(code_name, data, strategy_fun, date=None, stock_tops=None):
+    # 进程池中执行，策略函数按模块级函数引用传给子进程。
+    if stock_tops is None:
+        return strategy_fun(code_name, data, date=date) or None
+    return strategy_fun(code_name, data, date=date, istop=(code_name[1] in stock_tops)) or None
 
 
 def run_check(strategy_fun, table_name, stocks, date, workers=40):
-    is_check_high_tight = False
+    stock_tops = None
     if strategy_fun.__name__ == 'check_high_tight':
         stock_tops = fetch_stock_top_entity_data(date)
-        if stock_tops is not None:
-            is_check_high_tight = True
-    data = []
-    try:
-        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
-            if is_check_high_tight:
-                future_to_data = {executor.submit(strategy_fun, k, stocks[k], date=date, istop=(k[1] in stock_tops)): k for k in stocks}
-            else:
-                future_to_data = {executor.submit(strategy_fun, k, stocks[k], date=date): k for k in stocks}
-            for future in concurrent.futures.as_completed(future_to_data):
-                stock = future_to_data[future]
-                try:
-                    if future.result():
-                        data.append(stock)
-                except Exception as e:
-                    logging.error(f"strategy_data_daily_job.run_check处理异常：{stock[1]}代码{e}策略{table_name}")
-    except Exception as e:
-        logging.error(f"strategy_data_daily_job.run_check处理异常：{e}策略{table_name}")
+    data = jexe.run_stocks(check_strategy, stocks, stocks, args=(strategy_fun,),
+                           kwargs={'date': date, 'stock_tops': stock_tops}, workers=workers,
+                           name=f"strategy_data_daily_job.run_check策略{table_name}")
     if not data:
         return None
     else:
-        return data
+        return list(data.keys())
 
 
 def main():
-    # 使用方法传递。
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
-            executor.submit(runt.run_with_args, prepare, strategy)
+    # 使用方法传递。全部策略在全部日期上一次向量化选股，区间作业不再逐日提交。
+    runt.run_with_dates(prepare_replay)
 
 
 # main函数入口
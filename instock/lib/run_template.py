@@ -15,33 +15,14 @@ __date__ = '2023/3/10 '
 
 # 通用函数，获得日期参数，支持批量作业。
 def run_with_args(run_fun, *args):
-    if len(sys.argv) == 3:
+    if len(sys.argv) == 3 or len(sys.argv) == 2:
         # 区间作业 python xxx.py 2023-03-01 2023-03-21
-        tmp_year, tmp_month, tmp_day = sys.argv[1].split("-")
-        start_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
-        tmp_year, tmp_month, tmp_day = sys.argv[2].split("-")
-        end_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
-        run_date = start_date
-        try:
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                while run_date <= end_date:
-                    if trd.is_trade_date(run_date):
-                        executor.submit(run_fun, run_date, *args)
-                        time.sleep(2)
-                    run_date += datetime.timedelta(days=1)
-        except Exception as e:
-            logging.error(f"run_template.run_with_args处理异常：{run_fun}{sys.argv}{e}")
-    elif len(sys.argv) == 2:
         # N个时间作业 python xxx.py 2023-03-01,2023-03-02
-        dates = sys.argv[1].split(',')
         try:
             with concurrent.futures.ThreadPoolExecutor() as executor:
-                for date in dates:
-                    tmp_year, tmp_month, tmp_day = date.split("-")
-                    run_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
-                    if trd.is_trade_date(run_date):
-                        executor.submit(run_fun, run_date, *args)
-                        time.sleep(2)
+                for run_date in get_args_dates():
+                    executor.submit(run_fun, run_date, *args)
+                    time.sleep(2)
         except Exception as e:
             logging.error(f"run_template.run_with_args处理异常：{run_fun}{sys.argv}{e}")
     else:
@@ -56,3 +37,41 @@ def run_with_args(run_fun, *args):
                 run_fun(run_date_nph, *args)
         except Exception as e:
             logging.error(f"run_template.run_with_args处理异常：{run_fun}{sys.argv}{e}")
+
+
+# 通用函数，全部日期一次传给run_fun(dates, *args)，用于多日期一起批量计算的作业。
+def run_with_dates(run_fun, *args):
+    try:
+        if len(sys.argv) == 3 or len(sys.argv) == 2:
+            dates = get_args_dates()
+        else:
+            run_date, run_date_nph = trd.get_trade_date_last()
+            dates = [run_date_nph]
+        if dates:
+            run_fun(dates, *args)
+    except Exception as e:
+        logging.error(f"run_template.run_with_dates处理异常：{run_fun}{sys.argv}{e}")
+
+
+# 命令行参数中的交易日列表。
+def get_args_dates():
+    if len(sys.argv) == 3:
+        # 区间作业 python xxx.py 2023-03-01 2023-03-21
+        tmp_year, tmp_month, tmp_day = sys.argv[1].split("-")
+        start_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
+        tmp_year, tmp_month, tmp_day = sys.argv[2].split("-")
+        end_date = datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date()
+        dates = []
+        run_date = start_date
+        while run_date <= end_date:
+            dates.append(run_date)
+            run_date += datetime.timedelta(days=1)
+    elif len(sys.argv) == 2:
+        # N个时间作业 python xxx.py 2023-03-01,2023-03-02
+        dates = []
+        for date in sys.argv[1].split(','):
+            tmp_year, tmp_month, tmp_day = date.split("-")
+            dates.append(datetime.datetime(int(tmp_year), int(tmp_month), int(tmp_day)).date())
+    else:
+        return []
+    return [run_date for run_date in dates if trd.is_trade_date(run_date)]
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import bisect
 import datetime
 from instock.core.singleton_trade_date import stock_trade_date
 
@@ -18,36 +19,35 @@ def is_trade_date(date=None):
         return False
 
 
+# 交易日历是排序的列表，前后交易日都用二分查找定位。
 def get_previous_trade_date(date, count=1):
-    while True:
-        date =  get_one_previous_trade_date(date)
-        count -= 1
-        if count == 0:
-            break
-    return date
+    trade_dates = stock_trade_date().get_dates()
+    if trade_dates is None:
+        return date
+    i = bisect.bisect_left(trade_dates, date) - count
+    return trade_dates[max(i, 0)]
+
 
 def get_one_previous_trade_date(date):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
-        return date
-    tmp_date = date
-    while True:
-        tmp_date += datetime.timedelta(days=-1)
-        if tmp_date in trade_date:
-            break
-    return tmp_date
+    return get_previous_trade_date(date, 1)
 
 
-def get_next_trade_date(date):
-    trade_date = stock_trade_date().get_data()
-    if trade_date is None:
+def get_next_trade_date(date, count=1):
+    trade_dates = stock_trade_date().get_dates()
+    if trade_dates is None:
+        return date
+    i = bisect.bisect_right(trade_dates, date) + count - 1
+    if i >= len(trade_dates):
         return date
-    tmp_date = date
-    while True:
-        tmp_date += datetime.timedelta(days=1)
-        if tmp_date in trade_date:
-            break
-    return tmp_date
+    return trade_dates[i]
+
+
+# 区间[start_date, end_date]内的交易日列表
+def get_trade_dates(start_date, end_date):
+    trade_dates = stock_trade_date().get_dates()
+    if trade_dates is None:
+        return []
+    return trade_dates[bisect.bisect_left(trade_dates, start_date):bisect.bisect_right(trade_dates, end_date)]
 
 
 OPEN_TIME = (
@@ -134,6 +134,12 @@ def get_trade_hist_interval(date):
     return date_start, not is_trade_date_open_close_between
 
 
+# 多日期作业的历史数据开始日期，按最早的日期取与单日作业相同长度的区间。
+def get_trade_hist_start(dates):
+    date_start, is_cache = get_trade_hist_interval(min(dates).strftime("%Y-%m-%d"))
+    return date_start
+
+
 def get_trade_date_last():
     now_time = datetime.datetime.now()
     run_date = now_time.date()
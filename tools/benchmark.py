@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import datetime
+import platform
+import numpy as np
+import pandas as pd
+
+# 在项目根目录外的 tools 目录中，不随 instock 包安装
+cpath_current = os.path.dirname(__file__)
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.tablestructure as tbs
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.batch_indicator as bidr
+import instock.core.pattern.pattern_recognitions as kpr
+import instock.core.backtest.rate_stats as rate
+import instock.core.strategy.screener as scr
+from instock.core.kline.cyq import CYQCalculator
+from instock.core.stock_hist_panel import StockHistPanel
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 离线性能测试：生成确定的模拟行情(不访问网络)，按每日作业的调用方式逐阶段计时，
+# 结果(吞吐量、单只股票耗时p50/p99、各阶段内存峰值)写入json文件，用于比较优化前后的性能。
+# python tools/benchmark.py --stocks 5000 --days 750 --output benchmark.json
+
+STOCKS = 5000
+DAYS = 750
+SEED = 0
+# 模拟行情的最后一个交易日
+END_DATE = datetime.date(2026, 9, 30)
+# 回测收益率的信号日距最后一天的K线数
+RATES_OFFSET = 101
+# 策略历史回放的交易日数
+REPLAY_DATES = 250
+
+
+def make_frames(stocks=STOCKS, days=DAYS, seed=SEED, end_date=END_DATE):
+    """
+    生成模拟行情 {(date, code, name): DataFrame}，格式与 stockfetch.fetch_stock_hist 一致
+    同样的参数生成的数据相同；含新股(K线较少)、涨停、一字板、停牌(成交量为0)
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range(end=end_date, periods=days)
+    date_str = end_date.strftime("%Y-%m-%d")
+
+    # 收益率：个股波动率不同，少量涨停、跌停
+    sigma = rng.uniform(0.01, 0.04, (stocks, 1))
+    ret = rng.normal(0.0003, 1, (stocks, days)) * sigma
+    jump = rng.random((stocks, days))
+    ret[jump < 0.01] = 0.1
+    ret[jump > 0.995] = -0.1
+    close = np.round(rng.uniform(3, 100, (stocks, 1)) * np.cumprod(1 + ret, axis=1), 2)
+    close = np.maximum(close, 0.01)
+    prev_close = np.concatenate([close[:, :1], close[:, :-1]], axis=1)
+    open_ = np.round(prev_close * (1 + rng.normal(0, 0.01, (stocks, days))), 2)
+    high = np.round(np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, (stocks, days))), 2)
+    low = np.round(np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, (stocks, days))), 2)
+    # 一字板
+    flat = jump < 0.003
+    open_[flat] = high[flat] = low[flat] = close[flat]
+    float_shares = rng.uniform(5e7, 5e9, (stocks, 1))
+    turnover = np.round(rng.lognormal(0, 0.6, (stocks, days)) * rng.uniform(0.3, 3, (stocks, 1)), 2)
+    volume = np.round(float_shares * turnover / 100 / 100) * 100
+    # 停牌
+    halt = rng.random((stocks, days)) < 0.002
+    volume[halt] = 0
+    turnover[halt] = 0
+    amount = np.round(volume * (open_ + close + high + low) / 4, 2)
+    # 新股上市时间不同，K线数量少于days
+    lengths = np.where(rng.random(stocks) < 0.1, rng.integers(20, days, stocks), days)
+
+    frames = {}
+    for i in range(stocks):
+        s = slice(days - lengths[i], days)
+        _close, _prev = close[i, s], prev_close[i, s]
+        data = pd.DataFrame({
+            'date': dates[s],
+            'open': open_[i, s], 'close': _close, 'high': high[i, s], 'low': low[i, s],
+            'volume': volume[i, s], 'amount': amount[i, s],
+            'amplitude': np.round((high[i, s] - low[i, s]) / _prev * 100, 2),
+            'quote_change': np.round((_close - _prev) / _prev * 100, 2),
+            'ups_downs': np.round(_close - _prev, 2),
+            'turnover': turnover[i, s],
+        })
+        p_change = np.zeros(len(_close))
+        p_change[1:] = (_close[1:] - _close[:-1]) / _close[:-1] * 100
+        data['p_change'] = p_change
+        data.index = pd.DatetimeIndex(data['date'], name='日期')
+        code = f"{600000 + i:06d}" if i % 2 == 0 else f"{i:06d}"
+        frames[(date_str, code, f"模拟{i}")] = data
+    return frames
+
+
+def _read_status(name):
+    # /proc/self/status 中的内存项(MB)，不是Linux时返回None
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f"{name}:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak():
+    """
+    重置进程内存峰值，使之后的峰值只包含当前阶段，返回当前内存(MB)
+    Linux写 /proc/self/clear_refs 重置VmHWM；不支持时返回None，峰值为进程启动以来的最大值
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return None
+    return _read_status('VmRSS')
+
+
+def _get_rss():
+    # 内存峰值(MB)：Linux为上次 _reset_peak 以来的VmHWM，其它系统为进程峰值，Windows返回None
+    peak = _read_status('VmHWM')
+    if peak is not None or resource is None:
+        return peak
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux单位为KB，macOS为字节
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _get_stages(date):
+    """阶段名 → 单只股票的计算函数 func(key, data)，与各作业的调用方式一致"""
+    indicator_column = ['date', 'code'] + list(tbs.STOCK_STATS_DATA['columns'])
+    pattern_column = tbs.STOCK_KLINE_PATTERN_DATA['columns']
+    backtest_column = ['date', 'code'] + list(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
+    end_date = date.strftime("%Y-%m-%d")
+
+    def rates(key, data):
+        if len(data.index) <= RATES_OFFSET:
+            return None
+        signal_date = data['date'].iloc[-RATES_OFFSET].strftime("%Y-%m-%d")
+        return rate.get_rates((signal_date, key[1]), data, backtest_column, len(backtest_column) - 1)
+
+    def cyq(key, data):
+        # 与 visualization.get_plot_kline 一致，最后120根K线中的第一根
+        return CYQCalculator(data.tail(n=330)).calc(119)
+
+    stages = {
+        'indicator': lambda key, data: idr.get_indicator(key, data, indicator_column, date=date),
+        'indicators_full': lambda key, data: idr.get_indicators(data, end_date=end_date, threshold=120),
+        'pattern': lambda key, data: kpr.get_pattern_recognition(key, data, pattern_column, date=date),
+    }
+    for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+        stages[f"strategy.{strategy['name'].replace('cn_stock_strategy_', '')}"] = \
+            (lambda func: lambda key, data: func(key, data, date=date))(strategy['func'])
+    stages['rates'] = rates
+    stages['cyq'] = cyq
+    return stages
+
+
+def _summary(latencies, total, count, errors):
+    latencies = np.array(latencies) * 1000
+    return {
+        'count': count,
+        'errors': errors,
+        'total_s': round(total, 4),
+        'throughput': round(count / total, 2) if total > 0 else None,
+        'p50_ms': round(float(np.percentile(latencies, 50)), 4) if len(latencies) else None,
+        'p99_ms': round(float(np.percentile(latencies, 99)), 4) if len(latencies) else None,
+        'max_ms': round(float(latencies.max()), 4) if len(latencies) else None,
+        'peak_rss_mb': _get_rss(),
+    }
+
+
+def run_stage(func, panel, keys):
+    """单线程逐只计算，计时包含从面板取DataFrame(与作业中 data.get(key) 相同)"""
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    for key in keys:
+        t = time.perf_counter()
+        try:
+            func(key, panel.get(key))
+        except Exception as e:
+            errors += 1
+            logging.error(f"benchmark.run_stage处理异常：{key[1]}代码{e}")
+        latencies.append(time.perf_counter() - t)
+    return _summary(latencies, time.perf_counter() - start, len(keys), errors)
+
+
+def run_batch(panel, date):
+    """全部股票批量计算指标，只有总耗时"""
+    start = time.perf_counter()
+    result, rests = bidr.get_indicator_batch(panel, date)
+    total = time.perf_counter() - start
+    summary = _summary([], total, len(panel), 0 if result is not None else 1)
+    summary['rests'] = len(rests)
+    return summary
+
+
+def run_screen(panel, date):
+    """全部策略向量化选股，只有总耗时(含逐行数据计算)"""
+    start = time.perf_counter()
+    results = scr.screen(panel, date)
+    total = time.perf_counter() - start
+    summary = _summary([], total, len(panel), len(tbs.TABLE_CN_STOCK_STRATEGIES) - len(results))
+    summary['selected'] = sum(len(v) for v in results.values())
+    return summary
+
+
+def run_rates(panel, date):
+    """全部股票距最后一天RATES_OFFSET根K线的信号批量计算回测收益率，只有总耗时"""
+    backtest_column = ['date', 'code'] + list(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
+    start = time.perf_counter()
+    stocks = []
+    for i, k in enumerate(panel.keys_list):
+        s = panel.get_slice(i)
+        if s.stop - s.start > RATES_OFFSET:
+            signal_date = str(panel.dates[s.stop - RATES_OFFSET])
+            stocks.append((f"{signal_date[:4]}-{signal_date[4:6]}-{signal_date[6:]}", k[1], k[2]))
+    result = rate.get_rates_batch(stocks, rate.RatesCalculator(panel), date.strftime("%Y-%m-%d"), backtest_column,
+                                  len(backtest_column) - 1)
+    total = time.perf_counter() - start
+    return _summary([], total, len(stocks), 0 if result is not None else 1)
+
+
+def run_replay(panel, date):
+    """全部策略在最后REPLAY_DATES个交易日上历史回放，只有总耗时"""
+    dates = [d.date() for d in pd.bdate_range(end=date, periods=REPLAY_DATES)]
+    start = time.perf_counter()
+    results = scr.replay(panel, dates)
+    total = time.perf_counter() - start
+    summary = _summary([], total, len(panel), len(tbs.TABLE_CN_STOCK_STRATEGIES) - len(results))
+    summary['dates'] = len(dates)
+    summary['selected'] = sum(len(v) for v in results.values())
+    return summary
+
+
+def run(stocks=STOCKS, days=DAYS, seed=SEED, stages=None, sample=None, compact=None):
+    """
+    生成模拟行情并逐阶段计时，返回结果字典
+    stages为None时测试全部阶段；sample为单只股票计算阶段抽取的股票数(全部为None)
+    """
+    start = time.perf_counter()
+    frames = make_frames(stocks, days, seed)
+    generate = time.perf_counter() - start
+    start = time.perf_counter()
+    panel = StockHistPanel.from_frames(frames, use_shared_memory=False, compact=compact)
+    build = time.perf_counter() - start
+    del frames
+
+    date = END_DATE
+    keys = panel.keys_list
+    if sample is not None and sample < len(keys):
+        keys = [keys[i] for i in np.linspace(0, len(keys) - 1, sample).astype(int)]
+    all_stages = _get_stages(date)
+    names = ['indicator_batch', 'strategy_screen', 'strategy_replay', 'rates_batch'] + list(all_stages) if stages is None else stages
+
+    report = {
+        'meta': {
+            'stocks': stocks, 'days': days, 'seed': seed, 'sample': len(keys), 'date': date.strftime("%Y-%m-%d"),
+            'compact': panel.compact, 'python': platform.python_version(), 'numpy': np.__version__,
+            'pandas': pd.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'generate_s': round(generate, 4), 'panel_s': round(build, 4), 'panel_rss_mb': _get_rss(),
+        },
+        'stages': {},
+    }
+    for name in names:
+        # 各阶段的内存峰值分别统计，peak_rss_delta_mb 为峰值比阶段开始时增加的内存
+        start_rss = _reset_peak()
+        if name == 'indicator_batch':
+            report['stages'][name] = run_batch(panel, date)
+        elif name == 'strategy_screen':
+            report['stages'][name] = run_screen(panel, date)
+        elif name == 'strategy_replay':
+            report['stages'][name] = run_replay(panel, date)
+        elif name == 'rates_batch':
+            report['stages'][name] = run_rates(panel, date)
+        elif name in all_stages:
+            report['stages'][name] = run_stage(all_stages[name], panel, keys)
+        else:
+            logging.error(f"benchmark.run未知阶段：{name}")
+            continue
+        stage = report['stages'][name]
+        stage['peak_rss_delta_mb'] = None if start_rss is None or stage['peak_rss_mb'] is None else \
+            round(stage['peak_rss_mb'] - start_rss, 1)
+        print(f"{name}: {stage['count']}只 {stage['total_s']}s {stage['throughput']}只/秒 "
+              f"p50 {stage['p50_ms']}ms p99 {stage['p99_ms']}ms 内存峰值 {stage['peak_rss_mb']}MB "
+              f"(增加 {stage['peak_rss_delta_mb']}MB)")
+    panel.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='模拟行情的离线性能测试')
+    parser.add_argument('--stocks', type=int, default=STOCKS)
+    parser.add_argument('--days', type=int, default=DAYS)
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--stages', help='逗号分隔的阶段名，默认全部')
+    parser.add_argument('--sample', type=int, help='单只股票计算阶段抽取的股票数，默认全部')
+    parser.add_argument('--compact', action='store_true', help='历史数据面板使用紧凑存储')
+    parser.add_argument('--output', default='benchmark.json')
+    args = parser.parse_args()
+    report = run(args.stocks, args.days, args.seed, args.stages.split(',') if args.stages else None, args.sample,
+                 True if args.compact else None)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+# main函数入口
+if __name__ == '__main__':
+    main()
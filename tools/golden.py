@@ -0,0 +1,533 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+# 在项目根目录外的 tools 目录中，不随 instock 包安装
+cpath_current = os.path.dirname(__file__)
+cpath = os.path.abspath(os.path.join(cpath_current, os.pardir))
+sys.path.append(cpath)
+import instock.core.tablestructure as tbs
+import instock.core.indicator.calculate_indicator as idr
+import instock.core.indicator.batch_indicator as bidr
+import instock.core.indicator.indicator_state as istate
+import instock.core.pattern.pattern_recognitions as kpr
+import instock.core.backtest.rate_stats as rate
+import instock.core.strategy.screener as scr
+import instock.core.strategy.high_tight_flag as high_tight_flag
+import instock.core.strategy.parking_apron as parking_apron
+import instock.core.strategy.turtle_trade as turtle_trade
+import instock.core.indicator.kernels as knl
+import instock.core.stock_hist_slice as hsl
+from instock.core.kline.cyq import CYQCalculator
+from instock.core.stock_hist_panel import StockHistPanel
+import benchmark as bench
+
+__author__ = 'myh '
+__date__ = '2026/10/18 '
+
+# 数值输出快照：固定数据集(benchmark.make_frames 生成的模拟行情及各策略的构造K线)上各计算的输出保存在 golden.npz，
+# 改写计算方法(向量化、增量计算等)后与快照比较，超过各列容差的差异逐列报告。
+# python tools/golden.py          与快照比较，有差异时返回1
+# python tools/golden.py record   重新记录快照(确认输出变化是预期的之后)
+
+GOLDEN_FILE = os.path.join(os.path.dirname(__file__), 'golden.npz')
+STOCKS = 16
+DAYS = 400
+SEED = 20
+# 指标快照保存最后的K线数
+INDICATOR_TAIL = 40
+# 形态快照保存最后的K线数
+PATTERN_TAIL = 60
+# 策略在最后多少个交易日逐日计算
+STRATEGY_DATES = 20
+
+# 容差 (rtol, atol)：|实际 - 快照| <= atol + rtol * |快照|，NaN与NaN相等
+DEFAULT_TOLERANCE = (1e-9, 1e-9)
+# 按 (快照名, 列名) 或 快照名 设置的容差，未设置的用 DEFAULT_TOLERANCE
+TOLERANCES = {
+    # talib 与批量计算的CCI累加顺序不同，有1e-12级的差异
+    ('indicator', 'cci'): (1e-9, 1e-8),
+    ('indicator', 'cci_84'): (1e-9, 1e-8),
+    'pattern': (0, 0),
+    'strategy': (0, 0),
+}
+# 策略结果：1 选中，0 未选中，-1 处理异常
+STRATEGY_ERROR = -1
+
+
+def _pattern_frame(open_, close, volume):
+    # 构造的K线转为与 benchmark.make_frames 相同格式的DataFrame
+    dates = pd.bdate_range(end=bench.END_DATE, periods=len(close))
+    open_, close = np.round(open_, 2), np.round(close, 2)
+    high = np.round(np.maximum(open_, close) * 1.005, 2)
+    low = np.round(np.minimum(open_, close) * 0.995, 2)
+    prev_close = np.concatenate([close[:1], close[:-1]])
+    p_change = np.zeros(len(close))
+    p_change[1:] = (close[1:] - close[:-1]) / close[:-1] * 100
+    data = pd.DataFrame({
+        'date': dates, 'open': open_, 'close': close, 'high': high, 'low': low,
+        'volume': volume, 'amount': np.round(volume * (open_ + close + high + low) / 4, 2),
+        'amplitude': np.round((high - low) / prev_close * 100, 2),
+        'quote_change': np.round((close - prev_close) / prev_close * 100, 2),
+        'ups_downs': np.round(close - prev_close, 2),
+        'turnover': np.round(volume / 1e8 * 100, 2),
+        'p_change': p_change,
+    })
+    data.index = pd.DatetimeIndex(data['date'], name='日期')
+    return data
+
+
+def _pattern_frames():
+    """
+    各策略在最后STRATEGY_DATES个交易日中能选中的构造K线，每种形态一只股票
+    返回 {(date, code, name): DataFrame}，K线数为DAYS
+    """
+    t = np.arange(DAYS)
+    last = DAYS - 1
+
+    def flat(price):
+        # 小幅波动的横盘
+        return price * (1 + 0.003 * np.sin(t)), np.round(3e6 * (1 + 0.1 * np.cos(t)))
+
+    def finish(close, volume, open_=None):
+        if open_ is None:
+            open_ = np.concatenate([close[:1], close[:-1]])
+        return open_, close, volume
+
+    patterns = {}
+    # 停机坪：涨停后三天小幅高开、收盘高于涨停价
+    close, volume = flat(20)
+    open_ = np.concatenate([close[:1], close[:-1]])
+    d = last - 11
+    price = round(close[d - 1] * 1.1, 2)
+    close[d] = price
+    for i, (o, c) in enumerate(((1.01, 1.02), (1.015, 1.025), (1.02, 1.03)), 1):
+        open_[d + i], close[d + i] = price * o, price * c
+    close[d + 4:] = price * 1.03
+    open_[d + 4:] = price * 1.03
+    patterns['parking_apron'] = finish(close, volume, open_)
+
+    # 回踩年线：年线下方横盘，放量突破年线见顶，缩量回踩不破年线
+    close, volume = flat(50)
+    peak, low = last - 29, last - 14
+    close[last - 59:last - 39] = 45
+    close[last - 39:peak + 1] = np.linspace(45, 80, peak - last + 40)
+    close[peak:low + 1] = np.linspace(80, 60, low - peak + 1)
+    close[low:] = np.linspace(60, 63, last - low + 1)
+    volume[peak], volume[low] = 1e7, 1e6
+    patterns['backtrace_ma250'] = finish(close, volume)
+
+    # 突破平台：60日均线附近横盘，放量大涨突破均线
+    close, volume = flat(30)
+    open_ = np.concatenate([close[:1], close[:-1]])
+    d = last - 14
+    open_[d], close[d:], volume[d] = 29.7, 31.5, 1.5e7
+    open_[d + 1:] = 31.5
+    patterns['breakthrough_platform'] = finish(close, volume, open_)
+
+    # 无大幅回撤：最后100天每天上涨1%(两日高开低走的初值为-1000000.0，策略不会选中，只检查前面的判断)
+    close, volume = flat(10)
+    rise = last - 99
+    close[rise:] = 10 * 1.01 ** np.arange(1, DAYS - rise + 1)
+    patterns['low_backtrace_increase'] = finish(close, volume, np.concatenate([close[:1], close[:-1]]) * 1.001)
+
+    # 高而窄的旗形：14天内连续两个涨停、最高价为最低价的1.9倍以上，之后横盘
+    close, volume = flat(10)
+    d = last - 29
+    returns = np.array([1.0, 1.1, 1.1] + [1.045] * 11)
+    close[d:d + 14] = close[d - 1] * np.cumprod(returns)
+    close[d + 14:] = close[d + 13]
+    patterns['high_tight_flag'] = finish(close, volume)
+
+    # 放量跌停
+    close, volume = flat(40)
+    d = last - 7
+    close[d:] = round(close[d - 1] * 0.9, 2)
+    volume[d] = 2e7
+    patterns['climax_limitdown'] = finish(close, volume)
+
+    # 低ATR成长：10天内回落后连续上涨，区间涨幅超过110%而平均涨跌幅不超过10%
+    close, volume = flat(100)
+    d = last - 13
+    close[d] = 100
+    close[d + 1] = 95
+    close[d + 2:d + 10] = 95 * 1.099 ** np.arange(1, 9)
+    close[d + 10:] = close[d + 9]
+    patterns['low_atr'] = finish(close, volume)
+
+    date_str = bench.END_DATE.strftime("%Y-%m-%d")
+    return {(date_str, f"{300000 + i:06d}", f"形态{name}"): _pattern_frame(*arrays)
+            for i, (name, arrays) in enumerate(patterns.items())}
+
+
+# 不会选中股票的策略：无大幅回撤第一天的两日高开低走跌幅约为-100%，任何股票都不满足
+STRATEGY_NO_HITS = {'cn_stock_strategy_low_backtrace_increase'}
+# 龙虎榜机构买入的股票：高而窄的旗形的构造股票及一只模拟股票
+STOCK_TOPS = {'300004', '600000'}
+
+
+def get_frames():
+    """固定数据集(模拟行情及各策略的构造K线)，经历史数据面板取出，与作业中的DataFrame格式一致"""
+    frames = bench.make_frames(STOCKS, DAYS, SEED)
+    frames.update(_pattern_frames())
+    panel = StockHistPanel.from_frames(frames, use_shared_memory=False, compact=False)
+    frames = {k: panel.get_frame(i) for i, k in enumerate(panel.keys_list)}
+    panel.close()
+    return frames
+
+
+def _compact(frames):
+    # 紧凑存储面板及从中取出的DataFrame
+    panel = StockHistPanel.from_frames(frames, use_shared_memory=False, compact=True)
+    return panel, {k: panel.get_frame(i) for i, k in enumerate(panel.keys_list)}
+
+
+def _checksum(frames):
+    # 输入数据的校验值，区分输入变化与输出变化
+    md5 = hashlib.md5()
+    for k, data in frames.items():
+        md5.update('|'.join(k).encode('utf-8'))
+        md5.update(np.ascontiguousarray(data.drop(columns=['date']).values, dtype=np.float64).tobytes())
+    return md5.hexdigest()
+
+
+def _indicators(frames):
+    columns = None
+    values = []
+    for data in frames.values():
+        result = idr.get_indicators(data, threshold=INDICATOR_TAIL)
+        result = result.drop(columns=['date'])
+        columns = list(result.columns) if columns is None else columns
+        values.append(result[columns].values.astype(np.float64))
+    return columns, np.concatenate(values)
+
+
+def _indicators_state(frames):
+    # 增量指标逐根K线更新，替换全部历史计算结果中 STATE_COLUMNS 的各列
+    columns, values = _indicators(frames)
+    rows = []
+    for data in frames.values():
+        state = istate.IndicatorState()
+        tail = len(data.index) - INDICATOR_TAIL
+        for i in range(len(data.index)):
+            result = state.update_frame(data.iloc[i:i + 1])
+            if i >= tail:
+                rows.append([result[c] for c in istate.STATE_COLUMNS])
+    values = values.copy()
+    values[:, [columns.index(c) for c in istate.STATE_COLUMNS]] = np.array(rows, dtype=np.float64)
+    return columns, values
+
+
+def _supertrend_reference(close, b_ub, b_lb):
+    # 原 calculate_indicator 中Supertrend的逐行计算(原来未赋值的位置为np.empty的随机值，这里为NaN)
+    size = len(close)
+    ub, lb, st = np.full(size, np.nan), np.full(size, np.nan), np.full(size, np.nan)
+    for i in range(size):
+        if i == 0:
+            ub[i] = b_ub[i]
+            lb[i] = b_lb[i]
+            st[i] = ub[i] if close[i] <= ub[i] else lb[i]
+            continue
+        last_close, last_ub, last_lb, last_st = close[i - 1], ub[i - 1], lb[i - 1], st[i - 1]
+        ub[i] = b_ub[i] if b_ub[i] < last_ub or last_close > last_ub else last_ub
+        lb[i] = b_lb[i] if b_lb[i] > last_lb or last_close < last_lb else last_lb
+        if last_st == last_ub:
+            st[i] = ub[i] if close[i] <= ub[i] else lb[i]
+        elif last_st == last_lb:
+            st[i] = lb[i] if close[i] > lb[i] else ub[i]
+    return ub, lb, st
+
+
+def _shift_reference(x, n, fill_value=0.0):
+    # 原 calculate_indicator 中的 Series.shift
+    return pd.Series(x).shift(n, fill_value=fill_value).values
+
+
+def _indicators_reference(frames):
+    # kernels 中的逐行递推换回原来的计算，与同一快照比较
+    supertrend, shift = knl.supertrend, knl.shift
+    knl.supertrend, knl.shift = _supertrend_reference, _shift_reference
+    try:
+        return _indicators(frames)
+    finally:
+        knl.supertrend, knl.shift = supertrend, shift
+
+
+def _indicator(frames):
+    columns = ['date', 'code'] + list(tbs.STOCK_STATS_DATA['columns'])
+    date = bench.END_DATE
+    values = [idr.get_indicator(k, data, columns, date=date)[columns[2:]].values.astype(np.float64)
+              for k, data in frames.items()]
+    return columns[2:], np.array(values)
+
+
+def _indicator_batch(frames):
+    # 批量计算的全部股票与逐只计算的结果一致，K线不足的股票逐只计算
+    columns = ['date', 'code'] + list(tbs.STOCK_STATS_DATA['columns'])
+    date = bench.END_DATE
+    batch, rests = bidr.get_indicator_batch(frames, date)
+    batch = batch.set_index('code')
+    values = []
+    for k, data in frames.items():
+        if k[1] in batch.index:
+            values.append(batch.loc[k[1], columns[2:]].values.astype(np.float64))
+        else:
+            values.append(idr.get_indicator(k, data, columns, date=date)[columns[2:]].values.astype(np.float64))
+    return columns[2:], np.array(values)
+
+
+def _indicator_batch_compact(frames):
+    # 紧凑存储面板上批量计算，与非紧凑存储的快照比较
+    panel, frames = _compact(frames)
+    columns = ['date', 'code'] + list(tbs.STOCK_STATS_DATA['columns'])
+    batch, rests = bidr.get_indicator_batch(panel, bench.END_DATE)
+    batch = batch.set_index('code')
+    values = []
+    for k, data in frames.items():
+        if k[1] in batch.index:
+            values.append(batch.loc[k[1], columns[2:]].values.astype(np.float64))
+        else:
+            values.append(idr.get_indicator(k, data, columns, date=bench.END_DATE)[columns[2:]].values.astype(
+                np.float64))
+    return columns[2:], np.array(values)
+
+
+def _pattern(frames):
+    stock_column = tbs.STOCK_KLINE_PATTERN_DATA['columns']
+    columns = list(stock_column)
+    values = [kpr.get_pattern_recognitions(data, stock_column, threshold=PATTERN_TAIL)[columns].values
+              for data in frames.values()]
+    return columns, np.concatenate(values).astype(np.float64)
+
+
+def _strategy(frames, funcs=None):
+    """
+    (股票数 × 日期数, 策略数)，每只股票最后STRATEGY_DATES个交易日逐日计算
+    funcs 为 {策略函数: 替换的计算函数}，用于检查原来的计算方法
+    """
+    columns = [s['name'] for s in tbs.TABLE_CN_STOCK_STRATEGIES]
+    funcs = {} if funcs is None else funcs
+    values = []
+    for k, data in frames.items():
+        for date in data['date'].iloc[-STRATEGY_DATES:]:
+            date = date.date()
+            row = []
+            for strategy in tbs.TABLE_CN_STOCK_STRATEGIES:
+                func = funcs.get(strategy['func'], strategy['func'])
+                kwargs = {'istop': k[1] in STOCK_TOPS} if strategy['func'] is high_tight_flag.check_high_tight else {}
+                try:
+                    row.append(1 if func(k, data, date=date, **kwargs) else 0)
+                except Exception:
+                    row.append(STRATEGY_ERROR)
+            values.append(row)
+    return columns, np.array(values, dtype=np.float64)
+
+
+def _parking_apron_reference(code_name, data, date=None, threshold=15):
+    # 停机坪原来的计算：每个涨停日调用 turtle_trade.check_enter 重新截取全部历史，再检查之后三天
+    origin_data = data
+    end_date = code_name[0] if date is None else date.strftime("%Y-%m-%d")
+    data = hsl.as_of(data, end_date)
+    if len(data.index) < threshold:
+        return False
+    data = data.tail(n=threshold)
+    for _close, _p_change, _date in zip(data['close'].values, data['p_change'].values, data['date'].values):
+        if _p_change > 9.5:
+            if turtle_trade.check_enter(code_name, origin_data, date=hsl.to_date(_date), threshold=threshold):
+                if _parking_apron_internal(data, _close, _date):
+                    return True
+    return False
+
+
+def _parking_apron_internal(data, limitup_price, limitup_date):
+    limitup_end = hsl.after(data, limitup_date).head(n=3)
+    if len(limitup_end.index) < 3:
+        return False
+    day1 = limitup_end.iloc[0]
+    if not (day1['close'] > limitup_price and day1['open'] > limitup_price and
+            0.97 < day1['close'] / day1['open'] < 1.03):
+        return False
+    day23 = limitup_end.tail(n=2)
+    for _close, _p_change, _open in zip(day23['close'].values, day23['p_change'].values, day23['open'].values):
+        if not (0.97 < (_close / _open) < 1.03 and -5 < _p_change < 5
+                and _close > limitup_price and _open > limitup_price):
+            return False
+    return True
+
+
+def _strategy_reference(frames):
+    # 改写过的策略换回原来的计算方法
+    return _strategy(frames, {parking_apron.check: _parking_apron_reference})
+
+
+def _strategy_screen(frames):
+    # 向量化选股，行顺序与 _strategy 相同
+    columns = [s['name'] for s in tbs.TABLE_CN_STOCK_STRATEGIES]
+    screener = scr.Screener(frames)
+    keys = list(frames)
+    dates = frames[keys[0]]['date'].iloc[-STRATEGY_DATES:]
+    values = np.zeros((len(keys), len(dates), len(columns)))
+    index = {k: i for i, k in enumerate(keys)}
+    for d, date in enumerate(dates):
+        results = scr.screen(screener, date.date(), stock_tops=STOCK_TOPS)
+        for j, name in enumerate(columns):
+            for k in results.get(name, ()):
+                values[index[k], d, j] = 1
+    return columns, values.reshape(-1, len(columns))
+
+
+def _strategy_screen_compact(frames):
+    panel, _ = _compact(frames)
+    return _strategy_screen(panel)
+
+
+def _rates(frames):
+    columns = ['date', 'code'] + list(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
+    values = []
+    for k, data in frames.items():
+        signal_date = data['date'].iloc[-min(bench.RATES_OFFSET, len(data.index))].strftime("%Y-%m-%d")
+        result = rate.get_rates((signal_date, k[1]), data, columns, len(columns) - 1)
+        if result is None:
+            values.append(np.full(len(columns) - 2, np.nan))
+        else:
+            values.append(result[columns[2:]].values.astype(np.float64))
+    return columns[2:], np.array(values)
+
+
+def _rates_batch(frames):
+    # 批量计算，行顺序与 _rates 相同，不能计算的信号为NaN
+    columns = ['date', 'code'] + list(tbs.TABLE_CN_STOCK_BACKTEST_DATA['columns'])
+    keys = list(frames)
+    stocks = [(data['date'].iloc[-min(bench.RATES_OFFSET, len(data.index))].strftime("%Y-%m-%d"), k[1], k[2])
+              for k, data in frames.items()]
+    result = rate.get_rates_batch(stocks, rate.RatesCalculator(frames), keys[0][0], columns, len(columns) - 1)
+    values = np.full((len(keys), len(columns) - 2), np.nan)
+    if result is not None:
+        index = {k[1]: i for i, k in enumerate(keys)}
+        values[[index[c] for c in result['code']]] = result[columns[2:]].values
+    return columns[2:], values
+
+
+def _cyq(frames):
+    values = []
+    columns = None
+    for data in frames.values():
+        result = CYQCalculator(data.tail(n=330)).calc(119)
+        row = {'benefit_part': result.benefit_part, 'avg_cost': float(result.avg_cost), 'b': result.b}
+        for p, chips in result.percent_chips.items():
+            row[f"p{p}_low"], row[f"p{p}_high"] = (float(x) for x in chips['priceRange'])
+            row[f"p{p}_concentration"] = chips['concentration']
+        row.update({f"x{i}": x for i, x in enumerate(result.x)})
+        row.update({f"y{i}": y for i, y in enumerate(result.y)})
+        columns = list(row) if columns is None else columns
+        values.append([row[c] for c in columns])
+    return columns, np.array(values, dtype=np.float64)
+
+
+# 输出名 → (快照名, 计算函数)，同一快照可以有多种计算方法，新的计算方法在这里登记
+OUTPUTS = {
+    'indicators': ('indicators', _indicators),
+    'indicators_reference': ('indicators', _indicators_reference),
+    'indicators_state': ('indicators', _indicators_state),
+    'indicator': ('indicator', _indicator),
+    'indicator_batch': ('indicator', _indicator_batch),
+    'indicator_batch_compact': ('indicator', _indicator_batch_compact),
+    'pattern': ('pattern', _pattern),
+    'strategy': ('strategy', _strategy),
+    'strategy_reference': ('strategy', _strategy_reference),
+    'strategy_screen': ('strategy', _strategy_screen),
+    'strategy_screen_compact': ('strategy', _strategy_screen_compact),
+    'rates': ('rates', _rates),
+    'rates_batch': ('rates', _rates_batch),
+    'cyq': ('cyq', _cyq),
+}
+
+
+def _get_tolerance(name, column):
+    tolerance = TOLERANCES.get((name, column))
+    if tolerance is None:
+        tolerance = TOLERANCES.get(name, DEFAULT_TOLERANCE)
+    return tolerance
+
+
+def record(path=GOLDEN_FILE):
+    """计算全部快照并保存"""
+    frames = get_frames()
+    arrays = {}
+    meta = {'stocks': STOCKS, 'days': DAYS, 'seed': SEED, 'checksum': _checksum(frames), 'columns': {}}
+    for name, (golden, func) in OUTPUTS.items():
+        if golden in arrays:
+            continue
+        columns, values = func(frames)
+        arrays[golden] = values
+        meta['columns'][golden] = columns
+    np.savez_compressed(path, meta=np.array(json.dumps(meta, ensure_ascii=False)), **arrays)
+    return meta
+
+
+def compare(path=GOLDEN_FILE, outputs=None):
+    """
+    与快照比较，返回差异列表 [(输出名, 列名, 超出容差的个数, 最大误差)]
+    outputs为要比较的输出名，默认全部
+    """
+    with np.load(path) as golden:
+        meta = json.loads(str(golden['meta']))
+        arrays = {k: golden[k] for k in golden.files if k != 'meta'}
+    frames = get_frames()
+    if _checksum(frames) != meta['checksum']:
+        logging.error("golden.compare输入数据与快照不一致，需重新记录快照")
+        return [('input', None, None, None)]
+
+    diffs = []
+    # 快照中没有选中股票的策略不能检查计算结果，作为差异报告
+    for j, column in enumerate(meta['columns']['strategy']):
+        if column in STRATEGY_NO_HITS:
+            continue
+        if not (arrays['strategy'][:, j] == 1).any():
+            diffs.append(('strategy', column, 0, None))
+    for name in (OUTPUTS if outputs is None else outputs):
+        golden_name, func = OUTPUTS[name]
+        expected = arrays[golden_name]
+        expected_columns = meta['columns'][golden_name]
+        try:
+            columns, values = func(frames)
+        except Exception as e:
+            logging.error(f"golden.compare处理异常：{name}{e}")
+            diffs.append((name, None, None, None))
+            continue
+        if list(columns) != expected_columns or values.shape != expected.shape:
+            diffs.append((name, 'shape', None, None))
+            continue
+        for j, column in enumerate(columns):
+            rtol, atol = _get_tolerance(golden_name, column)
+            x, y = values[:, j], expected[:, j]
+            close = np.isclose(x, y, rtol=rtol, atol=atol, equal_nan=True)
+            if not close.all():
+                with np.errstate(invalid='ignore'):
+                    err = np.nanmax(np.where(close, 0, np.abs(x - y)))
+                diffs.append((name, column, int((~close).sum()), float(err)))
+    for diff in diffs:
+        logging.error(f"golden.compare输出与快照不一致：{diff}")
+    return diffs
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == 'record':
+        meta = record()
+        print(f"已记录快照：{GOLDEN_FILE} {list(meta['columns'])}")
+        return 0
+    diffs = compare(outputs=sys.argv[1].split(',') if len(sys.argv) > 1 else None)
+    print(f"与快照不一致：{len(diffs)}处" if diffs else "与快照一致")
+    return 1 if diffs else 0
+
+
+# main函数入口
+if __name__ == '__main__':
+    sys.exit(main())